@@ -0,0 +1,97 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, Dict, List
+
+from app.models.user import User
+from app.models.chat import IngestRequest, DeleteSnippetsRequest
+from app.core.config import settings
+from app.core.security import get_current_admin_user
+from app.services.code_search import code_search_service
+from app.services.index_reload import reload_language
+from app.services.ingestion import compact, delete_snippets, ingest_snippets
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+@router.get("/languages")
+async def list_languages(current_user: User = Depends(get_current_admin_user)) -> List[Dict[str, Any]]:
+    """Loaded languages with their data version, row count and memory"""
+    return await code_search_service.check_language_status()
+
+@router.post("/languages/{language}/reload")
+async def reload_language_index(
+    language: str,
+    force: bool = False,
+    current_user: User = Depends(get_current_admin_user)
+) -> Dict[str, Any]:
+    """Load a language's rebuilt files in the background and swap them in without downtime"""
+    try:
+        return await reload_language(language, force=force)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Reload failed: {str(e)}"
+        )
+
+@router.post("/languages/{language}/snippets")
+async def ingest_language_snippets(
+    language: str,
+    request: IngestRequest,
+    current_user: User = Depends(get_current_admin_user)
+) -> Dict[str, Any]:
+    """Embed new snippets into the language's delta segment; they are searchable when this returns"""
+    if not request.snippets:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No snippets given")
+    if len(request.snippets) > settings.MAX_INGEST_SNIPPETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.MAX_INGEST_SNIPPETS} snippets per request"
+        )
+    try:
+        code_search_service.resolve_languages(language)
+        return await ingest_snippets(language, [snippet.dict() for snippet in request.snippets])
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ingestion failed: {str(e)}"
+        )
+
+@router.post("/languages/{language}/snippets/delete")
+async def delete_language_snippets(
+    language: str,
+    request: DeleteSnippetsRequest,
+    current_user: User = Depends(get_current_admin_user)
+) -> Dict[str, Any]:
+    """Tombstone rows so searches stop returning them; chat history keeps their code"""
+    try:
+        code_search_service.resolve_languages(language)
+        return await delete_snippets(language, request.rows)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Deletion failed: {str(e)}"
+        )
+
+@router.post("/languages/{language}/compact")
+async def compact_language_index(
+    language: str,
+    current_user: User = Depends(get_current_admin_user)
+) -> Dict[str, Any]:
+    """Fold the delta segment into the main index now instead of waiting for the size threshold"""
+    try:
+        code_search_service.resolve_languages(language)
+        return await compact(language)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Compaction failed: {str(e)}"
+        )
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query
+from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 
 from app.core.config import settings
+from app.core.metrics import span
 from app.models.user import User
-from app.models.chat import ChatSession, ChatSessionCreate, ChatSessionUpdate, ChatMessageCreate, ChatMessage
+from app.models.chat import ChatSession, ChatSessionDetail, ChatSessionSummary, ChatSessionPage, ChatSessionCreate, ChatSessionUpdate, ChatMessageCreate, ChatMessage
 from app.core.security import get_current_user
 from app.db.mongodb import get_database
+from app.db.pagination import before_cursor, encode_cursor
+from app.services.chat_history import hydrate_results, to_result_refs
 from app.services.code_search import code_search_service
+from app.services.inference_scheduler import InferenceQueueFullError
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -30,35 +34,71 @@ async def create_chat_session(
         updated_at=settings.get_current_time()
     )
     
-    result = await chat_collection.insert_one(new_session.dict(by_alias=True))
+    # Messages live in the chat_messages collection, not inside the session
+    session_doc = new_session.dict(by_alias=True, exclude={"messages"})
+    session_doc["message_count"] = 0
+    result = await chat_collection.insert_one(session_doc)
     
     created_session = await chat_collection.find_one({"_id": result.inserted_id})
     return ChatSession(**created_session)
 
-@router.get("/", response_model=List[ChatSession])
-async def get_chat_sessions(current_user: User = Depends(get_current_user)):
-    """Get all chat sessions for current user"""
+@router.get("/", response_model=ChatSessionPage)
+async def get_chat_sessions(
+    limit: int = Query(settings.CHAT_SESSIONS_PAGE_SIZE, ge=1, le=settings.MAX_CHAT_SESSIONS_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """List chat session summaries, most recently updated first (pass next_cursor for more)"""
     db = await get_database()
     chat_collection = db[settings.DATABASE_NAME]["chat_sessions"]
     
-    cursor = chat_collection.find({"user_id": ObjectId(current_user.id)})
-    sessions = await cursor.to_list(length=100)
+    # Keyset pagination over (updated_at, _id), served by the compound index
+    query = {"user_id": ObjectId(current_user.id)}
+    if cursor:
+        try:
+            query.update(before_cursor("updated_at", cursor))
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+    cursor_query = chat_collection.find(
+        query,
+        {"title": 1, "created_at": 1, "updated_at": 1, "message_count": 1}
+    ).sort([("updated_at", -1), ("_id", -1)]).limit(limit + 1)
+    with span("mongo_read"):
+        sessions = await cursor_query.to_list(length=limit + 1)
     
-    return [ChatSession(**session) for session in sessions]
+    next_cursor = None
+    if len(sessions) > limit:
+        sessions = sessions[:limit]
+        next_cursor = encode_cursor(sessions[-1]["updated_at"], sessions[-1]["_id"])
+    
+    return ChatSessionPage(
+        items=[ChatSessionSummary(**session) for session in sessions],
+        next_cursor=next_cursor
+    )
 
-@router.get("/{session_id}", response_model=ChatSession)
+@router.get("/{session_id}", response_model=ChatSessionDetail)
 async def get_chat_session(
     session_id: str,
+    limit: int = Query(settings.CHAT_MESSAGES_PAGE_SIZE, ge=1, le=settings.MAX_CHAT_MESSAGES_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Get a chat session by ID"""
+    """Get a chat session by ID with one page of its messages (newest first; pass next_cursor for older)"""
     db = await get_database()
     chat_collection = db[settings.DATABASE_NAME]["chat_sessions"]
+    message_collection = db[settings.DATABASE_NAME]["chat_messages"]
     
-    session = await chat_collection.find_one({
-        "_id": ObjectId(session_id),
-        "user_id": ObjectId(current_user.id)
-    })
+    with span("mongo_read"):
+        session = await chat_collection.find_one(
+            {
+                "_id": ObjectId(session_id),
+                "user_id": ObjectId(current_user.id)
+            },
+            {"messages": 0}
+        )
     
     if not session:
         raise HTTPException(
@@ -66,7 +106,39 @@ async def get_chat_session(
             detail="Chat session not found"
         )
     
-    return ChatSession(**session)
+    # Keyset pagination over (timestamp, _id), newest first
+    query = {"session_id": ObjectId(session_id)}
+    if cursor:
+        try:
+            query.update(before_cursor("timestamp", cursor))
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+    with span("mongo_read"):
+        messages = await message_collection.find(query).sort(
+            [("timestamp", -1), ("_id", -1)]
+        ).limit(limit + 1).to_list(length=limit + 1)
+    
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1]["timestamp"], messages[-1]["_id"])
+    
+    # The user is likely to keep searching in the language they used last
+    if messages:
+        last_language = messages[0]["language"]
+        for language in ([last_language] if isinstance(last_language, str) else last_language):
+            code_search_service.prefetch_language(language)
+    
+    # Fill in code text for stored snippet references, one read per language
+    with span("hydrate"):
+        await hydrate_results(messages)
+    
+    # Return the page oldest first, like the embedded list used to be
+    session["messages"] = [_message_from_doc(message) for message in reversed(messages)]
+    return ChatSessionDetail(**session, next_cursor=next_cursor)
 
 @router.patch("/{session_id}", response_model=ChatSession)
 async def update_chat_session(
@@ -100,7 +172,7 @@ async def update_chat_session(
         )
     
     # Return updated session
-    updated_session = await chat_collection.find_one({"_id": ObjectId(session_id)})
+    updated_session = await chat_collection.find_one({"_id": ObjectId(session_id)}, {"messages": 0})
     return ChatSession(**updated_session)
 
 @router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -124,25 +196,31 @@ async def delete_chat_session(
             detail="Chat session not found"
         )
     
-    # Delete session
+    # Delete session and its messages
     await chat_collection.delete_one({"_id": ObjectId(session_id)})
+    await db[settings.DATABASE_NAME]["chat_messages"].delete_many({"session_id": ObjectId(session_id)})
     return None
 
-@router.post("/{session_id}/messages", response_model=ChatSession)
+@router.post("/{session_id}/messages", response_model=ChatMessage)
 async def add_chat_message(
     session_id: str,
     message_data: ChatMessageCreate,
     current_user: User = Depends(get_current_user)
 ):
-    """Add a message to a chat session and perform code search"""
+    """Add a message to a chat session and perform code search; returns only the new message"""
     db = await get_database()
     chat_collection = db[settings.DATABASE_NAME]["chat_sessions"]
+    message_collection = db[settings.DATABASE_NAME]["chat_messages"]
     
     # Check if session exists and belongs to user
-    session = await chat_collection.find_one({
-        "_id": ObjectId(session_id),
-        "user_id": ObjectId(current_user.id)
-    })
+    with span("mongo_read"):
+        session = await chat_collection.find_one(
+            {
+                "_id": ObjectId(session_id),
+                "user_id": ObjectId(current_user.id)
+            },
+            {"_id": 1}
+        )
     
     if not session:
         raise HTTPException(
@@ -151,11 +229,22 @@ async def add_chat_message(
         )
     
     # Perform code search
-    search_results = await code_search_service.search(
-        query=message_data.message,
-        language=message_data.language,
-        top_k=3  # Default to 5 results
-    )
+    try:
+        search_results = await code_search_service.search(
+            query=message_data.message,
+            language=message_data.language,
+            top_k=3  # Default to 5 results
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except InferenceQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     
     # Create new message
     new_message = ChatMessage(
@@ -165,15 +254,33 @@ async def add_chat_message(
         results=search_results
     )
     
-    # Add message to session
-    await chat_collection.update_one(
-        {"_id": ObjectId(session_id)},
-        {
-            "$push": {"messages": new_message.dict()},
-            "$set": {"updated_at": settings.get_current_time()}
-        }
-    )
+    # Append the message to its own collection; the session only tracks counters.
+    # Hits are stored as snippet references and hydrated again on read.
+    message_doc = {
+        "session_id": ObjectId(session_id),
+        "user_id": ObjectId(current_user.id),
+        **new_message.dict(exclude={"id", "results"}),
+        "results": to_result_refs(search_results)
+    }
+    with span("mongo_write"):
+        result = await message_collection.insert_one(message_doc)
+        await chat_collection.update_one(
+            {"_id": ObjectId(session_id)},
+            {
+                "$set": {"updated_at": new_message.timestamp},
+                "$inc": {"message_count": 1}
+            }
+        )
     
-    # Return updated session
-    updated_session = await chat_collection.find_one({"_id": ObjectId(session_id)})
-    return ChatSession(**updated_session)
\ No newline at end of file
+    new_message.id = str(result.inserted_id)
+    return new_message
+
+def _message_from_doc(doc: dict) -> ChatMessage:
+    """Build a ChatMessage from a chat_messages document"""
+    return ChatMessage(
+        id=str(doc["_id"]),
+        message=doc["message"],
+        language=doc["language"],
+        timestamp=doc["timestamp"],
+        results=doc.get("results")
+    )
\ No newline at end of file
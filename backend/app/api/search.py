@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Dict, Any
 
 from app.models.user import User
-from app.models.chat import SearchQuery, CodeSearchResult
+from app.models.chat import SearchQuery, CodeSearchResult, BatchSearchRequest, BatchSearchItemResult
 from app.core.security import get_current_user
 from app.services.code_search import code_search_service
+from app.services.inference_scheduler import InferenceQueueFullError
 from app.core.config import settings
 
 router = APIRouter(prefix="/search", tags=["search"])
@@ -16,22 +17,27 @@ async def search_code(
 ):
     """Search for code snippets matching the query"""
     try:
-        # Validate language
-        if query.language not in settings.SUPPORTED_LANGUAGES:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Language {query.language} not supported. Supported languages: {settings.SUPPORTED_LANGUAGES}"
-            )
+        # Validate language(s): a name, a list of names or "all"
+        code_search_service.resolve_languages(query.language)
         
         # Validate top_k
         if query.top_k > settings.MAX_TOP_K:
             query.top_k = settings.MAX_TOP_K
         
+        # Clamp ANN search parameters
+        if query.nprobe is not None:
+            query.nprobe = min(max(query.nprobe, 1), settings.MAX_NPROBE)
+        if query.ef_search is not None:
+            query.ef_search = min(max(query.ef_search, 1), settings.MAX_EF_SEARCH)
+        
         # Perform search
         results = await code_search_service.search(
             query=query.query,
             language=query.language,
-            top_k=query.top_k
+            top_k=query.top_k,
+            nprobe=query.nprobe,
+            ef_search=query.ef_search,
+            mode=query.mode
         )
         
         return results
@@ -40,12 +46,41 @@ async def search_code(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    except InferenceQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Search failed: {str(e)}"
         )
 
+@router.post("/batch", response_model=List[BatchSearchItemResult])
+async def search_code_batch(
+    request: BatchSearchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Run many searches in one request; each item succeeds or fails on its own"""
+    if len(request.items) > settings.MAX_BATCH_SEARCH_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.MAX_BATCH_SEARCH_ITEMS} items per batch"
+        )
+    
+    items = [
+        {"query": item.query, "language": item.language, "top_k": min(max(item.top_k, 1), settings.MAX_TOP_K)}
+        for item in request.items
+    ]
+    try:
+        return await code_search_service.search_batch(items)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Batch search failed: {str(e)}"
+        )
+
 @router.get("/languages")
 async def get_supported_languages():
     """Get list of supported programming languages"""
@@ -15,21 +15,162 @@ class Settings:
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "code_search_db")
     
     # JWT Settings
-    SECRET_KEY: str = os.getenv("SECRET_KEY", "my-secret-key-for-jwt")
+    DEFAULT_SECRET_KEY: str = "my-secret-key-for-jwt"
+    SECRET_KEY: str = os.getenv("SECRET_KEY", DEFAULT_SECRET_KEY)
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 1 day
     
+    # Password hashing: bcrypt cost factor and the executor that runs it off the event loop
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+    
+    # Authenticated-user cache; tokens younger than TRUST_TOKEN_CLAIMS_SECONDS are
+    # trusted from their signed claims without any lookup (0 = always look up)
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+    TRUST_TOKEN_CLAIMS_SECONDS: int = int(os.getenv("TRUST_TOKEN_CLAIMS_SECONDS", "0"))
+    
     # Model Paths
     MODEL_DIR: str = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data/embeddings"))
     SUPPORTED_LANGUAGES: list = ["go", "java", "javascript", "php", "python", "ruby"]
     
+    # Language loading: hot languages load in the background at startup, the rest
+    # on first use; cold languages are evicted LRU above the budget (0 = unlimited)
+    PRELOAD_LANGUAGES: list = [l for l in os.getenv("PRELOAD_LANGUAGES", ",".join(SUPPORTED_LANGUAGES)).split(",") if l]
+    LANGUAGE_MEMORY_BUDGET_MB: int = int(os.getenv("LANGUAGE_MEMORY_BUDGET_MB", "0"))
+    FAISS_MMAP: bool = os.getenv("FAISS_MMAP", "true").lower() == "true"
+    
+    # Hot reload: a replaced language version stays readable for chat history this
+    # long; the watcher polls the loaded languages' files every interval (0 = off)
+    RELOAD_GRACE_SECONDS: float = float(os.getenv("RELOAD_GRACE_SECONDS", "60"))
+    INDEX_WATCH_INTERVAL_SECONDS: float = float(os.getenv("INDEX_WATCH_INTERVAL_SECONDS", "0"))
+    
+    # Ingestion: new snippets are embedded into a small per-language delta segment that
+    # is searched next to the main index, and folded into it in the background once
+    # it holds DELTA_COMPACTION_ROWS rows
+    MAX_INGEST_SNIPPETS: int = int(os.getenv("MAX_INGEST_SNIPPETS", "1000"))
+    INGEST_EMBED_BATCH_SIZE: int = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "32"))
+    DELTA_COMPACTION_ROWS: int = int(os.getenv("DELTA_COMPACTION_ROWS", "50000"))
+    # Searches pick up delta segments written by other processes (ingestion and
+    # deletions in other web workers), checking at most this often (-1 = off)
+    DELTA_SYNC_INTERVAL_SECONDS: float = float(os.getenv("DELTA_SYNC_INTERVAL_SECONDS", "1"))
+    
+    # Users allowed to call the /admin endpoints
+    ADMIN_USERNAMES: list = [u for u in os.getenv("ADMIN_USERNAMES", "").split(",") if u]
+    
     # Default search settings
     DEFAULT_TOP_K: int = 3
     MAX_TOP_K: int = 20
 
+    # Batch search endpoint
+    MAX_BATCH_SEARCH_ITEMS: int = int(os.getenv("MAX_BATCH_SEARCH_ITEMS", "256"))
+    BATCH_SEARCH_EMBED_BATCH_SIZE: int = int(os.getenv("BATCH_SEARCH_EMBED_BATCH_SIZE", "64"))
+
+    # Encoder: Hugging Face model and cache dir (empty = the Hugging Face default), or a
+    # directory written by app.tools.export_encoder, which loads a TorchScript encoder
+    # and its tokenizer without building the model from the Hub files
+    MODEL_NAME: str = os.getenv("MODEL_NAME", "Salesforce/codet5p-110m-embedding")
+    HF_CACHE_DIR: str = os.getenv("HF_CACHE_DIR", "")
+    SERIALIZED_ENCODER_DIR: str = os.getenv("SERIALIZED_ENCODER_DIR", "")
+    
+    # Startup: model and languages load concurrently in the background; /ready turns
+    # 200 once both are done and, if enabled, a warm-up pass has run
+    STARTUP_WARMUP: bool = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+    
+    # Encoder inference: "fp32", "int8" (dynamic quantization) or "bf16"; 0 threads = torch default
+    MODEL_PRECISION: str = os.getenv("MODEL_PRECISION", "fp32")
+    TORCH_NUM_THREADS: int = int(os.getenv("TORCH_NUM_THREADS", "0"))
+    TORCH_INTEROP_THREADS: int = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+
+    # Intra-query sharding: exact (flat) indices with at least SEARCH_SHARD_MIN_ROWS rows
+    # are split into SEARCH_SHARDS row ranges searched in parallel on a fixed pool of
+    # SEARCH_SHARD_THREADS threads (0 / 1 shards = off). Unset thread counts are
+    # planned so the encoder, the shard pool and FAISS's OpenMP share the CPUs
+    SEARCH_SHARDS: int = int(os.getenv("SEARCH_SHARDS", "0"))
+    SEARCH_SHARD_THREADS: int = int(os.getenv("SEARCH_SHARD_THREADS", "0"))
+    SEARCH_SHARD_MIN_ROWS: int = int(os.getenv("SEARCH_SHARD_MIN_ROWS", "50000"))
+    FAISS_OMP_THREADS: int = int(os.getenv("FAISS_OMP_THREADS", "0"))
+
+    # Shared search worker pool (0 workers = search in-process); web workers talk to
+    # it over a unix socket / named pipe path or "host:port", authenticated with
+    # SECRET_KEY (the pool refuses to start with the default key)
+    SEARCH_POOL_WORKERS: int = int(os.getenv("SEARCH_POOL_WORKERS", "0"))
+    SEARCH_POOL_THREADS_PER_WORKER: int = int(os.getenv("SEARCH_POOL_THREADS_PER_WORKER", "1"))
+    SEARCH_POOL_ADDRESS: str = os.getenv(
+        "SEARCH_POOL_ADDRESS", "127.0.0.1:8765" if os.name == "nt" else "/tmp/code_search_pool.sock"
+    )
+    SEARCH_POOL_START_METHOD: str = os.getenv("SEARCH_POOL_START_METHOD", "spawn" if os.name == "nt" else "fork")
+    SEARCH_POOL_CONNECT_TIMEOUT: float = float(os.getenv("SEARCH_POOL_CONNECT_TIMEOUT", "300"))
+    # Seconds a pool request may take before the client gives up (0 = wait forever)
+    SEARCH_POOL_REQUEST_TIMEOUT: float = float(os.getenv("SEARCH_POOL_REQUEST_TIMEOUT", "300"))
+    # A pool started by a web worker exits once no web worker has been connected for this long
+    SEARCH_POOL_IDLE_SECONDS: float = float(os.getenv("SEARCH_POOL_IDLE_SECONDS", "30"))
+
+    # Query embedding scheduler (micro-batching)
+    INFERENCE_MAX_BATCH_SIZE: int = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "16"))
+    INFERENCE_MAX_WAIT_MS: float = float(os.getenv("INFERENCE_MAX_WAIT_MS", "5"))
+    INFERENCE_MAX_QUEUE_SIZE: int = int(os.getenv("INFERENCE_MAX_QUEUE_SIZE", "256"))
+
+    # Tokenizer padding: "dynamic" pads per length bucket, "max_length" pads to 512
+    EMBEDDING_PADDING: str = os.getenv("EMBEDDING_PADDING", "dynamic")
+    EMBEDDING_LENGTH_BUCKETS: list = [int(b) for b in os.getenv("EMBEDDING_LENGTH_BUCKETS", "32,64,128,256,512").split(",")]
+
+    # ANN index engines: "flat", "ivf_flat", "ivf_pq", "ivf_sq" (8-bit) or "hnsw"; per language with
+    # INDEX_TYPES="python:hnsw,java:ivf_flat"
+    INDEX_TYPE: str = os.getenv("INDEX_TYPE", "flat")
+    INDEX_TYPES: dict = dict(
+        item.split(":", 1) for item in os.getenv("INDEX_TYPES", "").split(",") if ":" in item
+    )
+    IVF_NLIST: int = int(os.getenv("IVF_NLIST", "4096"))
+    IVF_NPROBE: int = int(os.getenv("IVF_NPROBE", "16"))
+    MAX_NPROBE: int = int(os.getenv("MAX_NPROBE", "256"))
+    PQ_M: int = int(os.getenv("PQ_M", "64"))
+    PQ_NBITS: int = int(os.getenv("PQ_NBITS", "8"))
+    # Two-stage retrieval for compressed indices (ivf_pq, ivf_sq): fetch
+    # RERANK_FACTOR x top_k candidates, then re-score them exactly against the
+    # full-precision vectors.npy next to the index (memory-mapped); 0 turns it off
+    RERANK_FACTOR: int = int(os.getenv("RERANK_FACTOR", "4"))
+    RERANK_VECTORS_DTYPE: str = os.getenv("RERANK_VECTORS_DTYPE", "float16")
+    HNSW_M: int = int(os.getenv("HNSW_M", "32"))
+    HNSW_EF_CONSTRUCTION: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+    HNSW_EF_SEARCH: int = int(os.getenv("HNSW_EF_SEARCH", "64"))
+    MAX_EF_SEARCH: int = int(os.getenv("MAX_EF_SEARCH", "512"))
+
+    # Retrieval mode: "vector", "hybrid" (vector + BM25 with reciprocal rank fusion)
+    # or "lexical" (BM25 only); BM25 indices live next to the FAISS index as bm25.*
+    SEARCH_MODE: str = os.getenv("SEARCH_MODE", "vector")
+    HYBRID_CANDIDATE_FACTOR: int = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "5"))
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    LEXICAL_BUILD_ON_LOAD: bool = os.getenv("LEXICAL_BUILD_ON_LOAD", "false").lower() == "true"
+    LEXICAL_FALLBACK: bool = os.getenv("LEXICAL_FALLBACK", "true").lower() == "true"
+
+    # Skip the encoder for queries that match a corpus docstring
+    DOCSTRING_FAST_PATH: bool = os.getenv("DOCSTRING_FAST_PATH", "true").lower() == "true"
+
+    # Query cache (embedding + result); TTL of 0 disables expiry
+    QUERY_CACHE_EMBEDDING_SIZE: int = int(os.getenv("QUERY_CACHE_EMBEDDING_SIZE", "10000"))
+    QUERY_CACHE_RESULT_SIZE: int = int(os.getenv("QUERY_CACHE_RESULT_SIZE", "10000"))
+    QUERY_CACHE_TTL_SECONDS: float = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "0"))
+
+    # Metrics: /metrics in Prometheus text format, and a log line with the stage
+    # breakdown for requests slower than SLOW_REQUEST_MS (0 = off)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    SLOW_REQUEST_MS: float = float(os.getenv("SLOW_REQUEST_MS", "0"))
+    
+    # Chat session and message pagination
+    CHAT_SESSIONS_PAGE_SIZE: int = int(os.getenv("CHAT_SESSIONS_PAGE_SIZE", "20"))
+    MAX_CHAT_SESSIONS_PAGE_SIZE: int = int(os.getenv("MAX_CHAT_SESSIONS_PAGE_SIZE", "100"))
+    CHAT_MESSAGES_PAGE_SIZE: int = int(os.getenv("CHAT_MESSAGES_PAGE_SIZE", "20"))
+    MAX_CHAT_MESSAGES_PAGE_SIZE: int = int(os.getenv("MAX_CHAT_MESSAGES_PAGE_SIZE", "100"))
+
     # Thêm cấu hình múi giờ
     TIMEZONE = "Asia/Ho_Chi_Minh"
     
+    def get_index_type(self, language: str) -> str:
+        """Index type configured for a language"""
+        return self.INDEX_TYPES.get(language, self.INDEX_TYPE)
+    
     # Hàm tiện ích để lấy thời gian hiện tại theo múi giờ cấu hình
     @staticmethod
     def get_current_time():
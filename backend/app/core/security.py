@@ -1,3 +1,6 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -6,13 +9,39 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
 from app.core.config import settings
+from app.core.metrics import metrics, span
 from app.db.mongodb import get_database
-from app.models.user import UserInDB
+from app.models.user import User, UserInDB
+from app.services.query_cache import LRUCache, observe_cache
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context; hashes with any other cost factor are upgraded on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
+# Resolved users by username, so authenticated requests skip the Mongo lookup;
+# holds the public User, never the password hash
+user_cache = LRUCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+observe_cache("users", user_cache)
+# Username -> time it last changed; older token claims are not trusted for that user
+_user_changes = LRUCache(settings.USER_CACHE_SIZE, settings.TRUST_TOKEN_CLAIMS_SECONDS)
+
+# bcrypt runs on a dedicated, size-limited executor so it never blocks the event loop
+password_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_password_jobs = 0
+metrics.gauge(
+    "code_search_password_jobs", "Password hashing jobs running or queued",
+    callback=lambda: _password_jobs
+)
+
+class PasswordHashingBusyError(RuntimeError):
+    """Raised when too many password hashing jobs are already queued"""
+
 def verify_password(plain_password, hashed_password):
     """Verify password hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -21,6 +50,30 @@ def get_password_hash(password):
     """Generate password hash"""
     return pwd_context.hash(password)
 
+async def _run_password_job(func, *args):
+    """Run a bcrypt call on the password executor, rejecting work beyond the queue limit"""
+    global _password_jobs
+    if _password_jobs >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE:
+        raise PasswordHashingBusyError("Too many concurrent logins, try again shortly")
+    _password_jobs += 1
+    try:
+        with span("bcrypt"):
+            return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    finally:
+        _password_jobs -= 1
+
+async def verify_password_async(plain_password, hashed_password):
+    """Verify password hash off the event loop"""
+    return await _run_password_job(pwd_context.verify, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """Generate password hash off the event loop"""
+    return await _run_password_job(pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password, hashed_password):
+    """Verify a password and return (valid, new_hash); new_hash is set when the cost factor changed"""
+    return await _run_password_job(pwd_context.verify_and_update, plain_password, hashed_password)
+
 async def get_user(db, username: str):
     """Get user from database by username"""
     user_collection = db[settings.DATABASE_NAME]["users"]
@@ -29,13 +82,66 @@ async def get_user(db, username: str):
         return UserInDB(**user_data)
     return None
 
+def invalidate_cached_user(username: str):
+    """Drop a user from the authenticated-user cache after it changes"""
+    user_cache.pop(username)
+    if settings.TRUST_TOKEN_CLAIMS_SECONDS > 0:
+        _user_changes.set(username, time.time())
+
+def public_user(user: User) -> User:
+    """The user without its password hash"""
+    return User(**user.dict(by_alias=True, exclude={"hashed_password"}))
+
+def user_claims(user: User) -> dict:
+    """Profile claims that let get_current_user skip the database for recent tokens"""
+    return {
+        "uid": str(user.id),
+        "email": user.email,
+        "full_name": user.full_name,
+        "disabled": bool(user.disabled),
+        "created_at": user.created_at.isoformat(),
+    }
+
+def user_from_claims(payload: dict) -> Optional[User]:
+    """Build the user from signed token claims if the token is recent enough to trust"""
+    if settings.TRUST_TOKEN_CLAIMS_SECONDS <= 0:
+        return None
+    issued_at = payload.get("iat")
+    # Tokens issued before these claims existed fall back to the lookup
+    if "uid" not in payload or "created_at" not in payload or issued_at is None:
+        return None
+    if time.time() - issued_at > settings.TRUST_TOKEN_CLAIMS_SECONDS:
+        return None
+    changed_at = _user_changes.get(payload["sub"])
+    if changed_at is not None and issued_at <= changed_at:
+        return None
+    return User(
+        _id=payload["uid"],
+        username=payload["sub"],
+        email=payload["email"],
+        full_name=payload.get("full_name"),
+        disabled=payload.get("disabled", False),
+        created_at=payload["created_at"],
+    )
+
 async def authenticate_user(db, username: str, password: str):
     """Authenticate user with username and password"""
-    user = await get_user(db, username)
+    with span("user_lookup"):
+        user = await get_user(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # Transparently rehash with the current cost factor
+        with span("mongo_write"):
+            await db[settings.DATABASE_NAME]["users"].update_one(
+                {"username": username},
+                {"$set": {"hashed_password": new_hash}}
+            )
+        user.hashed_password = new_hash
+        invalidate_cached_user(username)
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -45,7 +151,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -57,15 +163,35 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        with span("jwt_decode"):
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    db = await get_database()
-    user = await get_user(db, username=username)
+    user = user_from_claims(payload) or user_cache.get(username)
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        db = await get_database()
+        with span("user_lookup"):
+            user = await get_user(db, username=username)
+        if user is None:
+            raise credentials_exception
+        user = public_user(user)
+        user_cache.set(username, user)
+    if user.disabled:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Inactive user"
+        )
+    return user
+
+async def get_current_admin_user(current_user: User = Depends(get_current_user)):
+    """Current user, if listed in ADMIN_USERNAMES"""
+    if current_user.username not in settings.ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
\ No newline at end of file
@@ -16,7 +16,7 @@ async def setup_database():
     db = client[settings.DATABASE_NAME]
     
     # Create collections
-    collections = ["users", "chat_sessions"]
+    collections = ["users", "chat_sessions", "chat_messages"]
     for collection_name in collections:
         if collection_name not in await db.list_collection_names():
             await db.create_collection(collection_name)
@@ -31,8 +31,13 @@ async def setup_database():
     # Chat sessions collection indexes
     await db.chat_sessions.create_index("user_id")
     await db.chat_sessions.create_index([("user_id", 1), ("created_at", -1)])
+    await db.chat_sessions.create_index([("user_id", 1), ("updated_at", -1), ("_id", -1)])
     print("Created indexes for chat_sessions collection")
     
+    # Chat messages collection indexes (append-only, paginated per session)
+    await db.chat_messages.create_index([("session_id", 1), ("timestamp", -1), ("_id", -1)])
+    print("Created indexes for chat_messages collection")
+    
     print(f"Database {settings.DATABASE_NAME} initialized successfully!")
     
     # Close connection
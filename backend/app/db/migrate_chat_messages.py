@@ -0,0 +1,55 @@
+"""
+This script moves messages embedded in chat_sessions documents into the chat_messages collection.
+It is safe to re-run: a session is only cleared after its messages were copied.
+Usage: python -m app.db.migrate_chat_messages
+"""
+
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+
+async def migrate_chat_messages():
+    """Copy embedded session messages into chat_messages and drop them from the sessions"""
+    # Connect to MongoDB
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+    
+    migrated_sessions = 0
+    migrated_messages = 0
+    async for session in db.chat_sessions.find({"messages.0": {"$exists": True}}):
+        messages = [
+            {
+                "session_id": session["_id"],
+                "user_id": session["user_id"],
+                "migrated": True,
+                **message
+            }
+            for message in session["messages"]
+        ]
+        
+        # Remove copies left by an interrupted earlier run before inserting again
+        await db.chat_messages.delete_many({"session_id": session["_id"], "migrated": True})
+        await db.chat_messages.insert_many(messages)
+        await db.chat_sessions.update_one(
+            {"_id": session["_id"]},
+            {
+                "$unset": {"messages": ""},
+                "$set": {"message_count": len(messages)}
+            }
+        )
+        migrated_sessions += 1
+        migrated_messages += len(messages)
+    
+    # Sessions that never had messages still need a counter
+    await db.chat_sessions.update_many(
+        {"message_count": {"$exists": False}},
+        {"$set": {"message_count": 0}, "$unset": {"messages": ""}}
+    )
+    
+    print(f"Migrated {migrated_messages} messages from {migrated_sessions} sessions")
+    
+    # Close connection
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_chat_messages())
@@ -0,0 +1,32 @@
+import base64
+from datetime import datetime
+from typing import Tuple
+
+from bson import ObjectId
+
+
+def encode_cursor(sort_value: datetime, doc_id: ObjectId) -> str:
+    """Opaque keyset cursor for (sort value, _id)"""
+    raw = f"{sort_value.isoformat()}|{doc_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        sort_value, doc_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(sort_value), ObjectId(doc_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def before_cursor(field: str, cursor: str) -> dict:
+    """Mongo filter for documents strictly before a cursor in (field desc, _id desc) order"""
+    sort_value, doc_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {field: {"$lt": sort_value}},
+            {field: sort_value, "_id": {"$lt": doc_id}},
+        ]
+    }
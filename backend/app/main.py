@@ -1,11 +1,16 @@
-from fastapi import FastAPI, Depends
+import asyncio
+
+from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
 
 from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, metrics
 from app.db.mongodb import connect_to_mongo, close_mongo_connection
-from app.api import auth, search, chat
+from app.api import auth, search, chat, admin
 from app.services.code_search import code_search_service
+from app.services.index_reload import watch_indexes
 
 app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION)
 
@@ -18,22 +23,40 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Per-request latency and stage histograms, plus the slow-request log
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(search.router, prefix="/api")
 app.include_router(chat.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database connection and load models"""
     await connect_to_mongo()
-    # Initialize the code search service in the background
-    # This will load models and embeddings
-    await code_search_service.initialize()
+    # Connect to the shared worker pool, or load the model and hot languages in the
+    # background so the app answers /health and /ready probes right away
+    if settings.SEARCH_POOL_WORKERS > 0:
+        await code_search_service.attach_pool()
+    else:
+        app.state.startup_task = asyncio.create_task(code_search_service.initialize())
+        app.state.startup_task.add_done_callback(_log_startup_failure)
+    # Reload languages whose index files were rebuilt on disk
+    if settings.INDEX_WATCH_INTERVAL_SECONDS > 0:
+        app.state.index_watcher = asyncio.create_task(watch_indexes())
+
+def _log_startup_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error: code search startup failed: {task.exception()}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close database connection"""
+    """Close database connection and stop background workers"""
+    if getattr(app.state, "index_watcher", None) is not None:
+        app.state.index_watcher.cancel()
+    await code_search_service.shutdown()
     await close_mongo_connection()
 
 @app.get("/")
@@ -47,8 +70,21 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Liveness check: the process is up and serving requests"""
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check: 200 once the model and hot languages are loaded and warmed up, 503 before"""
+    readiness = await code_search_service.check_readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Metrics in the Prometheus text exposition format"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -1,17 +1,23 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
 from app.db.models import MongoBaseModel, PyObjectId
 from app.core.config import settings
 
 class CodeSearchResult(BaseModel):
-    code: str
+    # None when a stored reference points at snippets that are no longer on disk
+    code: Optional[str] = None
+    language: Optional[str] = None
+    row: Optional[int] = None
+    version: Optional[str] = None
     similarity: float
-    distance: float
+    distance: Optional[float] = None
+    score: Optional[float] = None
 
 class ChatMessage(BaseModel):
+    id: Optional[str] = None
     message: str
-    language: str
+    language: Union[str, List[str]]
     timestamp: datetime = Field(default_factory=settings.get_current_time())
     results: Optional[List[CodeSearchResult]] = None
 
@@ -22,6 +28,24 @@ class ChatSession(MongoBaseModel):
     created_at: datetime = Field(default_factory=settings.get_current_time())
     updated_at: datetime = Field(default_factory=settings.get_current_time())
 
+class ChatSessionDetail(ChatSession):
+    # Cursor for the next (older) page of messages, None on the last page
+    next_cursor: Optional[str] = None
+
+class ChatSessionSummary(MongoBaseModel):
+    title: str = "Untitled Chat"
+    created_at: datetime
+    updated_at: datetime
+    message_count: int = 0
+
+class ChatSessionPage(BaseModel):
+    items: List[ChatSessionSummary]
+    # Cursor for the next page of less recently updated sessions, None on the last page
+    next_cursor: Optional[str] = None
+
+    class Config:
+        json_encoders = MongoBaseModel.Config.json_encoders
+
 class ChatSessionCreate(BaseModel):
     title: str = "Untitled Chat"
 
@@ -30,9 +54,34 @@ class ChatSessionUpdate(BaseModel):
 
 class ChatMessageCreate(BaseModel):
     message: str
-    language: str
+    language: Union[str, List[str]]
 
 class SearchQuery(BaseModel):
     query: str
-    language: str
-    top_k: int = 3
\ No newline at end of file
+    language: Union[str, List[str]]  # a language, a list of languages or "all"
+    top_k: int = 3
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    mode: Optional[str] = None  # "vector", "hybrid" or "lexical"
+
+class BatchSearchItem(BaseModel):
+    query: str
+    language: Union[str, List[str]]
+    top_k: int = 3
+
+class BatchSearchRequest(BaseModel):
+    items: List[BatchSearchItem]
+
+class BatchSearchItemResult(BaseModel):
+    results: Optional[List[CodeSearchResult]] = None
+    error: Optional[str] = None
+
+class IngestSnippet(BaseModel):
+    code: str
+    docstring: Optional[str] = None
+
+class IngestRequest(BaseModel):
+    snippets: List[IngestSnippet]
+
+class DeleteSnippetsRequest(BaseModel):
+    rows: List[int]  # global rows, as returned by ingestion or search results
@@ -0,0 +1,231 @@
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "ivf_sq", "hnsw")
+# Index types that store compressed codes, so their distances are approximate
+COMPRESSED_INDEX_TYPES = ("ivf_pq", "ivf_sq")
+# Full-precision vectors kept next to a compressed index for re-scoring its candidates
+RERANK_VECTORS_FILE = "vectors.npy"
+
+
+def index_file_name(index_type: str) -> str:
+    """File name of a language's index for the given index type"""
+    if index_type == "flat":
+        return "faiss_index.index"
+    return f"faiss_index.{index_type}.index"
+
+
+def build_index(vectors: np.ndarray, index_type: str) -> faiss.Index:
+    """Build an L2 index of the given type over `vectors`"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type in ("ivf_flat", "ivf_pq", "ivf_sq"):
+        # Keep at least ~39 training points per list, as faiss recommends
+        nlist = max(1, min(settings.IVF_NLIST, n // 39))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+        elif index_type == "ivf_sq":
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, settings.PQ_M, settings.PQ_NBITS)
+        index.train(vectors)
+        index.nprobe = settings.IVF_NPROBE
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, settings.HNSW_M, faiss.METRIC_L2)
+        index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+    else:
+        raise ValueError(f"Unknown index type: {index_type}. Supported: {INDEX_TYPES}")
+
+    index.add(vectors)
+    return index
+
+
+def write_index(index: faiss.Index, path: str):
+    """Write an index next to `path` and rename it into place, so a server that
+    memory-maps the old file keeps a valid mapping until it reloads"""
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def describe_index(index: faiss.Index) -> str:
+    """Return the index type name of a loaded index"""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    ivf = _extract_ivf(index)
+    if ivf is not None:
+        if isinstance(ivf, faiss.IndexIVFPQ):
+            return "ivf_pq"
+        if isinstance(ivf, faiss.IndexIVFScalarQuantizer):
+            return "ivf_sq"
+        return "ivf_flat"
+    return "flat"
+
+
+def write_rerank_vectors(vectors: np.ndarray, path: str, dtype: str = settings.RERANK_VECTORS_DTYPE):
+    """Save full-precision vectors for re-scoring, renamed into place like the index"""
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, np.ascontiguousarray(vectors, dtype=dtype))
+    os.replace(tmp_path, path)
+
+
+def append_rerank_vectors(path: str, vectors: np.ndarray, chunk_rows: int = 65536):
+    """Rewrite a vectors file with `vectors` appended, copying the old rows in chunks"""
+    old = np.load(path, mmap_mode="r")
+    tmp_path = path + ".tmp.npy"
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=old.dtype, shape=(len(old) + len(vectors), old.shape[1]))
+    for start in range(0, len(old), chunk_rows):
+        end = min(start + chunk_rows, len(old))
+        out[start:end] = old[start:end]
+    out[len(old):] = vectors
+    out.flush()
+    del out, old
+    os.replace(tmp_path, path)
+
+
+def rerank_neighbors(vectors: np.ndarray, queries: np.ndarray, I: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Re-score candidate ids with exact L2 distances against `vectors` and keep the k nearest.
+
+    `vectors` may be a float16 memory map; only the candidates' rows are read.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    found = I >= 0
+    candidates = np.asarray(vectors[np.where(found, I, 0).ravel()], dtype=np.float32).reshape(*I.shape, -1)
+    D = np.sum((candidates - queries[:, None, :]) ** 2, axis=2, dtype=np.float32)
+    D[~found] = np.finfo(np.float32).max
+    return merge_neighbors([(D, I)], k)
+
+
+def apply_default_search_params(index: faiss.Index):
+    """Set the configured nprobe / efSearch on a freshly loaded index"""
+    ivf = _extract_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = settings.IVF_NPROBE
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+
+
+def make_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None, selector=None):
+    """Build per-call search parameters, or None to use the index defaults"""
+    ivf = _extract_ivf(index)
+    if ivf is not None and (nprobe is not None or selector is not None):
+        nprobe = ivf.nprobe if nprobe is None else min(max(1, nprobe), settings.MAX_NPROBE)
+        return faiss.SearchParametersIVF(nprobe=int(nprobe), **({"sel": selector} if selector is not None else {}))
+    if isinstance(index, faiss.IndexHNSW) and (ef_search is not None or selector is not None):
+        ef_search = index.hnsw.efSearch if ef_search is None else min(max(1, ef_search), settings.MAX_EF_SEARCH)
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search), **({"sel": selector} if selector is not None else {}))
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+
+def search_index(
+    index: faiss.Index,
+    queries: np.ndarray,
+    k: int,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    exclude: Optional[np.ndarray] = None,
+):
+    """Search an index, applying per-call nprobe / efSearch when given and skipping the `exclude` ids"""
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    # Both selectors must outlive the search call
+    excluded = selector = None
+    if exclude is not None and len(exclude):
+        excluded = faiss.IDSelectorBatch(np.ascontiguousarray(exclude, dtype=np.int64))
+        selector = faiss.IDSelectorNot(excluded)
+    params = make_search_params(index, nprobe, ef_search, selector)
+    if params is None:
+        return index.search(queries, k)
+    return index.search(queries, k, params=params)
+
+
+def merge_neighbors(parts: Sequence[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Per query, the k nearest over several (distances, ids) results; missing hits (-1) sort last"""
+    D = np.hstack([part[0] for part in parts])
+    I = np.hstack([part[1] for part in parts])
+    if D.shape[1] < k:
+        # Fewer candidates than k overall: pad like faiss does
+        pad = k - D.shape[1]
+        D = np.hstack([D, np.full((len(D), pad), np.finfo(np.float32).max, dtype=D.dtype)])
+        I = np.hstack([I, np.full((len(I), pad), -1, dtype=I.dtype)])
+    order = np.argsort(np.where(I >= 0, D, np.inf), axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+
+def recall_at_k(exact_ids: np.ndarray, approx_ids: np.ndarray, k: int) -> float:
+    """Fraction of the exact top-k neighbours found in the approximate top-k"""
+    found = 0
+    for exact_row, approx_row in zip(exact_ids[:, :k], approx_ids[:, :k]):
+        found += len(set(exact_row[exact_row >= 0]) & set(approx_row[approx_row >= 0]))
+    return found / float(exact_ids[:, :k].size)
+
+
+def recall_report(
+    exact_index: faiss.Index,
+    approx_index: faiss.Index,
+    queries: np.ndarray,
+    k: int = 10,
+    nprobes: Optional[List[int]] = None,
+    ef_searches: Optional[List[int]] = None,
+    rerank_vectors: Optional[np.ndarray] = None,
+    rerank_factor: int = settings.RERANK_FACTOR,
+) -> List[Dict[str, float]]:
+    """Recall@k and per-query latency of `approx_index` against the exact index.
+
+    With `rerank_vectors`, each point also reports recall and the mean relative
+    distance error after re-scoring `rerank_factor * k` candidates.
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    exact_distances, exact_ids = exact_index.search(queries, k)
+
+    if _extract_ivf(approx_index) is not None:
+        points = [{"nprobe": n} for n in (nprobes or [1, 4, 16, 64, 256])]
+    elif isinstance(approx_index, faiss.IndexHNSW):
+        points = [{"ef_search": ef} for ef in (ef_searches or [16, 32, 64, 128, 256])]
+    else:
+        points = [{}]
+
+    report = []
+    for point in points:
+        start = time.perf_counter()
+        _, approx_ids = search_index(approx_index, queries, k, **point)
+        elapsed = time.perf_counter() - start
+        result = {
+            **point,
+            f"recall@{k}": recall_at_k(exact_ids, approx_ids, k),
+            "ms_per_query": elapsed * 1000 / len(queries),
+        }
+        if rerank_vectors is not None:
+            start = time.perf_counter()
+            _, candidates = search_index(approx_index, queries, k * max(1, rerank_factor), **point)
+            reranked_distances, reranked_ids = rerank_neighbors(rerank_vectors, queries, candidates, k)
+            elapsed = time.perf_counter() - start
+            # Rank-by-rank against the exact distances, over the ranks both found
+            valid = (exact_ids >= 0) & (reranked_ids >= 0)
+            error = np.abs(reranked_distances - exact_distances)[valid] / np.maximum(exact_distances[valid], 1e-6)
+            result.update({
+                f"rerank_recall@{k}": recall_at_k(exact_ids, reranked_ids, k),
+                "rerank_distance_error": float(np.mean(error)) if error.size else 0.0,
+                "rerank_ms_per_query": elapsed * 1000 / len(queries),
+            })
+        report.append(result)
+    return report
+
+
+def _extract_ivf(index: faiss.Index):
+    try:
+        return faiss.downcast_index(faiss.extract_index_ivf(index))
+    except RuntimeError:
+        return None
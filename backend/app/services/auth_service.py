@@ -1,5 +1,5 @@
 from app.core.config import settings
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash_async, invalidate_cached_user
 from app.models.user import UserCreate, UserInDB, User
 from app.db.mongodb import get_database
 from datetime import datetime
@@ -26,7 +26,7 @@ class AuthService:
         user_dict = {
             "_id": ObjectId(),  # Explicitly create ObjectId
             **user_data.dict(),
-            "hashed_password": get_password_hash(user_data.password),
+            "hashed_password": await get_password_hash_async(user_data.password),
             "created_at": settings.get_current_time()
         }
         
@@ -57,7 +57,10 @@ class AuthService:
         
         # If password is provided, hash it
         if "password" in update_data and update_data["password"]:
-            update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+            update_data["hashed_password"] = await get_password_hash_async(update_data.pop("password"))
+        
+        # Remember the current username so a rename invalidates the old cache entry too
+        previous_user = await user_collection.find_one({"_id": ObjectId(user_id)}, {"username": 1})
         
         # Update user
         await user_collection.update_one(
@@ -67,6 +70,9 @@ class AuthService:
         
         # Return updated user
         updated_user = await user_collection.find_one({"_id": ObjectId(user_id)})
+        if previous_user is not None and previous_user["username"] != updated_user["username"]:
+            invalidate_cached_user(previous_user["username"])
+        invalidate_cached_user(updated_user["username"])
         return User(**updated_user)
 
 # Create singleton instance
@@ -0,0 +1,132 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.services.code_search import code_search_service
+from app.services.snippet_store import snippet_hash
+
+
+def to_result_refs(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Strip the code text from hits that can be re-read from the snippet store.
+
+    A stored reference keeps language, row, version, a hash of the code and the
+    scores; hits without a row (or a version) keep their full copy.
+    """
+    refs = []
+    for hit in results or []:
+        if hit.get("row") is not None and hit.get("version") and isinstance(hit.get("code"), str):
+            ref = {key: value for key, value in hit.items() if key != "code"}
+            ref["code_hash"] = snippet_hash(hit["code"])
+            hit = ref
+        refs.append(hit)
+    return refs
+
+
+async def hydrate_results(messages: Sequence[Dict[str, Any]]):
+    """Fill in the code text of stored references in place.
+
+    Rows are collected across all messages and read once per language, so a
+    snippet that shows up in several messages is only decoded once. A reference
+    is filled in while its row still holds the same code (by hash), whatever the
+    data version; older references without a hash need their version to match.
+    """
+    wanted: Dict[str, set] = {}
+    for message in messages:
+        for hit in message.get("results") or []:
+            if hit.get("code") is None and hit.get("row") is not None:
+                wanted.setdefault(hit["language"], set()).add(hit["row"])
+    if not wanted:
+        return
+
+    languages = list(wanted)
+    fetched = await asyncio.gather(*(
+        code_search_service.get_snippets(language, sorted(wanted[language]))
+        for language in languages
+    ))
+    snippets = dict(zip(languages, fetched))
+
+    for message in messages:
+        for hit in message.get("results") or []:
+            if hit.get("code") is not None or hit.get("row") is None:
+                continue
+            version, codes = snippets[hit["language"]]
+            code = codes.get(hit["row"])
+            if code is None:
+                continue
+            if hit.get("code_hash") is not None:
+                if snippet_hash(code) == hit["code_hash"]:
+                    hit["code"] = code
+            elif hit.get("version") == version:
+                hit["code"] = code
+
+
+async def freeze_stale_results(
+    db,
+    language: str,
+    versions: Sequence[str],
+    lookup: Callable[[str, List[int]], Awaitable[Optional[Dict[int, str]]]],
+    current: Optional[Callable[[List[int]], Awaitable[Dict[int, str]]]] = None,
+) -> int:
+    """Copy the code into stored references to `language` at any of `versions`.
+
+    Run this after a reload while the replaced version is still readable, so
+    history that points at its rows keeps its code. `lookup(version, rows)`
+    returns the code of those rows at that version, or None once the version
+    is gone. With `current(rows)`, references whose row still holds the same
+    code are left as references. Returns the number of messages updated.
+    """
+    versions = [version for version in versions if version]
+    if not versions:
+        return 0
+    message_collection = db[settings.DATABASE_NAME]["chat_messages"]
+    cursor = message_collection.find(
+        {"results": {"$elemMatch": {"language": language, "version": {"$in": versions}, "code": {"$exists": False}}}},
+        {"results": 1}
+    )
+
+    updated = 0
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= 500:
+            updated += await _freeze_batch(message_collection, language, versions, lookup, current, batch)
+            batch = []
+    if batch:
+        updated += await _freeze_batch(message_collection, language, versions, lookup, current, batch)
+    return updated
+
+
+def _stale_hits(doc: Dict[str, Any], language: str, versions: Sequence[str]):
+    for hit in doc["results"]:
+        if hit.get("language") == language and hit.get("version") in versions and "code" not in hit and hit.get("row") is not None:
+            yield hit
+
+
+async def _freeze_batch(message_collection, language: str, versions: Sequence[str], lookup, current, docs: List[Dict[str, Any]]) -> int:
+    wanted: Dict[str, set] = {}
+    for doc in docs:
+        for hit in _stale_hits(doc, language, versions):
+            wanted.setdefault(hit["version"], set()).add(hit["row"])
+    codes = {version: await lookup(version, sorted(rows)) for version, rows in wanted.items()}
+    unchanged: Dict[int, str] = {}
+    if current is not None:
+        rows = set().union(*wanted.values()) if wanted else set()
+        unchanged = {row: snippet_hash(code) for row, code in (await current(sorted(rows))).items()}
+
+    updates = []
+    for doc in docs:
+        changed = False
+        for hit in _stale_hits(doc, language, versions):
+            if hit.get("code_hash") is not None and unchanged.get(hit["row"]) == hit["code_hash"]:
+                continue
+            code = (codes.get(hit["version"]) or {}).get(hit["row"])
+            if code is not None:
+                hit["code"] = code
+                changed = True
+        if changed:
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"results": doc["results"]}}))
+    if updates:
+        await message_collection.bulk_write(updates, ordered=False)
+    return len(updates)
@@ -1,123 +1,1010 @@
+import asyncio
+import contextvars
+import heapq
 import os
+import time
 import numpy as np
 import torch
 import pickle
 import faiss
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
 from tqdm import tqdm
 
 from app.core.config import settings
+from app.core.metrics import current_trace, metrics, span
+from app.services.ann_index import (
+    COMPRESSED_INDEX_TYPES, RERANK_VECTORS_FILE, apply_default_search_params, describe_index, index_file_name,
+)
+from app.services.delta_segment import (
+    DeltaSegment, StaleSegmentError, current_generation, delta_dir, delta_lock, lexical_search_segments, main_code_list,
+    search_segments, with_delta,
+)
 from app.services.embeddings import load_model_tokenizer
+from app.services.inference_scheduler import InferenceQueueFullError, InferenceScheduler
+from app.services.language_registry import LanguageRegistry
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.services.query_cache import query_cache
+from app.services.sharded_search import configure_faiss_threads, shard_index, shutdown_shard_pool
+from app.services.worker_pool import connect_or_start_pool
+from app.services.snippet_store import DocstringLookup, SnippetStore, data_version, normalize_docstring, snippets_version
 
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 
+SEARCH_MODES = ("vector", "hybrid", "lexical")
+
 class CodeSearchService:
     def __init__(self):
         self.model = None
         self.tokenizer = None
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.language_data = {}
+        self.registry = LanguageRegistry(self.read_language_data, on_loaded=self._on_language_loaded)
+        self.scheduler = None
+        self.cache = query_cache
         self.initialized = False
+        self._init_lock = asyncio.Lock()
+        self.pool = None
+        self._warm_up_task: Optional[asyncio.Task] = None
+        # Versions replaced by a reload, kept readable for a grace period: language -> version -> data
+        self._retired: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # Serializes reloads, ingestion and deletions per language
+        self._write_locks: Dict[str, asyncio.Lock] = {}
+        # Snippet-only views of languages that are not loaded, for hydrating chat history
+        self._snippet_stores: Dict[str, Dict[str, Any]] = {}
+        # language -> (last check, delta generation seen on disk) for refresh_deltas
+        self._delta_checks: Dict[str, Tuple[float, Optional[int]]] = {}
         
     async def initialize(self):
-        """Initialize the model and load embeddings for all languages"""
-        if self.initialized:
-            return
+        """Load the model while the hot languages load alongside it; other languages load lazily"""
+        async with self._init_lock:
+            if self.initialized:
+                return
             
-        # Load model and tokenizer
-        self.model, self.tokenizer = await load_model_tokenizer()
-        
-        # Load embeddings for all supported languages
-        for language in settings.SUPPORTED_LANGUAGES:
-            await self.load_language_data(language)
+            configure_faiss_threads()
             
+            # Languages and the model load concurrently on executor threads
+            for language in settings.PRELOAD_LANGUAGES:
+                self.registry.prefetch(language)
+                
+            # Load model and tokenizer (pool workers may already share a preloaded one)
+            if self.model is None:
+                self.model, self.tokenizer = await load_model_tokenizer()
+            
+            # Start the micro-batching scheduler for query embeddings
+            self.scheduler = InferenceScheduler(self.embed_queries)
+            self.scheduler.start()
+            
+            if settings.STARTUP_WARMUP:
+                self._warm_up_task = asyncio.get_running_loop().create_task(self.warm_up())
+                
+            self.initialized = True
+    
+    async def warm_up(self):
+        """Run a forward pass per length bucket and one search per loaded language,
+        so the first real requests do not pay for lazy kernel and page-cache setup"""
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            query_embedding = await loop.run_in_executor(None, self._warm_up_encoder)
+            await self.registry.wait_for_loads()
+            for language in self.registry.loaded_languages():
+                data = self.registry.peek(language)
+                if data is not None:
+                    await loop.run_in_executor(None, self.search_language_batch, language, data, query_embedding, 1)
+        except Exception as e:
+            print(f"Warning: warm-up failed: {e}")
+            return
+        print(f"Warm-up done in {time.perf_counter() - start:.1f}s")
+    
+    def _warm_up_encoder(self) -> np.ndarray:
+        lengths = sorted(set(b for b in settings.EMBEDDING_LENGTH_BUCKETS if b < 512)) or [16]
+        texts = [" ".join(["def"] * max(1, length - 2)) for length in lengths]
+        return self.get_embeddings(texts, batch_size=1)[:1].astype(np.float32)
+    
+    def readiness(self) -> Dict[str, Any]:
+        """Whether startup has finished here: model loaded, warm-up run and no hot language still loading"""
+        loaded = self.registry.loaded_languages()
+        loading = self.registry.loading_languages()
+        warmed_up = self._warm_up_task.done() if self._warm_up_task is not None else self.initialized
+        ready = self.initialized and warmed_up and not any(l in loading for l in settings.PRELOAD_LANGUAGES)
+        return {
+            "ready": ready,
+            "model_loaded": self.model is not None,
+            "warmed_up": warmed_up,
+            "languages": {
+                "loaded": loaded,
+                "loading": loading,
+                "unavailable": [l for l in settings.PRELOAD_LANGUAGES if l not in loaded and l not in loading],
+            },
+        }
+    
+    async def check_readiness(self) -> Dict[str, Any]:
+        """readiness() of this process, or of a pool worker when searches run in the pool"""
+        if self.pool is None:
+            return self.readiness()
+        try:
+            status = await asyncio.wait_for(self.pool.call("status"), timeout=settings.SEARCH_POOL_CONNECT_TIMEOUT)
+        except (asyncio.TimeoutError, ConnectionError, OSError) as e:
+            return {"ready": False, "pool": str(e)}
+        return {**status, "pool": True}
+        
+    async def attach_pool(self):
+        """Serve searches from the shared worker pool instead of an in-process model"""
+        loop = asyncio.get_running_loop()
+        self.pool = await loop.run_in_executor(None, connect_or_start_pool)
         self.initialized = True
         
+    async def shutdown(self):
+        """Stop background workers"""
+        if self.scheduler:
+            self.scheduler.stop()
+        shutdown_shard_pool()
+        if self.pool:
+            # The pool outlives this web worker; it stops once its last client has gone
+            self.pool.close()
+    
+    def prefetch_language(self, language: str):
+        """Start loading a language in the background, wherever searches run"""
+        if self.pool is not None:
+            asyncio.get_running_loop().create_task(self.pool.call("prefetch", language=language))
+        else:
+            self.registry.prefetch(language)
+        
     async def load_language_data(self, language: str):
         """Load metadata and index for a specific language"""
-        embedding_dir = os.path.join(settings.MODEL_DIR, language)
+        return await self.registry.load(language) is not None
         
-        # Define file paths
-        metadata_file = os.path.join(embedding_dir, "metadata.pkl")
-        index_file = os.path.join(embedding_dir, "faiss_index.index")
+    def _on_language_loaded(self, language: str, data: Dict[str, Any]):
+        self.cache.bump_index_version(language)
+        print(f"Loaded data for {language}: {len(data['code_list'])} code samples ({describe_index(data['index'])} index)")
         
-        # Check if files exist
-        if not all(os.path.exists(f) for f in [metadata_file, index_file]):
+    def read_language_data(self, language: str) -> Optional[Dict[str, Any]]:
+        """Read a language's snippets and index from disk (blocking)"""
+        if language not in settings.SUPPORTED_LANGUAGES:
+            return None
+        # Hold the delta lock so a compaction cannot replace files halfway through the read
+        if not os.path.isdir(delta_dir(language)):
+            return self._read_language_files(language)
+        with delta_lock(language):
+            return self._read_language_files(language)
+    
+    def _read_language_files(self, language: str) -> Optional[Dict[str, Any]]:
+        paths = language_paths(language)
+        if paths is None:
             print(f"Warning: Missing data files for {language}")
-            return False
+            return None
+        metadata_file = paths["metadata"]
+        code_store_prefix = paths["code_store"]
+        docstring_store_prefix = paths["docstring_store"]
+        docstring_lookup_file = paths["docstring_lookup"]
+        index_file = paths["index"]
+        docstring_embeddings_file = paths["docstring_embeddings"]
+        lexical_file = paths["lexical"]
+        vectors_file = paths["vectors"]
+        version = data_version(paths["versioned"])
+        
+        # Load snippets: memory-mapped store when converted, pickled metadata otherwise
+        if paths["snippet_store"]:
+            code_list = SnippetStore(code_store_prefix)
+            docstring_list = SnippetStore(docstring_store_prefix) if SnippetStore.exists(docstring_store_prefix) else []
+            snippet_version = SnippetStore.content_version(code_store_prefix)
+        else:
+            with open(metadata_file, 'rb') as f:
+                metadata = pickle.load(f)
+            code_list = metadata["code_list"]
+            docstring_list = metadata.get("docstring_list", [])
+            snippet_version = snippets_version(code_list)
+        
+        # Load FAISS index, memory-mapped where the index type supports it
+        index = None
+        if settings.FAISS_MMAP:
+            try:
+                index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                index = None
+        if index is None:
+            index = faiss.read_index(index_file)
+        apply_default_search_params(index)
         
-        # Load metadata
-        with open(metadata_file, 'rb') as f:
-            metadata = pickle.load(f)
+        # Exact-docstring fast path: normalized docstring -> row id, plus the
+        # precomputed query-side docstring embeddings when they were exported
+        docstring_lookup = None
+        docstring_embeddings = None
+        if settings.DOCSTRING_FAST_PATH:
+            if os.path.exists(docstring_lookup_file):
+                docstring_lookup = DocstringLookup.load(docstring_lookup_file, docstring_list)
+            else:
+                docstring_lookup = DocstringLookup.build(docstring_list)
+            if os.path.exists(docstring_embeddings_file):
+                docstring_embeddings = np.load(docstring_embeddings_file, mmap_mode="r")
         
-        # Load FAISS index
-        index = faiss.read_index(index_file)
+        # BM25 index over docstrings and code for hybrid / lexical search
+        lexical = None
+        if BM25Index.exists(lexical_file):
+            lexical = BM25Index.load(lexical_file)
+        elif settings.LEXICAL_BUILD_ON_LOAD:
+            lexical = build_lexical_index(code_list, docstring_list)
+            lexical.save(lexical_file)
         
-        # Store data
-        self.language_data[language] = {
-            "code_list": metadata["code_list"],
-            "docstring_list": metadata.get("docstring_list", []),
-            "index": index
+        # Full-precision vectors for re-scoring a compressed index's candidates;
+        # memory-mapped, so only the candidates' pages are ever read
+        rerank_vectors = None
+        if settings.RERANK_FACTOR > 0 and describe_index(index) in COMPRESSED_INDEX_TYPES and os.path.exists(vectors_file):
+            rerank_vectors = np.load(vectors_file, mmap_mode="r")
+            if rerank_vectors.shape != (index.ntotal, index.d):
+                print(f"Warning: ignoring {vectors_file}, its shape {rerank_vectors.shape} does not match the index ({index.ntotal}, {index.d})")
+                rerank_vectors = None
+        
+        data = {
+            # Fingerprint of the data files: a change means the language needs a reload
+            "version": version,
+            # Content version of the snippets, stored with search hits and chat references
+            "snippet_version": snippet_version,
+            "code_list": code_list,
+            "docstring_list": docstring_list,
+            "docstring_lookup": docstring_lookup,
+            "docstring_embeddings": docstring_embeddings,
+            "lexical": lexical,
+            "index": index,
+            "rerank_vectors": rerank_vectors,
+            # Row-range shards of an exact index, searched in parallel when SEARCH_SHARDS > 1
+            "shards": shard_index(index),
         }
+        # Snippets ingested since the index was built
+        return with_delta(data, self._read_delta(language, version, index.ntotal))
+    
+    @staticmethod
+    def _read_delta(language: str, version: str, main_rows: int, previous: Optional[DeltaSegment] = None) -> Optional[DeltaSegment]:
+        """The delta segment on disk, if it was built on this version of the index (call under delta_lock)"""
+        if current_generation(language) is None:
+            return None
+        delta = DeltaSegment.load(language, previous)
+        if delta is not None and (delta.base_version != version or delta.base_rows != main_rows):
+            print(f"Warning: ignoring the {language} delta segment ({delta.rows} rows), it was built on another version of the index")
+            return None
+        return delta
+        
+    async def get_snippets(self, language: str, rows: List[int], version: Optional[str] = None) -> Tuple[Optional[str], Dict[int, str]]:
+        """Code text for a language's rows, with the snippet version it was read from.
+        
+        Uses the loaded language when there is one, and otherwise only opens the
+        memory-mapped snippet store instead of loading the index. With `version`
+        (a snippet version), data retired by a reload that is still in its grace
+        period is used.
+        """
+        data = None
+        if version:
+            data = next((d for d in self._retired.get(language, {}).values() if d["snippet_version"] == version), None)
+        if data is None:
+            data = self.registry.peek(language) or self._open_snippet_store(language)
+        if data is None or (version and data["snippet_version"] != version):
+            if self.pool is not None:
+                return await self.pool.call("snippets", language=language, rows=rows, version=version)
+            if data is None:
+                data = await self.registry.get(language)
+        if data is None:
+            return None, {}
+        code_list = data["code_list"]
+        return data["snippet_version"], {row: code_list[row] for row in rows if 0 <= row < len(code_list)}
+    
+    def _open_snippet_store(self, language: str) -> Optional[Dict[str, Any]]:
+        if language not in settings.SUPPORTED_LANGUAGES:
+            return None
+        paths = language_paths(language)
+        if paths is None or not paths["snippet_store"]:
+            return None
+        version = data_version(paths["versioned"])
+        generation = current_generation(language)
+        cached = self._snippet_stores.get(language)
+        if cached is not None and cached["version"] == version and cached["generation"] == generation:
+            return cached
+        if cached is not None:
+            main_code_list(cached).close()
+        code_list = SnippetStore(paths["code_store"])
+        previous = cached.get("delta") if cached is not None else None
+        delta = self._read_locked_delta(language, version, len(code_list), previous) if generation is not None else None
+        store = with_delta({
+            "version": version,
+            "snippet_version": SnippetStore.content_version(paths["code_store"]),
+            "generation": generation,
+            "code_list": code_list,
+        }, delta)
+        self._snippet_stores[language] = store
+        return store
+    
+    async def reload_language(self, language: str, force: bool = False) -> Dict[str, Any]:
+        """Load a language's files again in the background and swap them in.
         
-        print(f"Loaded data for {language}: {len(metadata['code_list'])} code samples")
-        return True
+        The new data is checked (row count against the index, dimension against
+        the version it replaces) and warmed with one search before the swap, so
+        no request waits on it. Searches that already hold the old data finish on
+        it; the old version stays readable for chat history for
+        RELOAD_GRACE_SECONDS and is then released.
+        """
+        if language not in settings.SUPPORTED_LANGUAGES:
+            raise ValueError(f"Language {language} not supported")
+        async with self._write_lock(language):
+            start = time.perf_counter()
+            await self.registry.wait_for_loads()
+            old = self.registry.peek(language)
+            paths = language_paths(language)
+            if paths is None:
+                raise ValueError(f"Missing data files for {language}")
+            if old is not None and not force and data_version(paths["versioned"]) == old["version"]:
+                return {"language": language, "status": "unchanged", "version": old["version"]}
+            
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(None, self.read_language_data, language)
+            if data is None:
+                raise ValueError(f"Missing data files for {language}")
+            self._validate_reload(language, data, old)
+            
+            # Touch the new index once off the event loop so the first request after the swap is not cold
+            probe = np.zeros((1, data["index"].d), dtype=np.float32)
+            await loop.run_in_executor(None, self.search_language_batch, language, data, probe, 1)
+            
+            self.registry.replace(language, data)
+            if old is not None and old["version"] != data["version"]:
+                self._retired.setdefault(language, {})[old["version"]] = old
+                loop.call_later(settings.RELOAD_GRACE_SECONDS, self._release_retired, language, old["version"])
+            return {
+                "language": language,
+                "status": "reloaded",
+                "previous_version": old["version"] if old is not None else None,
+                "version": data["version"],
+                "previous_snippet_version": old["snippet_version"] if old is not None else None,
+                "snippet_version": data["snippet_version"],
+                "rows": len(data["code_list"]),
+                "dimension": int(data["index"].d),
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+    
+    @staticmethod
+    def _validate_reload(language: str, data: Dict[str, Any], old: Optional[Dict[str, Any]]):
+        index = data["index"]
+        rows = len(main_code_list(data))
+        if index.ntotal != rows:
+            raise ValueError(f"{language}: index has {index.ntotal} vectors but there are {rows} snippets")
+        if data["lexical"] is not None and len(data["lexical"].doc_lengths) != rows:
+            raise ValueError(f"{language}: BM25 index covers {len(data['lexical'].doc_lengths)} rows, expected {rows}")
+        if old is not None and index.d != old["index"].d:
+            raise ValueError(f"{language}: index dimension {index.d} does not match the loaded {old['index'].d}")
+    
+    def _release_retired(self, language: str, version: str):
+        # In-flight searches keep their own reference; the data is freed once they finish
+        self._retired.get(language, {}).pop(version, None)
+    
+    def language_status(self) -> List[Dict[str, Any]]:
+        """Version, size, delta segment and retired versions of each loaded language"""
+        status = []
+        for language in self.registry.loaded_languages():
+            data = self.registry.peek(language)
+            delta = data.get("delta")
+            status.append({
+                "language": language,
+                "version": data["version"],
+                "snippet_version": data["snippet_version"],
+                "rows": len(data["code_list"]),
+                "delta_rows": delta.rows if delta is not None else 0,
+                "delta_generation": delta.generation if delta is not None else None,
+                "tombstones": len(delta.tombstones) if delta is not None else 0,
+                "rerank": data.get("rerank_vectors") is not None,
+                "memory_bytes": self.registry.memory_of(language),
+                "retired_versions": list(self._retired.get(language, {})),
+            })
+        return status
+    
+    async def check_language_status(self) -> List[Dict[str, Any]]:
+        """language_status() of this process, or of a pool worker when searches run in the pool"""
+        if self.pool is None:
+            return self.language_status()
+        return await self.pool.call("languages")
+    
+    def _write_lock(self, language: str) -> asyncio.Lock:
+        return self._write_locks.setdefault(language, asyncio.Lock())
+    
+    async def ingest(self, language: str, snippets: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Embed new snippets and append them to the language's delta segment.
+        
+        Costs time in the number of new snippets (amortized, see DeltaSegment),
+        never the main index's or the delta segment's size. Returns the global
+        rows the snippets got.
+        """
+        if self.pool is not None:
+            result = await self.pool.call("ingest", language=language, snippets=snippets)
+            await self.sync_delta(language)
+            return result
         
-    async def search(self, query: str, language: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Search for code snippets matching the query"""
         if not self.initialized:
             await self.initialize()
-            
-        if language not in self.language_data:
-            await self.load_language_data(language)
-            if language not in self.language_data:
+        async with self._write_lock(language):
+            data = await self.registry.get(language)
+            if data is None:
                 raise ValueError(f"Language {language} not supported or data not available")
+            code = [snippet["code"] for snippet in snippets]
+            docstrings = [snippet.get("docstring") or "" for snippet in snippets]
+            loop = asyncio.get_running_loop()
+            with span("embed"):
+                vectors = await loop.run_in_executor(
+                    None, self.get_embeddings, code, "", 512, settings.INGEST_EMBED_BATCH_SIZE
+                )
+            delta, rows = await loop.run_in_executor(
+                None, self._update_delta, language, data, lambda delta: delta.appended(vectors, code, docstrings)
+            )
+            self.registry.replace(language, with_delta(data, delta))
+        return {"language": language, "version": data["version"], "rows": rows, "delta_rows": delta.rows}
+    
+    async def delete_snippets(self, language: str, rows: List[int]) -> Dict[str, Any]:
+        """Tombstone global rows so searches no longer return them"""
+        if self.pool is not None:
+            result = await self.pool.call("delete_snippets", language=language, rows=rows)
+            await self.sync_delta(language)
+            return result
         
-        # Create query embedding
-        query_embedding = self.get_embeddings([query], prefix="Query", max_length=512)
+        async with self._write_lock(language):
+            data = await self.registry.get(language)
+            if data is None:
+                raise ValueError(f"Language {language} not supported or data not available")
+            loop = asyncio.get_running_loop()
+            delta, _ = await loop.run_in_executor(
+                None, self._update_delta, language, data, lambda delta: (delta.without(rows), None)
+            )
+            self.registry.replace(language, with_delta(data, delta))
+        return {"language": language, "version": data["version"], "deleted": len(set(rows)), "tombstones": len(delta.tombstones)}
+    
+    @staticmethod
+    def _update_delta(language: str, data: Dict[str, Any], change) -> Tuple[DeltaSegment, Any]:
+        """Apply `change` to the latest delta segment on disk and save the result (blocking)"""
+        with delta_lock(language):
+            paths = language_paths(language)
+            if paths is None or data_version(paths["versioned"]) != data["version"]:
+                raise StaleSegmentError(f"The {language} index changed on disk; reload it before changing its snippets")
+            delta = data.get("delta")
+            if delta is None or delta.generation != current_generation(language):
+                # Another process changed the segment since this one read it
+                delta = DeltaSegment.load(language, delta)
+            if delta is None or delta.base_version != data["version"]:
+                delta = DeltaSegment.empty(
+                    data["version"], data["index"].ntotal, data["index"].d, generation=current_generation(language) or 0
+                )
+            delta, result = change(delta)
+            delta.save(language)
+        return delta, result
+    
+    def _read_locked_delta(self, language: str, version: str, main_rows: int, previous: Optional[DeltaSegment] = None) -> Optional[DeltaSegment]:
+        with delta_lock(language):
+            return self._read_delta(language, version, main_rows, previous)
+    
+    async def sync_delta(self, language: str) -> Dict[str, Any]:
+        """Pick up a delta segment another process wrote, if the language is loaded here"""
+        if self.pool is not None:
+            return {"language": language, "workers": await self.pool.call("sync_delta", language=language)}
+        async with self._write_lock(language):
+            data = self.registry.peek(language)
+            if data is None:
+                return {"language": language, "status": "not_loaded"}
+            delta = data.get("delta")
+            generation = current_generation(language)
+            if generation is None or (delta is not None and delta.generation == generation):
+                return {"language": language, "status": "unchanged"}
+            loop = asyncio.get_running_loop()
+            delta = await loop.run_in_executor(None, self._read_locked_delta, language, data["version"], data["index"].ntotal, delta)
+            if delta is None:
+                return {"language": language, "status": "stale"}
+            self.registry.replace(language, with_delta(data, delta))
+            return {"language": language, "status": "synced", "delta_rows": delta.rows, "tombstones": len(delta.tombstones)}
+    
+    async def refresh_deltas(self, languages: List[str]):
+        """Swap in delta segments that other processes wrote for these loaded languages.
+        
+        Runs before searches and checks each language at most every
+        DELTA_SYNC_INTERVAL_SECONDS, so every web worker stops returning deleted
+        rows and starts returning ingested ones without the index watcher.
+        """
+        if settings.DELTA_SYNC_INTERVAL_SECONDS < 0:
+            return
+        now = time.monotonic()
+        for language in languages:
+            data = self.registry.peek(language)
+            checked_at, seen = self._delta_checks.get(language, (0.0, None))
+            if data is None or now - checked_at < settings.DELTA_SYNC_INTERVAL_SECONDS:
+                continue
+            generation = current_generation(language)
+            self._delta_checks[language] = (now, generation)
+            delta = data.get("delta")
+            if generation is None or generation == seen or (delta is not None and delta.generation == generation):
+                continue
+            loop = asyncio.get_running_loop()
+            try:
+                delta = await loop.run_in_executor(None, self._read_locked_delta, language, data["version"], data["index"].ntotal, delta)
+            except Exception as e:
+                print(f"Warning: could not read the {language} delta segment: {e}")
+                continue
+            # An ingest, sync or reload that replaced the data meanwhile already has a newer segment
+            if delta is not None and self.registry.peek(language) is data:
+                self.registry.replace(language, with_delta(data, delta))
+    
+    def resolve_languages(self, language: Union[str, List[str]]) -> List[str]:
+        """Expand "all" or a list of languages into validated language names"""
+        if isinstance(language, str):
+            languages = settings.SUPPORTED_LANGUAGES if language == "all" else [language]
+        else:
+            languages = list(dict.fromkeys(language))
+        if not languages:
+            raise ValueError("At least one language is required")
+        unsupported = [l for l in languages if l not in settings.SUPPORTED_LANGUAGES]
+        if unsupported:
+            raise ValueError(f"Language {', '.join(unsupported)} not supported. Supported languages: {settings.SUPPORTED_LANGUAGES}")
+        return languages
+        
+    async def search(
+        self,
+        query: str,
+        language: Union[str, List[str]],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        mode: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Search for code snippets matching the query in one, several or "all" languages
+
+        `mode` is "vector" (embeddings only), "hybrid" (vector and BM25 candidates
+        fused with reciprocal rank fusion) or "lexical" (BM25 only, no model).
+        """
+        if self.pool is not None:
+            with span("search_pool"):
+                return await self.pool.call(
+                    "search", query=query, language=language, top_k=top_k, nprobe=nprobe, ef_search=ef_search, mode=mode
+                )
         
-        # Get index and code list
-        index = self.language_data[language]["index"]
-        code_list = self.language_data[language]["code_list"]
+        languages = self.resolve_languages(language)
+        trace = current_trace()
+        if trace is not None:
+            trace.set_languages(languages)
+        mode = mode or settings.SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}. Supported: {SEARCH_MODES}")
+        # Before the result cache: picking up another worker's change bumps its version
+        await self.refresh_deltas(languages)
+        with span("result_cache"):
+            cached_results = self.cache.get_results(query, languages, top_k, _result_params(nprobe, ef_search, mode))
+        if cached_results is not None:
+            return cached_results
+        
+        if not self.initialized:
+            await self.initialize()
+            
+        # Loads languages on first use; concurrent callers share one load
+        with span("language_load"):
+            loaded = await asyncio.gather(*[self.registry.get(l) for l in languages])
+        available = [(l, data) for l, data in zip(languages, loaded) if data is not None]
+        if not available or (language != "all" and len(available) < len(languages)):
+            missing = [l for l, data in zip(languages, loaded) if data is None]
+            raise ValueError(f"Language {', '.join(missing)} not supported or data not available")
+        
+        # Create query embedding once: cached vector, corpus docstring vector, or the encoder
+        # (batched with concurrent requests off the event loop)
+        query_embedding = None
+        if mode != "lexical":
+            with span("embedding_lookup"):
+                query_embedding = self.cache.get_embedding(query)
+                if query_embedding is None and len(available) == 1:
+                    query_embedding = self.get_docstring_embedding(query, available[0][1])
+        if query_embedding is None and mode != "lexical":
+            try:
+                with span("embed"):
+                    query_embedding = await self.scheduler.embed(query)
+                self.cache.set_embedding(query, query_embedding)
+            except InferenceQueueFullError:
+                # Degrade to BM25 when inference is saturated, if every index has it
+                if not settings.LEXICAL_FALLBACK or any(data["lexical"] is None for _, data in available):
+                    raise
+                mode = "lexical"
+        
+        if len(available) == 1:
+            results = self.search_language(available[0][0], available[0][1], query_embedding, top_k, nprobe, ef_search, query, mode)
+        else:
+            # Fan out to every index in parallel (FAISS releases the GIL), then merge
+            # (each task gets a copy of the context so its stage spans reach this request)
+            loop = asyncio.get_running_loop()
+            partials = await asyncio.gather(*[
+                loop.run_in_executor(
+                    None, contextvars.copy_context().run,
+                    self.search_language, l, data, query_embedding, top_k, nprobe, ef_search, query, mode
+                )
+                for l, data in available
+            ])
+            with span("merge"):
+                merged = (r for partial in partials for r in partial)
+                if mode == "vector":
+                    results = heapq.nsmallest(top_k, merged, key=lambda r: r["distance"])
+                else:
+                    results = heapq.nlargest(top_k, merged, key=lambda r: r["score"])
+        
+        # Keyed by the mode that actually ran, so a lexical fallback is not served to later vector searches
+        self.cache.set_results(query, languages, top_k, results, _result_params(nprobe, ef_search, mode))
+        return results
+    
+    def search_language(
+        self,
+        language: str,
+        data: Dict[str, Any],
+        query_embedding: np.ndarray,
+        top_k: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        query: str = "",
+        mode: str = "vector"
+    ) -> List[Dict[str, Any]]:
+        """Search one language's index and format the hits"""
+        if mode == "vector":
+            return self.search_language_batch(language, data, query_embedding, top_k, nprobe, ef_search)[0]
+        
+        lexical = data["lexical"]
+        if lexical is None:
+            raise ValueError(f"Lexical index not available for {language}")
+        code_list = data["code_list"]
+        
+        if mode == "lexical":
+            with span("bm25"):
+                scores, rows = lexical_search_segments(data, query, top_k)
+            with span("format"):
+                return [
+                    _format_hit(data, row, language, score=float(score))
+                    for score, row in zip(scores, rows) if row < len(code_list)
+                ]
+        
+        # Hybrid: fuse a wider pool of vector and BM25 candidates by rank
+        candidates = top_k * settings.HYBRID_CANDIDATE_FACTOR
+        with span("faiss"):
+            D, I = search_segments(data, query_embedding, candidates, nprobe=nprobe, ef_search=ef_search)
+        distances = {int(row): float(d) for d, row in zip(D[0], I[0]) if row >= 0}
+        with span("bm25"):
+            _, lexical_rows = lexical_search_segments(data, query, candidates)
+        with span("fusion"):
+            fused = reciprocal_rank_fusion([list(distances), lexical_rows.tolist()], k=settings.RRF_K, top_k=top_k)
+        
+        results = []
+        with span("format"):
+            for row, score in fused:
+                if row >= len(code_list):
+                    continue
+                distance = distances.get(row)
+                if distance is None:
+                    distance = self._exact_distance(data, query_embedding, row)
+                results.append(_format_hit(data, row, language, distance=distance, score=score))
+        return results
+    
+    @staticmethod
+    def _exact_distance(data: Dict[str, Any], query_embedding: np.ndarray, row: int) -> Optional[float]:
+        """L2 distance from the query to a stored vector, when the index can reconstruct it"""
+        delta = data.get("delta")
+        try:
+            if delta is not None and row >= delta.base_rows:
+                vector = delta.vector(row)
+            elif data.get("rerank_vectors") is not None:
+                vector = np.asarray(data["rerank_vectors"][int(row)], dtype=np.float32)
+            else:
+                vector = data["index"].reconstruct(int(row))
+        except RuntimeError:
+            return None
+        return float(np.sum((vector - query_embedding[0]) ** 2))
+    
+    def search_language_batch(
+        self,
+        language: str,
+        data: Dict[str, Any],
+        query_embeddings: np.ndarray,
+        top_k: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Search one language's index with a query matrix in a single call"""
+        code_list = data["code_list"]
         
         # Search with FAISS
-        D, I = index.search(query_embedding.astype(np.float32), top_k)
+        with span("faiss"):
+            D, I = search_segments(data, query_embeddings, top_k, nprobe=nprobe, ef_search=ef_search)
         
         # Format results
-        results = []
-        for i, idx in enumerate(I[0]):
-            if idx < len(code_list) and idx >= 0:
-                similarity_score = 1 / (1 + float(D[0][i]))
-                results.append({
-                    "code": code_list[idx],
-                    "similarity": float(similarity_score),
-                    "distance": float(D[0][i])
-                })
+        all_results = []
+        with span("format"):
+            for row in range(len(I)):
+                all_results.append([
+                    _format_hit(data, idx, language, distance=float(D[row][i]))
+                    for i, idx in enumerate(I[row]) if idx < len(code_list) and idx >= 0
+                ])
+        return all_results
+    
+    async def search_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run many searches with batched embedding and one FAISS call per language
+
+        Each item is a dict with query, language and top_k. Returns one
+        {"results": [...]} or {"error": "..."} per item, in input order.
+        """
+        if self.pool is not None:
+            return await self.pool.call("search_batch", items=items)
         
-        return results
+        if not self.initialized:
+            await self.initialize()
+        await self.refresh_deltas(self.registry.loaded_languages())
+        
+        outcomes: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        pending = []
+        for position, item in enumerate(items):
+            try:
+                languages = self.resolve_languages(item["language"])
+            except ValueError as e:
+                outcomes[position] = {"error": str(e)}
+                continue
+            cached_results = self.cache.get_results(item["query"], languages, item["top_k"])
+            if cached_results is not None:
+                outcomes[position] = {"results": cached_results}
+            else:
+                pending.append((position, languages))
+        if not pending:
+            return outcomes
+        
+        # Load every language involved once; a language that fails to load only
+        # fails the items that search it
+        needed = list(dict.fromkeys(l for _, languages in pending for l in languages))
+        loaded: Dict[str, Optional[Dict[str, Any]]] = {}
+        failed: Dict[str, str] = {}
+        for language, data in zip(needed, await asyncio.gather(*[self.registry.get(l) for l in needed], return_exceptions=True)):
+            if isinstance(data, Exception):
+                failed[language] = f"Failed to load {language}: {data}"
+                loaded[language] = None
+            else:
+                loaded[language] = data
+        pending_items = []
+        for position, languages in pending:
+            errors = [failed[l] for l in languages if l in failed]
+            if errors:
+                outcomes[position] = {"error": "; ".join(errors)}
+            else:
+                pending_items.append((position, languages))
+        pending = pending_items
+        if not pending:
+            return outcomes
+        
+        # Embed the distinct uncached queries in a few large forward passes
+        loop = asyncio.get_running_loop()
+        embeddings: Dict[str, np.ndarray] = {}
+        to_embed = []
+        for position, _ in pending:
+            query = self.cache.normalize(items[position]["query"])
+            if query in embeddings or query in to_embed:
+                continue
+            cached = self.cache.get_embedding(query)
+            if cached is not None:
+                embeddings[query] = cached
+            else:
+                to_embed.append(query)
+        if to_embed:
+            vectors = await loop.run_in_executor(
+                None, self.get_embeddings, to_embed, "Query", 512, settings.BATCH_SEARCH_EMBED_BATCH_SIZE
+            )
+            for row, query in enumerate(to_embed):
+                embeddings[query] = vectors[row:row + 1]
+                self.cache.set_embedding(query, vectors[row:row + 1])
+        
+        # Group by language: one index.search call with a query matrix per language
+        groups: Dict[str, List[int]] = {}
+        for position, languages in pending:
+            missing = [l for l in languages if loaded[l] is None]
+            if missing and (items[position]["language"] != "all" or len(missing) == len(languages)):
+                outcomes[position] = {"error": f"Language {', '.join(missing)} not supported or data not available"}
+                continue
+            for language in languages:
+                if loaded[language] is not None:
+                    groups.setdefault(language, []).append(position)
+        
+        def run_group(language: str, positions: List[int]):
+            matrix = np.vstack([embeddings[self.cache.normalize(items[p]["query"])] for p in positions])
+            top_k = max(items[p]["top_k"] for p in positions)
+            return self.search_language_batch(language, loaded[language], matrix, top_k)
+        
+        group_results = await asyncio.gather(*[
+            loop.run_in_executor(None, run_group, language, positions) for language, positions in groups.items()
+        ], return_exceptions=True)
+        
+        # Merge each item's hits across its languages
+        hits: Dict[int, List[Dict[str, Any]]] = {}
+        for (language, positions), results in zip(groups.items(), group_results):
+            if isinstance(results, Exception):
+                for position in positions:
+                    outcomes[position] = {"error": f"Search failed for {language}: {results}"}
+                continue
+            for position, result in zip(positions, results):
+                hits.setdefault(position, []).extend(result)
+        for position, languages in pending:
+            if outcomes[position] is not None:
+                continue
+            top_k = items[position]["top_k"]
+            results = heapq.nsmallest(top_k, hits.get(position, []), key=lambda r: r["distance"])
+            self.cache.set_results(items[position]["query"], languages, top_k, results)
+            outcomes[position] = {"results": results}
+        
+        return outcomes
+    
+    def get_docstring_embedding(self, query: str, data: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Return a precomputed vector when the query matches a corpus docstring"""
+        if data["docstring_lookup"] is None:
+            return None
+        row = data["docstring_lookup"].get(normalize_docstring(query))
+        if row is None:
+            return None
+        
+        if data["docstring_embeddings"] is not None and row < len(data["docstring_embeddings"]):
+            return np.asarray(data["docstring_embeddings"][row:row + 1], dtype=np.float32)
+        
+        # No exported docstring vectors: search from the matching row's own vector
+        try:
+            return data["index"].reconstruct(int(row)).reshape(1, -1)
+        except RuntimeError:
+            return None
+    
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed a batch of search queries in a single forward pass"""
+        return self.get_embeddings(queries, prefix="Query", max_length=512, batch_size=len(queries))
+    
+    def get_embeddings(self, texts: List[str], prefix: str = "", max_length: int = 512, batch_size: int = 16, padding: Optional[str] = None):
+        """Generate embeddings for text
+
+        `padding` is either "dynamic" (pad each length bucket to its longest item)
+        or "max_length" (pad everything to `max_length`); defaults to settings.
+        """
+        padding = padding or settings.EMBEDDING_PADDING
+        if padding == "max_length":
+            return self._get_embeddings_max_length(texts, max_length, batch_size)
+        if padding != "dynamic":
+            raise ValueError(f"Unknown padding mode: {padding}")
+        
+        # Tokenize without padding first so we know each text's real length
+        with span("tokenize"):
+            encoded = self.tokenizer(texts, truncation=True, max_length=max_length)
+        input_ids = encoded["input_ids"]
+        attention_mask = encoded["attention_mask"]
+        
+        # Group texts into length buckets so short queries never pad up to long ones
+        buckets = sorted(b for b in settings.EMBEDDING_LENGTH_BUCKETS if b < max_length) + [max_length]
+        grouped: Dict[int, List[int]] = {}
+        for row, ids in enumerate(input_ids):
+            bucket = next(b for b in buckets if len(ids) <= b)
+            grouped.setdefault(bucket, []).append(row)
+        
+        all_embeddings = [None] * len(texts)
+        for bucket in sorted(grouped):
+            rows = grouped[bucket]
+            for i in range(0, len(rows), batch_size):
+                batch_rows = rows[i:i+batch_size]
+                with span("tokenize"):
+                    inputs = self.tokenizer.pad(
+                        {
+                            "input_ids": [input_ids[r] for r in batch_rows],
+                            "attention_mask": [attention_mask[r] for r in batch_rows]
+                        },
+                        padding="longest",
+                        return_tensors="pt"
+                    ).to(self.device)
+                
+                with span("forward"), torch.no_grad():
+                    embeddings = self.model(**inputs).float().cpu().numpy()
+                
+                for j, r in enumerate(batch_rows):
+                    all_embeddings[r] = embeddings[j]
+        
+        return np.vstack(all_embeddings)
     
-    def get_embeddings(self, texts: List[str], prefix: str = "", max_length: int = 512, batch_size: int = 16):
-        """Generate embeddings for text"""
+    def _get_embeddings_max_length(self, texts: List[str], max_length: int, batch_size: int):
+        """Generate embeddings with every batch padded to `max_length`"""
         all_embeddings = []
         
         for i in range(0, len(texts), batch_size):
             batch_texts = texts[i:i+batch_size]
             
-            inputs = self.tokenizer(
-                batch_texts, 
-                padding="max_length", 
-                truncation=True, 
-                max_length=max_length,
-                return_tensors="pt"
-            ).to(self.device)
+            with span("tokenize"):
+                inputs = self.tokenizer(
+                    batch_texts, 
+                    padding="max_length", 
+                    truncation=True, 
+                    max_length=max_length,
+                    return_tensors="pt"
+                ).to(self.device)
             
-            with torch.no_grad():
+            with span("forward"), torch.no_grad():
                 outputs = self.model(**inputs)
-                embeddings = outputs.cpu().numpy()
+                embeddings = outputs.float().cpu().numpy()
                 
             all_embeddings.append(embeddings)
         
         return np.vstack(all_embeddings)
+    
+    def compare_padding_modes(self, texts: List[str], max_length: int = 512, atol: float = 1e-4) -> Dict[str, Any]:
+        """Check that dynamic padding produces the same embeddings as max_length padding"""
+        dynamic = self.get_embeddings(texts, max_length=max_length, padding="dynamic")
+        reference = self.get_embeddings(texts, max_length=max_length, padding="max_length")
+        max_abs_diff = float(np.max(np.abs(dynamic - reference))) if len(texts) else 0.0
+        return {
+            "count": len(texts),
+            "max_abs_diff": max_abs_diff,
+            "atol": atol,
+            "match": max_abs_diff <= atol
+        }
+
+def _result_params(nprobe: Optional[int], ef_search: Optional[int], mode: str) -> tuple:
+    """Result cache key part for the search parameters and mode"""
+    params = (nprobe, ef_search) if nprobe is not None or ef_search is not None else ()
+    if mode != "vector":
+        params += (mode,)
+    return params
+
+def _format_hit(data: Dict[str, Any], row: int, language: str, distance: Optional[float] = None, score: Optional[float] = None) -> Dict[str, Any]:
+    """Format one hit; similarity comes from the L2 distance, or the lexical score without one"""
+    if distance is not None:
+        similarity = 1 / (1 + distance)
+    else:
+        similarity = score / (1 + score) if score and score > 0 else 0.0
+    hit = {
+        "code": data["code_list"][int(row)],
+        "language": language,
+        "row": int(row),
+        "version": data["snippet_version"],
+        "similarity": float(similarity),
+        "distance": distance
+    }
+    if score is not None:
+        hit["score"] = score
+    return hit
+
+def language_paths(language: str) -> Optional[Dict[str, Any]]:
+    """A language's data file paths, or None while its index or snippets are missing.
+    
+    "versioned" lists the files whose size / mtime make up the data version.
+    """
+    embedding_dir = os.path.join(settings.MODEL_DIR, language)
+    index_file = os.path.join(embedding_dir, index_file_name(settings.get_index_type(language)))
+    if not os.path.exists(index_file):
+        # Fall back to the exact index until the configured one has been built
+        index_file = os.path.join(embedding_dir, index_file_name("flat"))
+    metadata_file = os.path.join(embedding_dir, "metadata.pkl")
+    vectors_file = os.path.join(embedding_dir, RERANK_VECTORS_FILE)
+    code_store_prefix = os.path.join(embedding_dir, "code")
+    snippet_store = SnippetStore.exists(code_store_prefix)
+    if not os.path.exists(index_file) or not (snippet_store or os.path.exists(metadata_file)):
+        return None
+    snippet_files = [code_store_prefix + ".offsets.npy", code_store_prefix + ".blob"] if snippet_store else [metadata_file]
+    return {
+        "metadata": metadata_file,
+        "code_store": code_store_prefix,
+        "docstring_store": os.path.join(embedding_dir, "docstring"),
+        "docstring_lookup": os.path.join(embedding_dir, "docstring_lookup.npy"),
+        "docstring_embeddings": os.path.join(embedding_dir, "docstring_embeddings.npy"),
+        "lexical": os.path.join(embedding_dir, "bm25"),
+        "index": index_file,
+        "vectors": vectors_file,
+        "snippet_store": snippet_store,
+        "versioned": snippet_files + [index_file] + ([vectors_file] if os.path.exists(vectors_file) else []),
+    }
+
+def build_lexical_index(code_list, docstring_list) -> BM25Index:
+    """BM25 index over each row's docstring and code tokens"""
+    return BM25Index.build(
+        f"{docstring_list[row] if row < len(docstring_list) else ''} {code_list[row]}"
+        for row in range(len(code_list))
+    )
 
 # Create singleton instance
-code_search_service = CodeSearchService()
\ No newline at end of file
+code_search_service = CodeSearchService()
+
+metrics.gauge(
+    "code_search_inference_queue_depth", "Queries waiting for the inference scheduler",
+    callback=lambda: code_search_service.scheduler.queue_depth() if code_search_service.scheduler else 0
+)
+metrics.gauge(
+    "code_search_languages_loaded", "Languages whose index is loaded in this process",
+    callback=lambda: len(code_search_service.registry.loaded_languages())
+)
+metrics.gauge(
+    "code_search_language_memory_bytes", "Estimated memory held by loaded languages",
+    callback=lambda: code_search_service.registry.memory_usage()
+)
\ No newline at end of file
@@ -0,0 +1,424 @@
+import bisect
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import span
+from app.services.ann_index import merge_neighbors, rerank_neighbors, search_index
+from app.services.lexical_index import BM25Index, CorpusStats, corpus_stats
+from app.services.snippet_store import SnippetStore
+
+DELTA_DIR_NAME = "delta"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+CHUNKS_DIR_NAME = "chunks"
+
+
+class StaleSegmentError(ValueError):
+    """The main index on disk is not the one the loaded delta segment was built on"""
+
+
+def delta_dir(language: str) -> str:
+    return os.path.join(settings.MODEL_DIR, language, DELTA_DIR_NAME)
+
+
+@contextmanager
+def delta_lock(language: str) -> Iterator[None]:
+    """Exclusive lock on a language's delta segment, across processes (blocking)"""
+    directory = delta_dir(language)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def current_generation(language: str) -> Optional[int]:
+    """Generation of the delta segment on disk, or None when there is none"""
+    try:
+        with open(os.path.join(delta_dir(language), CURRENT_FILE)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _generation_dir(language: str, generation: int) -> str:
+    return os.path.join(delta_dir(language), f"g{generation:08d}")
+
+
+def _chunks_dir(language: str) -> str:
+    return os.path.join(delta_dir(language), CHUNKS_DIR_NAME)
+
+
+class DeltaChunk:
+    """An immutable run of consecutive delta rows with its own exact and BM25 index.
+
+    `start` is the offset of its first row in the delta segment; `name` is the
+    directory it was saved to, or None until it is saved.
+    """
+
+    def __init__(self, start: int, vectors: np.ndarray, code: List[str], docstrings: List[str], name: Optional[str] = None):
+        self.start = start
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.code = code
+        self.docstrings = docstrings
+        self.name = name
+        self.index = faiss.IndexFlatL2(self.vectors.shape[1])
+        if len(self.vectors):
+            self.index.add(self.vectors)
+        self.lexical = BM25Index.build(f"{docstring} {text}" for docstring, text in zip(docstrings, code)) if code else None
+
+    @property
+    def rows(self) -> int:
+        return len(self.code)
+
+    def save(self, directory: str):
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        SnippetStore.write(os.path.join(directory, "code"), self.code)
+        SnippetStore.write(os.path.join(directory, "docstring"), self.docstrings)
+
+    @classmethod
+    def load(cls, directory: str, start: int, name: Optional[str]) -> "DeltaChunk":
+        code_store = SnippetStore(os.path.join(directory, "code"))
+        docstring_store = SnippetStore(os.path.join(directory, "docstring"))
+        try:
+            code, docstrings = list(code_store), list(docstring_store)
+        finally:
+            code_store.close()
+            docstring_store.close()
+        return cls(start, np.load(os.path.join(directory, "vectors.npy")), code, docstrings, name)
+
+
+class _ChunkedRows:
+    """One text field of a delta segment's chunks as a single sequence"""
+
+    def __init__(self, chunks: List[DeltaChunk], field: str):
+        self.chunks = chunks
+        self.field = field
+        self.starts = [chunk.start for chunk in chunks]
+        self.total = sum(chunk.rows for chunk in chunks)
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, row: int) -> str:
+        row = int(row)
+        if row < 0:
+            row += self.total
+        if not 0 <= row < self.total:
+            raise IndexError(row)
+        chunk = self.chunks[bisect.bisect_right(self.starts, row) - 1]
+        return getattr(chunk, self.field)[row - chunk.start]
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from getattr(chunk, self.field)
+
+
+class DeltaSegment:
+    """Snippets ingested since the main index was built, plus the tombstoned rows.
+
+    Rows continue the main index's numbering: delta row i is global row
+    `base_rows + i`, and keeps that number when compaction folds it into the main
+    index. Tombstones are global rows hidden from search; their code stays
+    readable for chat history. A segment is never modified: ingesting or deleting
+    builds a new one that replaces it, so searches never see a half-applied change.
+
+    The rows live in immutable chunks. An ingest adds one chunk and merges the
+    trailing chunks that are not larger than it, like a binary counter, so there
+    are O(log rows) chunks, each row is copied O(log rows) times, and an ingest
+    only indexes and writes the new data plus what it merges.
+    """
+
+    def __init__(
+        self,
+        base_version: str,
+        base_rows: int,
+        dimension: int,
+        chunks: Sequence[DeltaChunk],
+        tombstones: np.ndarray,
+        generation: int = 0,
+    ):
+        self.base_version = base_version
+        self.base_rows = base_rows
+        self.dimension = dimension
+        self.chunks = list(chunks)
+        self.tombstones = np.unique(np.asarray(tombstones, dtype=np.int64))
+        self.generation = generation
+
+        self.code = _ChunkedRows(self.chunks, "code")
+        self.docstrings = _ChunkedRows(self.chunks, "docstrings")
+        self.main_tombstones = self.tombstones[self.tombstones < base_rows]
+        self.delta_tombstones = self.tombstones[self.tombstones >= base_rows] - base_rows
+        # Per chunk, its tombstoned rows relative to the chunk
+        self._hidden = [
+            self.delta_tombstones[(self.delta_tombstones >= chunk.start) & (self.delta_tombstones < chunk.start + chunk.rows)] - chunk.start
+            for chunk in self.chunks
+        ]
+
+    @classmethod
+    def empty(cls, base_version: str, base_rows: int, dimension: int, tombstones: Optional[np.ndarray] = None, generation: int = 0) -> "DeltaSegment":
+        return cls(base_version, base_rows, dimension, [],
+                   tombstones if tombstones is not None else np.zeros(0, dtype=np.int64), generation)
+
+    @property
+    def rows(self) -> int:
+        return len(self.code)
+
+    @property
+    def live_rows(self) -> int:
+        return self.rows - len(self.delta_tombstones)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if not self.chunks:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.vstack([chunk.vectors for chunk in self.chunks])
+
+    def appended(self, vectors: np.ndarray, code: Sequence[str], docstrings: Sequence[str]) -> Tuple["DeltaSegment", List[int]]:
+        """A new segment with these snippets added, and the global rows they got"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension:
+            raise ValueError(f"Embedding dimension {vectors.shape[-1]} does not match the index dimension {self.dimension}")
+        first = self.base_rows + self.rows
+        chunks = list(self.chunks)
+        merged = []
+        while chunks and chunks[-1].rows <= len(code) + sum(chunk.rows for chunk in merged):
+            merged.insert(0, chunks.pop())
+        chunk = DeltaChunk(
+            merged[0].start if merged else self.rows,
+            np.vstack([chunk.vectors for chunk in merged] + [vectors]),
+            [text for chunk in merged for text in chunk.code] + list(code),
+            [text for chunk in merged for text in chunk.docstrings] + list(docstrings),
+        )
+        segment = DeltaSegment(
+            self.base_version, self.base_rows, self.dimension, chunks + [chunk], self.tombstones, self.generation + 1,
+        )
+        return segment, list(range(first, first + len(code)))
+
+    def without(self, rows: Sequence[int]) -> "DeltaSegment":
+        """A new segment with these global rows tombstoned"""
+        total = self.base_rows + self.rows
+        invalid = [row for row in rows if not 0 <= row < total]
+        if invalid:
+            raise ValueError(f"Rows out of range (0-{total - 1}): {invalid[:10]}")
+        return DeltaSegment(
+            self.base_version, self.base_rows, self.dimension, self.chunks,
+            np.concatenate([self.tombstones, np.asarray(rows, dtype=np.int64)]), self.generation + 1,
+        )
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact search over the live delta rows; ids are global rows"""
+        parts = []
+        for chunk, hidden in zip(self.chunks, self._hidden):
+            if chunk.rows > len(hidden):
+                D, I = search_index(chunk.index, queries, k, exclude=hidden)
+                parts.append((D, np.where(I >= 0, I + self.base_rows + chunk.start, I)))
+        if not parts:
+            return np.zeros((len(queries), 0), dtype=np.float32), np.zeros((len(queries), 0), dtype=np.int64)
+        return merge_neighbors(parts, k)
+
+    def lexical_search(self, query: str, k: int, stats: Optional[CorpusStats] = None) -> Tuple[np.ndarray, np.ndarray]:
+        all_scores, all_rows = [np.zeros(0, dtype=np.float32)], [np.zeros(0, dtype=np.int64)]
+        for chunk, hidden in zip(self.chunks, self._hidden):
+            if chunk.lexical is None:
+                continue
+            scores, rows = chunk.lexical.search(query, k + len(hidden), stats)
+            keep = ~np.isin(rows, hidden)
+            all_scores.append(scores[keep][:k])
+            all_rows.append(rows[keep][:k] + self.base_rows + chunk.start)
+        scores, rows = np.concatenate(all_scores), np.concatenate(all_rows)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return scores[order], rows[order]
+
+    def vector(self, row: int) -> np.ndarray:
+        row -= self.base_rows
+        chunk = self.chunks[bisect.bisect_right(self.code.starts, row) - 1]
+        return chunk.vectors[row - chunk.start]
+
+    def nbytes(self) -> int:
+        return sum(
+            chunk.vectors.nbytes * 2 + sum(len(text) + 50 for text in chunk.code) + sum(len(text) + 50 for text in chunk.docstrings)
+            for chunk in self.chunks
+        )
+
+    def save(self, language: str):
+        """Write the chunks that are not on disk yet and a new generation pointing at them,
+        then point CURRENT at it (call under delta_lock)"""
+        os.makedirs(_chunks_dir(language), exist_ok=True)
+        for i, chunk in enumerate(self.chunks):
+            if chunk.name is None:
+                name = f"c{self.generation:08d}_{i}"
+                chunk.save(os.path.join(_chunks_dir(language), name))
+                chunk.name = name
+
+        directory = _generation_dir(language, self.generation)
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        np.save(os.path.join(directory, "tombstones.npy"), self.tombstones)
+        with open(os.path.join(directory, "segment.json"), "w") as f:
+            json.dump({
+                "base_version": self.base_version,
+                "base_rows": self.base_rows,
+                "dimension": self.dimension,
+                "chunks": [{"name": chunk.name, "start": chunk.start, "rows": chunk.rows} for chunk in self.chunks],
+            }, f)
+
+        current = os.path.join(delta_dir(language), CURRENT_FILE)
+        with open(current + ".tmp", "w") as f:
+            f.write(str(self.generation))
+        os.replace(current + ".tmp", current)
+
+        # Older generations and merged-away chunks are no longer referenced;
+        # processes read segments fully into memory under the lock
+        for name in os.listdir(delta_dir(language)):
+            if name.startswith("g") and name != os.path.basename(directory):
+                shutil.rmtree(os.path.join(delta_dir(language), name), ignore_errors=True)
+        referenced = {chunk.name for chunk in self.chunks}
+        for name in os.listdir(_chunks_dir(language)):
+            if name not in referenced:
+                shutil.rmtree(os.path.join(_chunks_dir(language), name), ignore_errors=True)
+
+    @classmethod
+    def load(cls, language: str, previous: Optional["DeltaSegment"] = None) -> Optional["DeltaSegment"]:
+        """The current delta segment on disk, or None (call under delta_lock).
+
+        Chunks `previous` already holds are reused instead of read again, so
+        picking up another process's ingest only reads the new chunks.
+        """
+        generation = current_generation(language)
+        if generation is None:
+            return None
+        directory = _generation_dir(language, generation)
+        with open(os.path.join(directory, "segment.json")) as f:
+            info = json.load(f)
+        known = {}
+        if previous is not None and previous.base_version == info["base_version"]:
+            known = {chunk.name: chunk for chunk in previous.chunks if chunk.name is not None}
+
+        chunks = []
+        for entry in info.get("chunks", []):
+            chunk = known.get(entry["name"])
+            if chunk is None or chunk.start != entry["start"] or chunk.rows != entry["rows"]:
+                chunk = DeltaChunk.load(os.path.join(_chunks_dir(language), entry["name"]), entry["start"], entry["name"])
+            chunks.append(chunk)
+        if "chunks" not in info and os.path.exists(os.path.join(directory, "vectors.npy")):
+            # Segment saved as one directory, before chunks; it is written as a chunk on the next save
+            chunk = DeltaChunk.load(directory, 0, None)
+            chunks = [chunk] if chunk.rows else []
+        return cls(
+            info["base_version"], info["base_rows"], info["dimension"], chunks,
+            np.load(os.path.join(directory, "tombstones.npy")), generation,
+        )
+
+
+class SegmentedSnippets:
+    """The main snippets followed by the delta segment's, indexed by global row"""
+
+    def __init__(self, main: Sequence[str], delta: DeltaSegment):
+        self.main = main
+        self.delta = delta
+        self._main_rows = len(main)
+
+    def __len__(self):
+        return self._main_rows + self.delta.rows
+
+    def __getitem__(self, row: int) -> str:
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if row < self._main_rows:
+            return self.main[row]
+        if row < len(self):
+            return self.delta.code[row - self._main_rows]
+        raise IndexError(row)
+
+    def __iter__(self):
+        yield from self.main
+        yield from self.delta.code
+
+    def nbytes(self) -> int:
+        main = self.main.nbytes() if hasattr(self.main, "nbytes") else sum(len(text) + 50 for text in self.main)
+        return main + self.delta.nbytes()
+
+
+def main_code_list(data: Dict[str, Any]) -> Sequence[str]:
+    return getattr(data["code_list"], "main", data["code_list"])
+
+
+def with_delta(data: Dict[str, Any], delta: Optional[DeltaSegment]) -> Dict[str, Any]:
+    """A copy of a language's data with `delta` as its delta segment"""
+    main = main_code_list(data)
+    updated = dict(data)
+    updated["delta"] = delta
+    updated["code_list"] = SegmentedSnippets(main, delta) if delta is not None and delta.rows else main
+    return updated
+
+
+def search_segments(data: Dict[str, Any], queries: np.ndarray, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """FAISS search over the main index and the delta segment, without tombstoned rows.
+
+    A compressed main index with full-precision vectors is searched in two stages:
+    RERANK_FACTOR x k candidates, re-scored exactly, so the distances are exact too.
+    """
+    delta = data.get("delta")
+    exclude = delta.main_tombstones if delta is not None else None
+    shards = data.get("shards")
+    rerank_vectors = data.get("rerank_vectors")
+    if shards is not None:
+        D, I = shards.search(queries, k, exclude=exclude)
+    elif rerank_vectors is not None:
+        _, candidates = search_index(data["index"], queries, k * settings.RERANK_FACTOR, nprobe=nprobe, ef_search=ef_search, exclude=exclude)
+        with span("rerank"):
+            D, I = rerank_neighbors(rerank_vectors, queries, candidates, k)
+    else:
+        D, I = search_index(data["index"], queries, k, nprobe=nprobe, ef_search=ef_search, exclude=exclude)
+    if delta is None or not delta.live_rows:
+        return D, I
+    with span("delta"):
+        delta_D, delta_I = delta.search(queries, k)
+    return merge_neighbors([(D, I), (delta_D, delta_I)], k)
+
+
+def lexical_search_segments(data: Dict[str, Any], query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """BM25 search over the main and delta segments, without tombstoned rows"""
+    lexical = data["lexical"]
+    delta = data.get("delta")
+    if delta is None:
+        return lexical.search(query, k)
+    # Score every segment with the statistics of the whole collection, so a
+    # small chunk's IDF and average length don't put its scores on another scale
+    stats = corpus_stats([lexical] + [chunk.lexical for chunk in delta.chunks if chunk.lexical is not None], query)
+    scores, rows = lexical.search(query, k + len(delta.main_tombstones), stats)
+    keep = ~np.isin(rows, delta.main_tombstones)
+    scores, rows = scores[keep][:k], rows[keep][:k]
+    if delta.live_rows:
+        with span("delta"):
+            delta_scores, delta_rows = delta.lexical_search(query, k, stats)
+        scores, rows = np.concatenate([scores, delta_scores]), np.concatenate([rows, delta_rows])
+        order = np.argsort(-scores, kind="stable")[:k]
+        scores, rows = scores[order], rows[order]
+    return scores, rows
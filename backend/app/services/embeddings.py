@@ -1,15 +1,93 @@
+import asyncio
+import json
+import os
+import time
 import torch
+from typing import Optional
 from transformers import AutoTokenizer, AutoModel
 
-async def load_model_tokenizer():
-    """Load CodeT5p model and tokenizer"""
+from app.core.config import settings
+from app.services.sharded_search import thread_plan
+
+MODEL_PRECISIONS = ("fp32", "int8", "bf16")
+
+def configure_torch_threads():
+    """Apply the configured (or, with sharded search, planned) torch intra-op / inter-op thread counts"""
+    threads = thread_plan()["torch_threads"]
+    if threads > 0:
+        torch.set_num_threads(threads)
+    if settings.TORCH_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(settings.TORCH_INTEROP_THREADS)
+        except RuntimeError:
+            # Can only be set once, before any inter-op parallel work has started
+            pass
+
+def bf16_supported() -> bool:
+    """Whether this CPU has native bfloat16 matmul support"""
+    try:
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+def apply_precision(model, precision: str, device: torch.device):
+    """Convert a loaded fp32 encoder to the requested precision"""
+    if precision not in MODEL_PRECISIONS:
+        raise ValueError(f"Unknown model precision: {precision}. Supported: {MODEL_PRECISIONS}")
+    if precision == "int8":
+        if device.type != "cpu":
+            print("Warning: int8 dynamic quantization is CPU-only, keeping fp32")
+            return model
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if precision == "bf16":
+        if device.type == "cpu" and not bf16_supported():
+            print("Warning: CPU has no native bf16 support, keeping fp32")
+            return model
+        return model.to(torch.bfloat16)
+    return model
+
+SERIALIZED_ENCODER_FILE = "encoder.pt"
+SERIALIZED_INFO_FILE = "export.json"
+
+def load_serialized_encoder(path: str, device: torch.device):
+    """Load a TorchScript encoder and its tokenizer written by app.tools.export_encoder"""
+    with open(os.path.join(path, SERIALIZED_INFO_FILE)) as f:
+        info = json.load(f)
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    model = torch.jit.load(os.path.join(path, SERIALIZED_ENCODER_FILE), map_location=device)
+    model.eval()
+    return model, tokenizer, info
+
+def _load_model_tokenizer(precision: Optional[str], serialized_dir: Optional[str]):
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model_name = "Salesforce/codet5p-110m-embedding"
+    configure_torch_threads()
+    start = time.perf_counter()
     
-    print(f"Loading model {model_name}...")
-    tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir="D:/huggingface_cache",trust_remote_code=True)
-    model = AutoModel.from_pretrained(model_name, cache_dir="D:/huggingface_cache",trust_remote_code=True)
-    model = model.to(device)
-    print(f"Model loaded successfully on {device}")
+    if serialized_dir:
+        print(f"Loading serialized encoder from {serialized_dir}...")
+        model, tokenizer, info = load_serialized_encoder(serialized_dir, device)
+        precision = info.get("precision", "fp32")
+    else:
+        model_name = settings.MODEL_NAME
+        cache_dir = settings.HF_CACHE_DIR or None
+        precision = precision or settings.MODEL_PRECISION
+        print(f"Loading model {model_name}...")
+        tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir, trust_remote_code=True)
+        model = AutoModel.from_pretrained(model_name, cache_dir=cache_dir, trust_remote_code=True)
+        model = model.to(device)
+        model.eval()
+        model = apply_precision(model, precision, device)
+    print(f"Model loaded successfully on {device} ({precision}, {torch.get_num_threads()} threads) in {time.perf_counter() - start:.1f}s")
+    
+    return model, tokenizer
+
+async def load_model_tokenizer(precision: Optional[str] = None, serialized_dir: Optional[str] = None):
+    """Load CodeT5p model and tokenizer on a worker thread.
     
-    return model, tokenizer
\ No newline at end of file
+    Uses SERIALIZED_ENCODER_DIR when set, unless an explicit precision asks for
+    the Hugging Face model.
+    """
+    if serialized_dir is None and precision is None:
+        serialized_dir = settings.SERIALIZED_ENCODER_DIR or None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _load_model_tokenizer, precision, serialized_dir)
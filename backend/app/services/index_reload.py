@@ -0,0 +1,102 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.db.mongodb import get_database
+from app.services.chat_history import freeze_stale_results
+from app.services.code_search import code_search_service, language_paths
+from app.services.delta_segment import current_generation
+from app.services.snippet_store import data_version
+
+
+async def reload_language(language: str, force: bool = False) -> Dict[str, Any]:
+    """Reload a language in this process, or in every pool worker, then freeze chat history.
+
+    When the snippets changed, chat references to rows whose code changed or
+    disappeared get the old code copied in while the replaced version is still
+    readable, so they keep showing it after the grace period.
+    """
+    if code_search_service.pool is not None:
+        workers = await code_search_service.pool.call("reload", language=language, force=force)
+    else:
+        workers = [await code_search_service.reload_language(language, force=force)]
+
+    previous = sorted({
+        w["previous_snippet_version"] for w in workers
+        if w.get("previous_snippet_version") and w["previous_snippet_version"] != w["snippet_version"]
+    })
+    if previous:
+        task = asyncio.create_task(_freeze_history(language, previous))
+        task.add_done_callback(_log_freeze_failure)
+
+    result = dict(workers[0])
+    if code_search_service.pool is not None:
+        result["workers"] = workers
+    return result
+
+
+async def _freeze_history(language: str, versions: List[str]) -> int:
+    async def lookup(version: str, rows: List[int]) -> Optional[Dict[int, str]]:
+        found, codes = await code_search_service.get_snippets(language, rows, version=version)
+        return codes if found == version else None
+
+    async def current(rows: List[int]) -> Dict[int, str]:
+        _, codes = await code_search_service.get_snippets(language, rows)
+        return codes
+
+    db = await get_database()
+    updated = await freeze_stale_results(db, language, versions, lookup, current)
+    if updated:
+        print(f"Froze {language} snippets into {updated} chat messages")
+    return updated
+
+
+def _log_freeze_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Warning: freezing chat history after a reload failed: {task.exception()}")
+
+
+async def watch_indexes(interval: float = settings.INDEX_WATCH_INTERVAL_SECONDS):
+    """Poll the loaded languages' files and reload a language once its new files have settled.
+
+    A changed fingerprint has to be seen on two polls in a row, so a build that is
+    still writing files is left alone until it is done. Delta segments written by
+    other processes (ingestion, deletions) are picked up as well.
+    """
+    pending: Dict[str, str] = {}
+    synced: Dict[str, Optional[int]] = {}
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            loaded = await code_search_service.check_language_status()
+        except Exception as e:
+            print(f"Warning: index watcher could not list languages: {e}")
+            continue
+        for status in loaded:
+            language = status["language"]
+            paths = language_paths(language)
+            try:
+                version = data_version(paths["versioned"]) if paths is not None else None
+            except OSError:
+                version = None
+            if version is None or version == status["version"]:
+                pending.pop(language, None)
+                generation = current_generation(language)
+                if generation is not None and generation != status.get("delta_generation") and synced.get(language) != generation:
+                    synced[language] = generation
+                    try:
+                        await code_search_service.sync_delta(language)
+                    except Exception as e:
+                        print(f"Warning: syncing the {language} delta segment failed: {e}")
+                continue
+            if pending.get(language) != version:
+                pending[language] = version
+                continue
+            pending.pop(language, None)
+            try:
+                result = await reload_language(language)
+            except Exception as e:
+                print(f"Warning: reload of {language} failed: {e}")
+                continue
+            if result["status"] == "reloaded":
+                print(f"Reloaded {language}: {result['previous_version']} -> {result['version']} in {result['seconds']}s")
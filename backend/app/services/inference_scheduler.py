@@ -0,0 +1,141 @@
+import asyncio
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import RequestTrace, current_trace, metrics, record_stage, use_trace
+
+BATCH_SIZE = metrics.histogram(
+    "code_search_inference_batch_size", "Queries per batched forward pass", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+
+class InferenceQueueFullError(RuntimeError):
+    """Raised when the inference queue is at capacity"""
+
+
+class _PendingQuery:
+    __slots__ = ("text", "loop", "future", "trace", "queued_at")
+
+    def __init__(self, text: str, loop: asyncio.AbstractEventLoop, future: asyncio.Future, trace: Optional[RequestTrace]):
+        self.text = text
+        self.loop = loop
+        self.future = future
+        self.trace = trace
+        self.queued_at = time.perf_counter()
+
+
+class InferenceScheduler:
+    """Micro-batching scheduler that runs query embeddings on a background thread.
+
+    Requests are queued from the event loop; the worker collects whatever arrives
+    within `max_wait_ms` (up to `max_batch_size` queries) and runs a single
+    batched forward pass, then resolves each caller's future with its own row.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = settings.INFERENCE_MAX_BATCH_SIZE,
+        max_wait_ms: float = settings.INFERENCE_MAX_WAIT_MS,
+        max_queue_size: int = settings.INFERENCE_MAX_QUEUE_SIZE,
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.queue: "queue.Queue[Optional[_PendingQuery]]" = queue.Queue(maxsize=max(0, max_queue_size))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def start(self):
+        """Start the background worker thread"""
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker after draining already queued requests"""
+        if not self.running:
+            return
+        self.queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Queue a single text and wait for its embedding"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self.queue.put_nowait(_PendingQuery(text, loop, future, current_trace()))
+        except queue.Full:
+            raise InferenceQueueFullError("Inference queue is full, try again later")
+        return await future
+
+    def _collect_batch(self, first: _PendingQuery) -> Tuple[List[_PendingQuery], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self.queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect_batch(first)
+
+            # Callers may have gone away (client disconnect) while queued
+            batch = [item for item in batch if not item.future.cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for item in batch:
+                record_stage("queue_wait", started - item.queued_at, item.trace)
+            BATCH_SIZE.observe(len(batch))
+
+            # Stage spans inside embed_fn (tokenize, forward) are charged to every request in the batch
+            batch_trace = RequestTrace()
+            try:
+                with use_trace(batch_trace):
+                    embeddings = self.embed_fn([item.text for item in batch])
+            except Exception as e:
+                for item in batch:
+                    item.loop.call_soon_threadsafe(_set_exception, item.future, e)
+                continue
+            for item in batch:
+                for stage, seconds in batch_trace.stages.items():
+                    record_stage(stage, seconds, item.trace)
+
+            for i, item in enumerate(batch):
+                item.loop.call_soon_threadsafe(_set_result, item.future, embeddings[i:i + 1])
+
+
+def _set_result(future: asyncio.Future, value):
+    if not future.done():
+        future.set_result(value)
+
+
+def _set_exception(future: asyncio.Future, exc: Exception):
+    if not future.done():
+        future.set_exception(exc)
@@ -0,0 +1,151 @@
+import asyncio
+import itertools
+import os
+import pickle
+import time
+from typing import Any, Dict, List, Optional
+
+import faiss
+
+from app.core.config import settings
+from app.services.ann_index import INDEX_TYPES, append_rerank_vectors, index_file_name, write_index
+from app.services.code_search import build_lexical_index, code_search_service, language_paths
+from app.services.delta_segment import DeltaSegment, StaleSegmentError, delta_lock
+from app.services.index_reload import reload_language
+from app.services.lexical_index import BM25Index
+from app.services.snippet_store import DocstringLookup, SnippetStore, data_version
+
+# language -> running compaction
+_compactions: Dict[str, asyncio.Task] = {}
+
+
+async def ingest_snippets(language: str, snippets: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Add snippets to a language's delta segment, compacting in the background once it is large"""
+    try:
+        result = await code_search_service.ingest(language, snippets)
+    except StaleSegmentError:
+        # The main index was compacted or rebuilt by another process: swap it in first
+        await reload_language(language)
+        result = await code_search_service.ingest(language, snippets)
+    if result["delta_rows"] >= settings.DELTA_COMPACTION_ROWS:
+        schedule_compaction(language)
+    return result
+
+
+async def delete_snippets(language: str, rows: List[int]) -> Dict[str, Any]:
+    """Tombstone rows of a language, in the main index or the delta segment"""
+    try:
+        return await code_search_service.delete_snippets(language, rows)
+    except StaleSegmentError:
+        await reload_language(language)
+        return await code_search_service.delete_snippets(language, rows)
+
+
+def schedule_compaction(language: str) -> asyncio.Task:
+    """Start compacting a language in the background unless it already is"""
+    task = _compactions.get(language)
+    if task is None or task.done():
+        task = _compactions[language] = asyncio.create_task(compact(language))
+        task.add_done_callback(_log_compaction_failure)
+    return task
+
+
+async def compact(language: str) -> Dict[str, Any]:
+    """Fold the delta segment into the main files, then reload the language where it is loaded"""
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, compact_language, language)
+    if result is None:
+        return {"language": language, "status": "nothing_to_compact"}
+    loaded = {status["language"] for status in await code_search_service.check_language_status()}
+    if language in loaded:
+        result["reload"] = await reload_language(language)
+    print(f"Compacted {language}: folded {result['folded_rows']} rows into the index in {result['seconds']}s")
+    return result
+
+
+def _log_compaction_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Warning: compaction failed: {task.exception()}")
+
+
+def compact_language(language: str) -> Optional[Dict[str, Any]]:
+    """Append a language's delta segment to its index files and snippet stores (blocking).
+
+    Every built index type gets the delta vectors, so a fallback index stays in
+    step, and so do the re-scoring vectors when they exist; the docstring lookup and BM25 index are rebuilt when they exist. Rows
+    keep their numbers and tombstones carry over to the new, empty delta segment.
+    Each file is replaced by a rename, so running searches keep reading the old
+    files until they reload. Returns None when there is nothing to fold in.
+    """
+    start = time.perf_counter()
+    with delta_lock(language):
+        paths = language_paths(language)
+        if paths is None:
+            return None
+        version = data_version(paths["versioned"])
+        delta = DeltaSegment.load(language)
+        if delta is None or not delta.rows or delta.base_version != version:
+            return None
+
+        embedding_dir = os.path.dirname(paths["index"])
+        indices = {}
+        for index_type in INDEX_TYPES:
+            index_file = os.path.join(embedding_dir, index_file_name(index_type))
+            if not os.path.exists(index_file):
+                continue
+            index = faiss.read_index(index_file)
+            if index.ntotal != delta.base_rows:
+                raise ValueError(f"{index_file} has {index.ntotal} vectors, expected {delta.base_rows}")
+            indices[index_file] = index
+
+        main_code, main_docstrings = _read_main_snippets(paths)
+        try:
+            SnippetStore.write(paths["code_store"], itertools.chain(main_code, delta.code))
+            SnippetStore.write(paths["docstring_store"], itertools.chain(
+                (main_docstrings[row] if row < len(main_docstrings) else "" for row in range(delta.base_rows)),
+                delta.docstrings,
+            ))
+        finally:
+            for snippets in (main_code, main_docstrings):
+                if isinstance(snippets, SnippetStore):
+                    snippets.close()
+
+        code_list = SnippetStore(paths["code_store"])
+        docstring_list = SnippetStore(paths["docstring_store"])
+        try:
+            if os.path.exists(paths["docstring_lookup"]):
+                DocstringLookup.build(docstring_list).save(paths["docstring_lookup"])
+            if BM25Index.exists(paths["lexical"]):
+                build_lexical_index(code_list, docstring_list).save(paths["lexical"])
+        finally:
+            code_list.close()
+            docstring_list.close()
+
+        if os.path.exists(paths["vectors"]):
+            append_rerank_vectors(paths["vectors"], delta.vectors)
+        for index_file, index in indices.items():
+            index.add(delta.vectors)
+            write_index(index, index_file)
+
+        new_version = data_version(language_paths(language)["versioned"])
+        rows = delta.base_rows + delta.rows
+        DeltaSegment.empty(new_version, rows, delta.dimension, delta.tombstones, delta.generation + 1).save(language)
+    return {
+        "language": language,
+        "status": "compacted",
+        "previous_version": version,
+        "version": new_version,
+        "folded_rows": delta.rows,
+        "rows": rows,
+        "tombstones": len(delta.tombstones),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def _read_main_snippets(paths: Dict[str, Any]):
+    if paths["snippet_store"]:
+        docstrings = SnippetStore(paths["docstring_store"]) if SnippetStore.exists(paths["docstring_store"]) else []
+        return SnippetStore(paths["code_store"]), docstrings
+    with open(paths["metadata"], "rb") as f:
+        metadata = pickle.load(f)
+    return metadata["code_list"], metadata.get("docstring_list", [])
@@ -0,0 +1,148 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+LanguageData = Dict[str, Any]
+
+
+def estimate_language_memory(data: LanguageData) -> int:
+    """Rough resident size in bytes of a loaded language"""
+    total = 0
+    index = data.get("index")
+    if index is not None:
+        try:
+            total += index.ntotal * index.sa_code_size()
+        except RuntimeError:
+            total += index.ntotal * index.d * 4
+    for key in ("code_list", "docstring_list"):
+        snippets = data.get(key)
+        if snippets is None:
+            continue
+        if hasattr(snippets, "nbytes"):
+            total += snippets.nbytes()
+        else:
+            # Python str objects: payload plus ~50 bytes of object overhead each
+            total += sum(len(text) + 50 for text in snippets)
+    embeddings = data.get("docstring_embeddings")
+    if embeddings is not None:
+        total += embeddings.nbytes
+    # Re-scoring vectors are not counted: only the candidates' pages are read from the memory map
+    return total
+
+
+class LanguageRegistry:
+    """Loads languages on first use and evicts cold ones LRU under a memory budget.
+
+    Concurrent requests for a language that is still loading all await the same
+    load instead of starting their own.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Optional[LanguageData]],
+        memory_budget_mb: int = settings.LANGUAGE_MEMORY_BUDGET_MB,
+        on_loaded: Optional[Callable[[str, LanguageData], None]] = None,
+    ):
+        self.loader = loader
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.on_loaded = on_loaded
+        self._loaded: "OrderedDict[str, LanguageData]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    def __contains__(self, language: str) -> bool:
+        return language in self._loaded
+
+    def loaded_languages(self) -> List[str]:
+        return list(self._loaded)
+
+    def memory_usage(self) -> int:
+        return sum(self._sizes.values())
+
+    def memory_of(self, language: str) -> int:
+        return self._sizes.get(language, 0)
+
+    def loading_languages(self) -> List[str]:
+        return list(self._loading)
+
+    async def wait_for_loads(self):
+        """Wait until the loads in flight have finished, successfully or not"""
+        pending = [asyncio.shield(future) for future in self._loading.values()]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def peek(self, language: str) -> Optional[LanguageData]:
+        """Return a loaded language without touching its LRU position"""
+        return self._loaded.get(language)
+
+    async def get(self, language: str) -> Optional[LanguageData]:
+        """Return a language's data, loading it first if needed"""
+        data = self._loaded.get(language)
+        if data is not None:
+            self._loaded.move_to_end(language)
+            return data
+        return await self.load(language)
+
+    async def load(self, language: str) -> Optional[LanguageData]:
+        """Load a language once, sharing the in-flight load with concurrent callers"""
+        pending = self._loading.get(language)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        loop = asyncio.get_running_loop()
+        pending = loop.create_future()
+        self._loading[language] = pending
+        try:
+            data = await loop.run_in_executor(None, self.loader, language)
+            if data is not None:
+                self._install(language, data)
+            pending.set_result(data)
+        except Exception as e:
+            pending.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            pending.exception()
+            raise
+        finally:
+            del self._loading[language]
+        return data
+
+    def prefetch(self, language: str):
+        """Start loading a language in the background if it is not loaded yet"""
+        if language in self._loaded or language in self._loading:
+            return
+        if language not in settings.SUPPORTED_LANGUAGES:
+            return
+        task = asyncio.get_running_loop().create_task(self.load(language))
+        task.add_done_callback(_log_prefetch_failure)
+
+    def replace(self, language: str, data: LanguageData):
+        """Swap in new data for a language in one step; searches holding the old data finish on it"""
+        self._install(language, data)
+
+    def evict(self, language: str) -> bool:
+        """Drop a loaded language; in-flight searches keep their own reference"""
+        if self._loaded.pop(language, None) is None:
+            return False
+        self._sizes.pop(language, None)
+        print(f"Evicted data for {language}")
+        return True
+
+    def _install(self, language: str, data: LanguageData):
+        self._loaded[language] = data
+        self._loaded.move_to_end(language)
+        self._sizes[language] = estimate_language_memory(data)
+        if self.on_loaded:
+            self.on_loaded(language, data)
+
+        if self.memory_budget > 0:
+            # Evict least recently used languages, never the one just loaded
+            while self.memory_usage() > self.memory_budget and len(self._loaded) > 1:
+                coldest = next(iter(self._loaded))
+                self.evict(coldest)
+
+
+def _log_prefetch_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Warning: Background language load failed: {task.exception()}")
@@ -0,0 +1,188 @@
+import os
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.snippet_store import SnippetStore
+
+_POSTING_ARRAYS = ("term_offsets", "doc_ids", "term_freqs", "doc_lengths")
+
+_TOKEN_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+[0-9]*|[A-Z]+[0-9]*|[0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens, splitting snake_case and camelCase identifiers"""
+    tokens = []
+    for word in re.split(r"[^A-Za-z0-9_]+", text):
+        if not word:
+            continue
+        parts = [p.lower() for p in _TOKEN_PATTERN.findall(word)]
+        tokens.extend(parts)
+        # Keep the whole identifier too, so exact names like parse_qs still match
+        if len(parts) > 1:
+            tokens.append(word.lower())
+    return tokens
+
+
+class CorpusStats(NamedTuple):
+    """Collection statistics BM25 scores are computed from"""
+    n_docs: int
+    avg_doc_length: float
+    doc_freqs: Dict[str, int]
+
+
+class BM25Index:
+    """BM25 inverted index with CSR (array-backed) postings.
+
+    `term_offsets[t]:term_offsets[t + 1]` slices `doc_ids` / `term_freqs` for term t.
+    On disk the vocabulary is a SnippetStore (offsets plus a UTF-8 blob) and each
+    postings array is its own .npy file, memory-mapped on load.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        term_offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.vocabulary = vocabulary
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.total_length = int(doc_lengths.sum())
+        self.avg_doc_length = self.total_length / len(doc_lengths) if len(doc_lengths) else 0.0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, documents: Iterable[str]) -> "BM25Index":
+        """Build the index from an iterable of document texts (row id = position)"""
+        vocabulary: Dict[str, int] = {}
+        pair_terms: List[np.ndarray] = []
+        pair_docs: List[np.ndarray] = []
+        pair_freqs: List[np.ndarray] = []
+        doc_lengths = []
+
+        for doc_id, text in enumerate(documents):
+            tokens = tokenize(text or "")
+            doc_lengths.append(len(tokens))
+            if not tokens:
+                continue
+            term_ids = np.fromiter((vocabulary.setdefault(t, len(vocabulary)) for t in tokens), dtype=np.int64)
+            unique, counts = np.unique(term_ids, return_counts=True)
+            pair_terms.append(unique)
+            pair_docs.append(np.full(len(unique), doc_id, dtype=np.int32))
+            pair_freqs.append(counts)
+
+        terms = np.concatenate(pair_terms) if pair_terms else np.zeros(0, dtype=np.int64)
+        docs = np.concatenate(pair_docs) if pair_docs else np.zeros(0, dtype=np.int32)
+        freqs = np.concatenate(pair_freqs) if pair_freqs else np.zeros(0, dtype=np.int64)
+
+        # Sort (term, doc) pairs by term; docs stay ascending within a term
+        order = np.argsort(terms, kind="stable")
+        term_offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocabulary)), out=term_offsets[1:])
+        return cls(
+            vocabulary,
+            term_offsets,
+            docs[order],
+            np.minimum(freqs[order], np.iinfo(np.uint16).max).astype(np.uint16),
+            np.asarray(doc_lengths, dtype=np.int32),
+        )
+
+    @staticmethod
+    def exists(prefix: str) -> bool:
+        if os.path.exists(prefix + ".npz"):
+            return True
+        return SnippetStore.exists(prefix + ".terms") and all(os.path.exists(f"{prefix}.{name}.npy") for name in _POSTING_ARRAYS)
+
+    def save(self, prefix: str):
+        """Persist to `<prefix>.terms.*` and one `<prefix>.<array>.npy` per postings array"""
+        terms = [""] * len(self.vocabulary)
+        for term, term_id in self.vocabulary.items():
+            terms[term_id] = term
+        SnippetStore.write(prefix + ".terms", terms)
+        for name in _POSTING_ARRAYS:
+            np.save(f"{prefix}.{name}.tmp.npy", getattr(self, name))
+        for name in _POSTING_ARRAYS:
+            os.replace(f"{prefix}.{name}.tmp.npy", f"{prefix}.{name}.npy")
+
+    @classmethod
+    def load(cls, prefix: str) -> "BM25Index":
+        if not SnippetStore.exists(prefix + ".terms") and os.path.exists(prefix + ".npz"):
+            # Single-file layout written by older builds
+            data = np.load(prefix + ".npz")
+            vocabulary = {term: term_id for term_id, term in enumerate(data["terms"].tolist())}
+            return cls(vocabulary, data["term_offsets"], data["doc_ids"], data["term_freqs"], data["doc_lengths"])
+        terms = SnippetStore(prefix + ".terms")
+        try:
+            vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+        finally:
+            terms.close()
+        return cls(vocabulary, *(np.load(f"{prefix}.{name}.npy", mmap_mode="r") for name in _POSTING_ARRAYS))
+
+    def doc_freq(self, term: str) -> int:
+        """Number of documents containing the term"""
+        term_id = self.vocabulary.get(term)
+        return 0 if term_id is None else int(self.term_offsets[term_id + 1] - self.term_offsets[term_id])
+
+    def search(self, query: str, top_k: int, stats: Optional[CorpusStats] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (scores, doc ids) of the top_k documents, best first
+
+        `stats` scores against a larger collection than this index (see corpus_stats),
+        so scores from several indexes can be compared.
+        """
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t in self.vocabulary]
+        if not terms or top_k <= 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        n_docs = stats.n_docs if stats is not None else len(self.doc_lengths)
+        avg_doc_length = stats.avg_doc_length if stats is not None else self.avg_doc_length
+        score_parts = []
+        doc_parts = []
+        for term in terms:
+            term_id = self.vocabulary[term]
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            doc_freq = stats.doc_freqs[term] if stats is not None else len(docs)
+            idf = np.log(1.0 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[docs] / max(avg_doc_length, 1e-9))
+            score_parts.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+            doc_parts.append(docs)
+
+        docs = np.concatenate(doc_parts)
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+
+        k = min(top_k, len(unique_docs))
+        best = np.argpartition(-totals, k - 1)[:k]
+        best = best[np.argsort(-totals[best], kind="stable")]
+        return totals[best], unique_docs[best].astype(np.int64)
+
+
+def corpus_stats(indexes: Sequence[BM25Index], query: str) -> CorpusStats:
+    """Statistics of the union of several indexes for the query's terms"""
+    n_docs = sum(len(index) for index in indexes)
+    total_length = sum(index.total_length for index in indexes)
+    doc_freqs = {term: sum(index.doc_freq(term) for index in indexes) for term in dict.fromkeys(tokenize(query))}
+    return CorpusStats(n_docs, total_length / n_docs if n_docs else 0.0, doc_freqs)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60, top_k: Optional[int] = None) -> List[Tuple[int, float]]:
+    """Fuse several ranked lists of row ids into one ranking of (row id, score)"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[int(row)] = scores.get(int(row), 0.0) + 1.0 / (k + rank + 1)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return fused[:top_k] if top_k is not None else fused
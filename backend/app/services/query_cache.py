@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional per-entry TTL and hit/miss counters"""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches `predicate`"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class QueryCache:
+    """Two-level cache: normalized query -> embedding, and (query, languages, top_k, search params) -> results.
+
+    Result keys carry the language's index version, which is bumped whenever that
+    language's index is (re)loaded, so stale results are never served.
+    """
+
+    def __init__(
+        self,
+        embedding_size: int = settings.QUERY_CACHE_EMBEDDING_SIZE,
+        result_size: int = settings.QUERY_CACHE_RESULT_SIZE,
+        ttl: Optional[float] = settings.QUERY_CACHE_TTL_SECONDS,
+    ):
+        self.embeddings = LRUCache(embedding_size, ttl)
+        self.results = LRUCache(result_size, ttl)
+        self.index_versions: Dict[str, int] = {}
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Collapse whitespace so trivially different copies of a query share an entry"""
+        return " ".join(query.split())
+
+    def get_embedding(self, query: str) -> Optional[np.ndarray]:
+        return self.embeddings.get(self.normalize(query))
+
+    def set_embedding(self, query: str, embedding: np.ndarray):
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        self.embeddings.set(self.normalize(query), embedding)
+
+    def _result_key(self, query: str, languages: Union[str, Sequence[str]], top_k: int, params: tuple) -> tuple:
+        languages = (languages,) if isinstance(languages, str) else tuple(languages)
+        versions = tuple(self.index_versions.get(language, 0) for language in languages)
+        return (self.normalize(query), languages, versions, top_k, params)
+
+    def get_results(self, query: str, language: Union[str, Sequence[str]], top_k: int, params: tuple = ()) -> Optional[List[Dict[str, Any]]]:
+        results = self.results.get(self._result_key(query, language, top_k, params))
+        if results is None:
+            return None
+        return [dict(result) for result in results]
+
+    def set_results(self, query: str, language: Union[str, Sequence[str]], top_k: int, results: List[Dict[str, Any]], params: tuple = ()):
+        self.results.set(self._result_key(query, language, top_k, params), [dict(result) for result in results])
+
+    def bump_index_version(self, language: str) -> int:
+        """Mark a language's index as reloaded and drop its cached results"""
+        version = self.index_versions.get(language, 0) + 1
+        self.index_versions[language] = version
+        self.results.invalidate(lambda key: language in key[1])
+        return version
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"embeddings": self.embeddings.stats(), "results": self.results.stats()}
+
+
+# Create singleton instance
+query_cache = QueryCache()
+
+# Caches reported on /metrics, by name
+_observed_caches: Dict[str, LRUCache] = {}
+
+def observe_cache(name: str, cache: LRUCache):
+    """Export a cache's hit, miss and size counters labelled with its name"""
+    _observed_caches[name] = cache
+
+def _cache_stat(stat: str):
+    return lambda: {(name,): cache.stats()[stat] for name, cache in list(_observed_caches.items())}
+
+observe_cache("embeddings", query_cache.embeddings)
+observe_cache("results", query_cache.results)
+
+metrics.counter("code_search_cache_hits_total", "Cache hits", ["cache"], callback=_cache_stat("hits"))
+metrics.counter("code_search_cache_misses_total", "Cache misses", ["cache"], callback=_cache_stat("misses"))
+metrics.gauge("code_search_cache_entries", "Entries held by each cache", ["cache"], callback=_cache_stat("size"))
\ No newline at end of file
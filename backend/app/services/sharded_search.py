@@ -0,0 +1,119 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.services.ann_index import merge_neighbors
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def thread_plan() -> Dict[str, int]:
+    """Thread counts for the encoder, FAISS's OpenMP and the shard pool.
+
+    With sharding on, the shard pool is where search parallelism comes from, so
+    FAISS's OpenMP runs single-threaded inside each shard, and unless they are set
+    explicitly the encoder and the shard pool split the CPUs between them instead
+    of each assuming it has the whole machine. 0 means "library default".
+    """
+    cpus = available_cpus()
+    sharding = settings.SEARCH_SHARDS > 1
+    shard_threads = settings.SEARCH_SHARD_THREADS or (min(settings.SEARCH_SHARDS, max(1, cpus // 2)) if sharding else 0)
+    if settings.TORCH_NUM_THREADS:
+        torch_threads = settings.TORCH_NUM_THREADS
+    else:
+        torch_threads = max(1, cpus - shard_threads) if sharding else 0
+    if settings.FAISS_OMP_THREADS:
+        faiss_threads = settings.FAISS_OMP_THREADS
+    else:
+        faiss_threads = 1 if sharding else 0
+    return {"cpus": cpus, "shard_threads": shard_threads, "torch_threads": torch_threads, "faiss_omp_threads": faiss_threads}
+
+
+def configure_faiss_threads():
+    """Apply the planned FAISS OpenMP thread count"""
+    threads = thread_plan()["faiss_omp_threads"]
+    if threads > 0:
+        faiss.omp_set_num_threads(threads)
+
+
+def shard_pool() -> ThreadPoolExecutor:
+    """The fixed pool shared by every sharded index; FAISS releases the GIL while it searches"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, thread_plan()["shard_threads"]), thread_name_prefix="search-shard")
+        return _pool
+
+
+def shutdown_shard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+class ShardedFlatIndex:
+    """Exact search over a flat index split into row-range shards searched in parallel.
+
+    The shards are views of the index's own vector storage (memory-mapped or
+    not), so nothing is copied. Each shard returns its own top-k and the partial
+    results are merged, which gives the same neighbours and distances as one
+    search over the whole index.
+    """
+
+    def __init__(self, index: faiss.IndexFlatL2, shards: int):
+        self.index = index
+        self.vectors = faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+        self.bounds = np.linspace(0, index.ntotal, max(1, shards) + 1).astype(np.int64)
+
+    def __len__(self):
+        return len(self.bounds) - 1
+
+    def search(self, queries: np.ndarray, k: int, exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        excluded = np.asarray(exclude if exclude is not None else [], dtype=np.int64)
+        parts = list(shard_pool().map(
+            lambda bounds: self._search_shard(queries, k, bounds[0], bounds[1], excluded),
+            zip(self.bounds[:-1], self.bounds[1:]),
+        ))
+        return merge_neighbors(parts, k)
+
+    def _search_shard(self, queries: np.ndarray, k: int, start: int, end: int, excluded: np.ndarray):
+        excluded = excluded[(excluded >= start) & (excluded < end)]
+        # Fetch past the excluded rows so each shard still contributes k live hits
+        shard_k = int(min(k + len(excluded), end - start))
+        if shard_k <= 0:
+            return np.zeros((len(queries), 0), dtype=np.float32), np.zeros((len(queries), 0), dtype=np.int64)
+        D, I = faiss.knn(queries, self.vectors[start:end], shard_k)
+        I = np.where(I >= 0, I + start, I)
+        if len(excluded):
+            hidden = np.isin(I, excluded)
+            D[hidden] = np.finfo(np.float32).max
+            I[hidden] = -1
+        return D, I
+
+
+def shard_index(index: faiss.Index) -> Optional[ShardedFlatIndex]:
+    """A sharded view of a loaded index when sharding is on and applies to it.
+
+    Only exact flat indices are sharded: splitting an IVF or HNSW index would
+    change which neighbours it finds.
+    """
+    if settings.SEARCH_SHARDS <= 1 or index.ntotal < settings.SEARCH_SHARD_MIN_ROWS:
+        return None
+    if not isinstance(index, faiss.IndexFlatL2):
+        return None
+    return ShardedFlatIndex(index, settings.SEARCH_SHARDS)
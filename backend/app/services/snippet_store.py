@@ -0,0 +1,175 @@
+import hashlib
+import mmap
+import os
+import re
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+_NON_WORD_EDGES = re.compile(r"^[\W_]+|[\W_]+$")
+
+
+def normalize_docstring(text: str) -> str:
+    """Normalize a docstring or query for near-exact matching"""
+    return _NON_WORD_EDGES.sub("", " ".join(text.lower().split()))
+
+
+def snippet_hash(text: str) -> str:
+    """Short content hash of one snippet, stored with chat references to its row"""
+    return hashlib.blake2b((text or "").encode("utf-8"), digest_size=8).hexdigest()
+
+
+def snippets_version(strings: Iterable[str]) -> str:
+    """Content version of a list of snippets; equal to the version of a SnippetStore written from them"""
+    digest = hashlib.blake2b(digest_size=8)
+    offsets = [0]
+    for text in strings:
+        data = (text or "").encode("utf-8")
+        digest.update(data)
+        offsets.append(offsets[-1] + len(data))
+    digest.update(np.asarray(offsets, dtype=np.uint64).tobytes())
+    return digest.hexdigest()
+
+
+def data_version(paths: Iterable[str]) -> str:
+    """Short id for a set of data files that changes whenever any of them is rewritten"""
+    digest = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SnippetStore:
+    """Read-only sequence of strings stored as an offsets array plus a UTF-8 blob.
+
+    Both files are memory-mapped, so opening is constant time, only the rows that
+    are read get decoded, and the pages are shared through the OS page cache by
+    every process that opens the same files.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.offsets = np.load(prefix + ".offsets.npy", mmap_mode="r")
+        self._file = open(prefix + ".blob", "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @staticmethod
+    def exists(prefix: str) -> bool:
+        return os.path.exists(prefix + ".offsets.npy") and os.path.exists(prefix + ".blob")
+
+    @staticmethod
+    def write(prefix: str, strings: Iterable[str]):
+        """Write strings to `<prefix>.offsets.npy` and `<prefix>.blob`, and their content version to `<prefix>.version`"""
+        digest = hashlib.blake2b(digest_size=8)
+        offsets = [0]
+        with open(prefix + ".blob.tmp", "wb") as blob:
+            for text in strings:
+                data = (text or "").encode("utf-8")
+                blob.write(data)
+                digest.update(data)
+                offsets.append(offsets[-1] + len(data))
+        offsets = np.asarray(offsets, dtype=np.uint64)
+        digest.update(offsets.tobytes())
+        np.save(prefix + ".offsets.tmp.npy", offsets)
+        with open(prefix + ".version.tmp", "w") as f:
+            f.write(digest.hexdigest())
+        os.replace(prefix + ".blob.tmp", prefix + ".blob")
+        os.replace(prefix + ".offsets.tmp.npy", prefix + ".offsets.npy")
+        os.replace(prefix + ".version.tmp", prefix + ".version")
+
+    @staticmethod
+    def content_version(prefix: str) -> str:
+        """Content version of a store: the one recorded when it was written, or hashed
+        from the files for stores written before versions were recorded"""
+        try:
+            with open(prefix + ".version") as f:
+                return f.read().strip()
+        except OSError:
+            pass
+        digest = hashlib.blake2b(digest_size=8)
+        with open(prefix + ".blob", "rb") as blob:
+            for chunk in iter(lambda: blob.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(np.ascontiguousarray(np.load(prefix + ".offsets.npy"), dtype=np.uint64).tobytes())
+        return digest.hexdigest()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return self._blob[int(self.offsets[row]):int(self.offsets[row + 1])].decode("utf-8")
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def get_many(self, rows: Sequence[int]) -> List[str]:
+        return [self[row] for row in rows]
+
+    def nbytes(self) -> int:
+        return len(self._blob) + self.offsets.nbytes
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+
+class DocstringLookup:
+    """Normalized docstring -> row id, stored as sorted 64-bit hashes for mmap loading.
+
+    Hash hits are confirmed against the docstring itself, so collisions never
+    return a wrong row.
+    """
+
+    def __init__(self, hashes: np.ndarray, rows: np.ndarray, docstrings: Sequence[str]):
+        self.hashes = hashes
+        self.rows = rows
+        self.docstrings = docstrings
+
+    @staticmethod
+    def hash_text(normalized: str) -> int:
+        return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little")
+
+    @classmethod
+    def build(cls, docstrings: Sequence[str]) -> "DocstringLookup":
+        hashes, rows = [], []
+        for row, docstring in enumerate(docstrings):
+            if docstring:
+                hashes.append(cls.hash_text(normalize_docstring(docstring)))
+                rows.append(row)
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(hashes, kind="stable")
+        return cls(hashes[order], rows[order], docstrings)
+
+    @classmethod
+    def load(cls, path: str, docstrings: Sequence[str]) -> "DocstringLookup":
+        data = np.load(path, mmap_mode="r")
+        return cls(data[0].view(np.uint64), data[1], docstrings)
+
+    def save(self, path: str):
+        np.save(path, np.vstack([self.hashes.view(np.int64), self.rows]))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, normalized: str) -> Optional[int]:
+        """Row id of the first docstring equal to `normalized`, if any"""
+        if not len(self.hashes):
+            return None
+        value = np.uint64(self.hash_text(normalized))
+        pos = int(np.searchsorted(self.hashes, value))
+        while pos < len(self.hashes) and self.hashes[pos] == value:
+            row = int(self.rows[pos])
+            if normalize_docstring(self.docstrings[row]) == normalized:
+                return row
+            pos += 1
+        return None
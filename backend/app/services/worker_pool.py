@@ -0,0 +1,531 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from app.core.config import settings
+from app.services.delta_segment import StaleSegmentError
+from app.services.inference_scheduler import InferenceQueueFullError
+
+# Exceptions that are re-raised with their own type on the client side
+_REMOTE_ERRORS = {
+    "ValueError": ValueError,
+    "InferenceQueueFullError": InferenceQueueFullError,
+    "StaleSegmentError": StaleSegmentError,
+    "ConnectionError": ConnectionError,
+}
+
+# Operations every worker runs; the client gets back the list of their results
+BROADCAST_OPS = {"reload", "sync_delta"}
+
+# Read-only operations a client retries once on a fresh connection when the pool drops them
+RETRY_OPS = {"search", "search_batch", "snippets", "prefetch", "status", "languages"}
+
+# Lock file held by the supervisor that owns a unix socket address
+_server_lock_file = None
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """"host:port" -> TCP tuple; anything else is a unix socket path or Windows pipe name"""
+    if address.startswith("\\\\.\\pipe\\") or "/" in address or "\\" in address:
+        return address
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def _authkey() -> bytes:
+    # The pool channel carries pickles, so a publicly known key would allow code execution
+    if settings.SECRET_KEY == settings.DEFAULT_SECRET_KEY:
+        raise RuntimeError("The search pool needs SECRET_KEY to be set; it refuses to run with the default key")
+    return settings.SECRET_KEY.encode("utf-8")
+
+
+def _is_unix_socket(address: Union[str, Tuple[str, int]]) -> bool:
+    return os.name != "nt" and isinstance(address, str) and not address.startswith("\\\\")
+
+
+def _lock_address(address: str):
+    """Take the exclusive lock on a unix socket address, or return None when another supervisor holds it"""
+    import fcntl
+    f = open(address + ".lock", "a+b")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def is_pool_running(address: Union[str, Tuple[str, int]]) -> bool:
+    """Whether a pool server is accepting connections at `address`"""
+    try:
+        conn = Client(address, authkey=_authkey())
+    except (OSError, EOFError):
+        return False
+    conn.close()
+    return True
+
+
+def _worker_main(worker_id: int, cpu: Optional[int], tasks, results, threads: int, preloaded: Optional[tuple]):
+    """Pool worker: one CodeSearchService serving tasks concurrently on its own event loop"""
+    import faiss
+    import torch
+    from app.services.code_search import CodeSearchService
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # A forked worker must not keep the supervisor's address lock alive after the supervisor dies
+    if _server_lock_file is not None:
+        _server_lock_file.close()
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+    torch.set_num_threads(threads)
+    faiss.omp_set_num_threads(threads)
+
+    service = CodeSearchService()
+    if preloaded is not None:
+        # Forked from the supervisor: the model weights are shared copy-on-write
+        service.model, service.tokenizer = preloaded
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(service.initialize())
+    print(f"Search pool worker {worker_id} ready (cpu {cpu}, {threads} threads)")
+
+    async def handle(task):
+        conn_id, request_id, op, kwargs = task
+        try:
+            if op == "search":
+                payload = await service.search(**kwargs)
+            elif op == "search_batch":
+                payload = await service.search_batch(**kwargs)
+            elif op == "snippets":
+                payload = await service.get_snippets(**kwargs)
+            elif op == "prefetch":
+                service.registry.prefetch(kwargs["language"])
+                payload = None
+            elif op == "status":
+                payload = {"worker": worker_id, **service.readiness()}
+            elif op == "languages":
+                payload = service.language_status()
+            elif op == "reload":
+                payload = {"worker": worker_id, **await service.reload_language(**kwargs)}
+            elif op == "ingest":
+                payload = await service.ingest(**kwargs)
+            elif op == "delete_snippets":
+                payload = await service.delete_snippets(**kwargs)
+            elif op == "sync_delta":
+                payload = {"worker": worker_id, **await service.sync_delta(**kwargs)}
+            else:
+                raise ValueError(f"Unknown pool operation: {op}")
+            results.put((conn_id, request_id, True, payload))
+        except Exception as e:
+            results.put((conn_id, request_id, False, (type(e).__name__, str(e))))
+
+    def read_tasks():
+        while True:
+            task = tasks.get()
+            if task is None:
+                loop.call_soon_threadsafe(loop.stop)
+                return
+            asyncio.run_coroutine_threadsafe(handle(task), loop)
+
+    def watch_supervisor(parent: int):
+        # Exit with the supervisor rather than linger as an orphan holding its socket
+        while os.getppid() == parent:
+            time.sleep(1)
+        os._exit(0)
+
+    threading.Thread(target=read_tasks, name="pool-task-reader", daemon=True).start()
+    threading.Thread(target=watch_supervisor, args=(os.getppid(),), name="pool-parent-watch", daemon=True).start()
+    loop.run_forever()
+
+
+class SearchPoolServer:
+    """Supervisor that owns N search worker processes and serves them over a local IPC channel.
+
+    Workers memory-map the same FAISS indices and snippet stores, so the OS page
+    cache holds one copy of the data however many workers there are. With the
+    fork start method the model is also loaded once and shared copy-on-write.
+    Each worker has its own task queue; a worker that dies is restarted, and the
+    requests it had not answered fail instead of hanging. With `idle_seconds` >= 0
+    the supervisor exits once no client has been connected for that long.
+    """
+
+    def __init__(
+        self,
+        address: str = settings.SEARCH_POOL_ADDRESS,
+        workers: int = settings.SEARCH_POOL_WORKERS,
+        threads_per_worker: int = settings.SEARCH_POOL_THREADS_PER_WORKER,
+        start_method: str = settings.SEARCH_POOL_START_METHOD,
+        idle_seconds: float = -1,
+    ):
+        self.address = parse_address(address)
+        self.workers = max(1, workers)
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.start_method = start_method
+        self.idle_seconds = idle_seconds
+        self._connections: Dict[int, Connection] = {}
+        self._send_locks: Dict[int, threading.Lock] = {}
+        self._conn_ids = itertools.count()
+        self._listener: Optional[Listener] = None
+        self._ctx = None
+        self._preloaded: Optional[tuple] = None
+        self._cpus: List[int] = []
+        # worker id -> its process, task and result queues, and the requests it has not answered
+        self._processes: Dict[int, Any] = {}
+        self._task_queues: Dict[int, Any] = {}
+        self._result_queues: Dict[int, Any] = {}
+        self._in_flight: Dict[int, Set[Tuple[int, int]]] = {}
+        # (conn_id, request_id) -> (workers yet to answer, results so far) for a broadcast operation
+        self._broadcasts: Dict[Tuple[int, int], Tuple[Set[int], List[Tuple[bool, Any]]]] = {}
+        self._lock = threading.Lock()
+
+    def serve_forever(self):
+        global _server_lock_file
+        authkey = _authkey()
+        if _is_unix_socket(self.address):
+            # Only the lock holder may replace the socket file, so two supervisors
+            # racing here cannot unlink each other's live socket. A holder that no
+            # longer serves is an idle supervisor shutting down: wait for it.
+            deadline = time.monotonic() + settings.SEARCH_POOL_CONNECT_TIMEOUT
+            while True:
+                _server_lock_file = _lock_address(self.address)
+                if _server_lock_file is not None or is_pool_running(self.address) or time.monotonic() > deadline:
+                    break
+                time.sleep(0.2)
+            if _server_lock_file is None or is_pool_running(self.address):
+                print(f"Search pool already running at {self.address}")
+                return
+            if os.path.exists(self.address):
+                # Stale socket left behind by a crashed server
+                os.remove(self.address)
+        try:
+            self._listener = Listener(self.address, authkey=authkey)
+        except OSError as e:
+            # TCP ports and named pipes cannot be bound twice
+            print(f"Search pool already running at {self.address}: {e}")
+            return
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+        self._ctx = multiprocessing.get_context(self.start_method)
+        if self.start_method == "fork":
+            # Load the model once before forking so workers share its pages
+            from app.services.embeddings import load_model_tokenizer
+            self._preloaded = asyncio.run(load_model_tokenizer())
+
+        self._cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        for worker_id in range(self.workers):
+            self._start_worker(worker_id)
+
+        threading.Thread(target=self._supervise, name="pool-supervisor", daemon=True).start()
+        print(f"Search pool serving {self.workers} workers at {self.address}")
+        try:
+            while True:
+                try:
+                    conn = self._listener.accept()
+                except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                    # A client that failed or dropped the handshake
+                    print(f"Search pool rejected a connection: {e!r}")
+                    continue
+                conn_id = next(self._conn_ids)
+                self._connections[conn_id] = conn
+                self._send_locks[conn_id] = threading.Lock()
+                threading.Thread(target=self._read_requests, args=(conn_id, conn), daemon=True).start()
+        finally:
+            self._stop()
+
+    def _start_worker(self, worker_id: int):
+        """Start a worker, replacing a dead one with the same id"""
+        cpu = self._cpus[worker_id % len(self._cpus)] if self._cpus else None
+        tasks, results = self._ctx.Queue(), self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, cpu, tasks, results, self.threads_per_worker, self._preloaded),
+            name=f"search-pool-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        with self._lock:
+            old_results = self._result_queues.get(worker_id)
+            lost = list(self._in_flight.get(worker_id, ()))
+            self._processes[worker_id] = process
+            self._task_queues[worker_id] = tasks
+            self._result_queues[worker_id] = results
+            self._in_flight[worker_id] = set()
+        threading.Thread(target=self._route_results, args=(worker_id, results), name=f"pool-router-{worker_id}", daemon=True).start()
+        if old_results is not None:
+            old_results.put(None)
+        for key in lost:
+            self._finish(worker_id, key, None)
+
+    def _supervise(self):
+        """Restart workers that die, and stop the pool after idle_seconds without clients"""
+        idle_since = time.monotonic()
+        while True:
+            time.sleep(1)
+            for worker_id, process in list(self._processes.items()):
+                if not process.is_alive():
+                    print(f"Search pool worker {worker_id} exited with code {process.exitcode}; restarting it")
+                    self._start_worker(worker_id)
+            if self.idle_seconds < 0:
+                continue
+            if self._connections:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= self.idle_seconds:
+                print(f"Search pool at {self.address} has had no clients for {self.idle_seconds}s; stopping")
+                self._stop()
+                sys.stdout.flush()
+                os._exit(0)
+
+    def _stop(self):
+        """Give up the address, then stop the workers"""
+        if self._listener is not None:
+            # Also unlinks a unix socket, so new clients start a fresh supervisor
+            self._listener.close()
+        for tasks in list(self._task_queues.values()):
+            tasks.put(None)
+        for process in list(self._processes.values()):
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+
+    def _read_requests(self, conn_id: int, conn: Connection):
+        try:
+            while True:
+                request_id, op, kwargs = conn.recv()
+                key = (conn_id, request_id)
+                with self._lock:
+                    if op in BROADCAST_OPS:
+                        targets = list(self._task_queues)
+                        self._broadcasts[key] = (set(targets), [])
+                    else:
+                        # The worker with the fewest unanswered requests
+                        targets = [min(self._task_queues, key=lambda worker_id: len(self._in_flight[worker_id]))]
+                    for worker_id in targets:
+                        self._in_flight[worker_id].add(key)
+                    queues = [self._task_queues[worker_id] for worker_id in targets]
+                for tasks in queues:
+                    tasks.put((conn_id, request_id, op, kwargs))
+        except (EOFError, OSError):
+            pass
+        finally:
+            self._connections.pop(conn_id, None)
+            self._send_locks.pop(conn_id, None)
+            conn.close()
+
+    def _route_results(self, worker_id: int, results):
+        while True:
+            result = results.get()
+            if result is None:
+                return
+            conn_id, request_id, ok, payload = result
+            self._finish(worker_id, (conn_id, request_id), (ok, payload))
+
+    def _finish(self, worker_id: int, key: Tuple[int, int], result: Optional[Tuple[bool, Any]]):
+        """Record a worker's answer to a request; `result` is None when the worker died first"""
+        with self._lock:
+            in_flight = self._in_flight.get(worker_id)
+            if in_flight is not None:
+                in_flight.discard(key)
+            broadcast = self._broadcasts.get(key)
+            if broadcast is not None:
+                waiting, collected = broadcast
+                if worker_id not in waiting:
+                    return
+                waiting.discard(worker_id)
+                if result is not None:
+                    collected.append(result)
+                if waiting:
+                    return
+                del self._broadcasts[key]
+        if broadcast is not None:
+            # Every live worker answered: the first failure, or all results
+            failures = [payload for ok, payload in collected if not ok]
+            if failures:
+                result = (False, failures[0])
+            elif collected:
+                result = (True, [payload for _, payload in collected])
+            else:
+                result = (False, ("ConnectionError", "No search pool worker answered"))
+        elif result is None:
+            result = (False, ("ConnectionError", f"Search pool worker {worker_id} exited before answering"))
+        self._send(key, *result)
+
+    def _send(self, key: Tuple[int, int], ok: bool, payload: Any):
+        conn_id, request_id = key
+        conn = self._connections.get(conn_id)
+        lock = self._send_locks.get(conn_id)
+        if conn is None or lock is None:
+            return
+        try:
+            with lock:
+                conn.send((request_id, ok, payload))
+        except (OSError, ValueError):
+            pass
+
+
+def run_pool_server(idle_seconds: float = -1):
+    """Process entry point for a pool supervisor"""
+    SearchPoolServer(idle_seconds=idle_seconds).serve_forever()
+
+
+def _start_pool_process() -> subprocess.Popen:
+    """Start a supervisor in its own session, so it outlives the web worker that started it"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [backend_dir, os.environ.get("PYTHONPATH")]))}
+    options = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == "nt" else {"start_new_session": True}
+    return subprocess.Popen([sys.executable, "-m", "app.tools.search_pool", "--stop-when-idle"], env=env, **options)
+
+
+def _connect_or_start(address: Union[str, Tuple[str, int]], timeout: float) -> Connection:
+    """Connect to the pool at `address`, starting a supervisor if nobody serves it yet"""
+    authkey = _authkey()
+    deadline = time.monotonic() + timeout
+    process = None
+    while True:
+        try:
+            return Client(address, authkey=authkey)
+        except (OSError, EOFError):
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Search pool did not start at {address}")
+        # A supervisor that lost the race to another one exits; the next attempt connects to the winner
+        if process is None or process.poll() is not None:
+            process = _start_pool_process()
+        time.sleep(0.2)
+
+
+class SearchPoolClient:
+    """Async client for the search pool; one connection multiplexes concurrent requests.
+
+    A lost connection is re-established on the next call (starting a supervisor
+    if none serves the address any more), and read-only calls are retried once.
+    """
+
+    def __init__(self, address: str = settings.SEARCH_POOL_ADDRESS, timeout: float = settings.SEARCH_POOL_CONNECT_TIMEOUT):
+        self.address = parse_address(address)
+        self.connect_timeout = timeout
+        self.conn: Optional[Connection] = None
+        self._closed = False
+        self._connect_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._pending: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Future, Connection]] = {}
+        self._connect()
+
+    def _connect(self) -> Connection:
+        with self._connect_lock:
+            if self._closed:
+                raise ConnectionError("Search pool client is closed")
+            if self.conn is None:
+                self.conn = _connect_or_start(self.address, self.connect_timeout)
+                threading.Thread(target=self._read_responses, args=(self.conn,), name="pool-client-reader", daemon=True).start()
+            return self.conn
+
+    async def call(self, op: str, **kwargs) -> Any:
+        attempts = 2 if op in RETRY_OPS else 1
+        for attempt in range(attempts):
+            try:
+                return await self._call(op, kwargs)
+            except ConnectionError:
+                if attempt == attempts - 1:
+                    raise
+
+    async def _call(self, op: str, kwargs: Dict[str, Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        conn = self.conn
+        if conn is None:
+            conn = await loop.run_in_executor(None, self._connect)
+        future = loop.create_future()
+        request_id = next(self._request_ids)
+        self._pending[request_id] = (loop, future, conn)
+        try:
+            try:
+                with self._send_lock:
+                    conn.send((request_id, op, kwargs))
+            except (OSError, ValueError) as e:
+                self._lost(conn)
+                raise ConnectionError(f"Search pool connection lost: {e}") from e
+            timeout = settings.SEARCH_POOL_REQUEST_TIMEOUT
+            try:
+                return await asyncio.wait_for(future, timeout if timeout > 0 else None)
+            except asyncio.TimeoutError:
+                raise asyncio.TimeoutError(f"Search pool did not answer {op} within {timeout}s") from None
+        finally:
+            self._pending.pop(request_id, None)
+
+    def close(self):
+        self._closed = True
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            _shutdown(conn)
+
+    def _lost(self, conn: Connection):
+        """Forget a dead connection and fail the requests sent on it"""
+        if self.conn is conn:
+            self.conn = None
+        for loop, future, sent_on in list(self._pending.values()):
+            if sent_on is conn:
+                loop.call_soon_threadsafe(_resolve, future, None, ConnectionError("Search pool connection lost"))
+
+    def _read_responses(self, conn: Connection):
+        try:
+            while True:
+                request_id, ok, payload = conn.recv()
+                entry = self._pending.get(request_id)
+                if entry is None:
+                    continue
+                loop, future, _ = entry
+                if ok:
+                    loop.call_soon_threadsafe(_resolve, future, payload, None)
+                else:
+                    error_type, message = payload
+                    error = _REMOTE_ERRORS.get(error_type, RuntimeError)(message)
+                    loop.call_soon_threadsafe(_resolve, future, None, error)
+        except (EOFError, OSError):
+            self._lost(conn)
+
+
+def _shutdown(conn: Connection):
+    """Close a connection that another thread may be blocked reading from.
+
+    Closing the descriptor alone leaves the socket open until that read returns,
+    so the pool would keep counting the client as connected.
+    """
+    if os.name != "nt":
+        try:
+            with socket.socket(fileno=os.dup(conn.fileno())) as sock:
+                sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    conn.close()
+
+
+def _resolve(future: asyncio.Future, result: Any, error: Optional[Exception]):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def connect_or_start_pool(timeout: float = settings.SEARCH_POOL_CONNECT_TIMEOUT) -> SearchPoolClient:
+    """Connect to the pool, starting a supervisor process if nobody serves it yet.
+
+    Several web workers may race here; the losers' supervisors find the address
+    locked (unix sockets) or already bound and exit, and every worker ends up
+    connected to the same pool. A supervisor started this way runs in its own
+    session and exits once no client has been connected for
+    SEARCH_POOL_IDLE_SECONDS, so it serves every web worker until the last one
+    has gone.
+    """
+    return SearchPoolClient(settings.SEARCH_POOL_ADDRESS, timeout)
@@ -0,0 +1,278 @@
+"""
+Offline load test for the search, chat and auth endpoints. Generates a synthetic
+index per language, swaps in a small random encoder and an in-memory Mongo, then
+drives the ASGI app in-process at each concurrency level and reports p50/p95/p99
+latency, throughput and peak RSS. Pass --baseline to compare against an earlier
+run; the exit status is 1 when any scenario regressed beyond --max-regression.
+Usage: python -m app.tools.benchmark [--languages python java --snippets 20000]
+       [--scenarios search chat auth --concurrency 1 8 32 --requests 200]
+       [--shards 4] [--output bench.json --baseline previous.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SCENARIOS = ("search", "chat", "auth")
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 2 ** 20, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+def summarize(latencies: List[float], errors: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies_ms, 50)), 2),
+            "p95": round(float(np.percentile(latencies_ms, 95)), 2),
+            "p99": round(float(np.percentile(latencies_ms, 99)), 2),
+            "mean": round(float(latencies_ms.mean()), 2),
+            "max": round(float(latencies_ms.max()), 2),
+        },
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+async def run_level(request: Callable[[int, int], Awaitable[Any]], concurrency: int, total: int, warmup: int) -> Dict[str, Any]:
+    """Issue `total` requests from `concurrency` workers, after `warmup` unmeasured ones"""
+    await asyncio.gather(*(request(i % concurrency, i) for i in range(warmup)))
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(total))
+
+    async def worker(worker_id: int):
+        for i in counter:
+            start = time.perf_counter()
+            response = await request(worker_id, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], max_regression: float) -> Tuple[List[str], bool]:
+    """Lines describing p95 / throughput changes against a baseline run; regressions are flagged"""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    lines, regressed = [], False
+    for result in results:
+        old = previous.get((result["scenario"], result["concurrency"]))
+        if old is None:
+            continue
+        p95_change = result["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1 if old["latency_ms"]["p95"] else 0.0
+        rps_change = result["throughput_rps"] / old["throughput_rps"] - 1 if old["throughput_rps"] else 0.0
+        flag = p95_change > max_regression or rps_change < -max_regression
+        regressed |= flag
+        lines.append(
+            f"{result['scenario']:>7} c={result['concurrency']:<4} p95 {p95_change:+.1%}  throughput {rps_change:+.1%}"
+            + ("  REGRESSION" if flag else "")
+        )
+    return lines, regressed
+
+def configure_environment(args, data_dir: str):
+    """Settings are read from the environment at import time, so this runs before any app import"""
+    os.environ["MODEL_DIR"] = data_dir
+    os.environ["PRELOAD_LANGUAGES"] = ",".join(args.languages)
+    os.environ["SEARCH_POOL_WORKERS"] = "0"
+    if args.index_type:
+        os.environ["INDEX_TYPE"] = args.index_type
+    if args.shards:
+        # Shard even the small synthetic indices
+        os.environ["SEARCH_SHARDS"] = str(args.shards)
+        os.environ["SEARCH_SHARD_MIN_ROWS"] = "0"
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+async def run(args, data_dir: str) -> Dict[str, Any]:
+    import httpx
+
+    from app.core.config import settings
+    from app.db import mongodb
+    from app.main import app
+    from app.services.ann_index import index_file_name
+    from app.services.code_search import code_search_service
+    from app.services.sharded_search import thread_plan
+    from app.tools.benchmark_fixtures import InMemoryMongoClient, build_synthetic_language, load_stub_encoder, synthetic_snippets
+
+    model, tokenizer = load_stub_encoder(dim=args.dim, seed=args.seed)
+    corpus = []
+    for language in args.languages:
+        index_file = os.path.join(data_dir, language, index_file_name(settings.get_index_type(language)))
+        if os.path.exists(index_file):
+            print(f"{language}: reusing synthetic data in {data_dir}")
+            corpus.append({"language": language, "queries": synthetic_snippets(language, args.snippets, args.seed)[0]})
+            continue
+        start = time.perf_counter()
+        corpus.append(build_synthetic_language(data_dir, language, args.snippets, model, tokenizer, seed=args.seed))
+        print(f"{language}: built {args.snippets} synthetic snippets in {time.perf_counter() - start:.1f}s")
+
+    # Paraphrase the docstrings so queries miss the exact-docstring fast path unless asked to hit it
+    rng = random.Random(args.seed)
+    queries = [
+        (item["language"], query if args.exact_docstrings else f"how to {query.rstrip('.').lower()}")
+        for item in corpus for query in item["queries"]
+    ]
+    rng.shuffle(queries)
+
+    # No lifespan events run under the ASGI transport: wire the stand-ins up directly
+    mongodb.db.client = InMemoryMongoClient()
+    code_search_service.model, code_search_service.tokenizer = model, tokenizer
+    await code_search_service.initialize()
+    while not code_search_service.readiness()["ready"]:
+        await asyncio.sleep(0.05)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        password = "benchmark-password"
+        response = await client.post("/api/auth/register", json={
+            "username": "benchmark", "email": "benchmark@example.com", "full_name": "Benchmark", "password": password
+        })
+        response.raise_for_status()
+        response = await client.post("/api/auth/token", data={"username": "benchmark", "password": password})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        sessions = []
+        for worker_id in range(max(args.concurrency)):
+            response = await client.post("/api/chat/", json={"title": f"benchmark {worker_id}"}, headers=headers)
+            response.raise_for_status()
+            sessions.append(response.json()["_id"])
+
+        def query(i: int):
+            return queries[i % len(queries)]
+
+        async def search(worker_id: int, i: int):
+            language, text = query(i)
+            return await client.post("/api/search/", json={
+                "query": text, "language": language, "top_k": args.top_k, "mode": args.mode
+            }, headers=headers)
+
+        async def chat(worker_id: int, i: int):
+            language, text = query(i)
+            return await client.post(f"/api/chat/{sessions[worker_id]}/messages", json={
+                "message": text, "language": language
+            }, headers=headers)
+
+        async def auth(worker_id: int, i: int):
+            return await client.post("/api/auth/token", data={"username": "benchmark", "password": password})
+
+        requests = {"search": search, "chat": chat, "auth": auth}
+        results = []
+        offset = 0
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                # Fresh queries per level so the result cache does not flatter later levels
+                base = offset
+                summary = await run_level(lambda w, i: requests[scenario](w, base + i), concurrency, args.requests, args.warmup)
+                offset += args.requests + args.warmup
+                summary.update({"scenario": scenario, "concurrency": concurrency})
+                results.append(summary)
+                latency = summary["latency_ms"]
+                print(
+                    f"{scenario:>7} c={concurrency:<4} p50 {latency['p50']:8.2f} ms  p95 {latency['p95']:8.2f} ms  "
+                    f"p99 {latency['p99']:8.2f} ms  {summary['throughput_rps']:8.1f} req/s  "
+                    f"peak RSS {summary['peak_rss_mb']} MB  errors {summary['errors'] or 0}"
+                )
+
+    await code_search_service.shutdown()
+    return {
+        "config": {
+            "languages": args.languages,
+            "snippets": args.snippets,
+            "dimension": args.dim,
+            "index_types": {language: settings.get_index_type(language) for language in args.languages},
+            "mode": args.mode,
+            "top_k": args.top_k,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "exact_docstrings": args.exact_docstrings,
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            "search_shards": settings.SEARCH_SHARDS,
+            "threads": thread_plan(),
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--languages", nargs="+", default=["python"])
+    parser.add_argument("--snippets", type=int, default=20000, help="Synthetic snippets per language")
+    parser.add_argument("--dim", type=int, default=256, help="Stub encoder embedding size")
+    parser.add_argument("--index-type", help="Overrides INDEX_TYPE for the synthetic indices")
+    parser.add_argument("--data-dir", help="Keep the synthetic data here and reuse it across runs (default: a temp dir)")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--mode", default="vector", choices=["vector", "hybrid", "lexical"])
+    parser.add_argument("--exact-docstrings", action="store_true", help="Query with verbatim docstrings (exercises the fast path)")
+    parser.add_argument("--shards", type=int, help="Overrides SEARCH_SHARDS (intra-query sharded search)")
+    parser.add_argument("--bcrypt-rounds", type=int, help="Overrides BCRYPT_ROUNDS for the auth scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative p95 / throughput change")
+    args = parser.parse_args()
+
+    temp_dir = None
+    data_dir = args.data_dir
+    if data_dir is None:
+        temp_dir = tempfile.TemporaryDirectory(prefix="code-search-bench-")
+        data_dir = temp_dir.name
+    os.makedirs(data_dir, exist_ok=True)
+    configure_environment(args, data_dir)
+
+    try:
+        report = asyncio.run(run(args, data_dir))
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressed = compare(report["results"], baseline, args.max_regression)
+        print(f"Compared with {args.baseline}:")
+        for line in lines:
+            print(line)
+        if regressed:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
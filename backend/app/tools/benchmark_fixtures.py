@@ -0,0 +1,385 @@
+"""
+Offline stand-ins for the benchmark: a synthetic per-language corpus and index,
+a small randomly initialized encoder with a hashing tokenizer, and an in-memory
+Mongo client covering the queries the API issues.
+"""
+
+import copy
+import hashlib
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+from bson import ObjectId
+from transformers import BatchEncoding
+
+from app.core.config import settings
+from app.services.ann_index import (
+    COMPRESSED_INDEX_TYPES, RERANK_VECTORS_FILE, build_index, index_file_name, write_index, write_rerank_vectors,
+)
+from app.services.code_search import build_lexical_index
+from app.tools.convert_metadata import write_snippet_files
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+_VERBS = ["get", "set", "parse", "load", "save", "read", "write", "build", "merge", "sort", "filter", "find", "update", "delete", "send"]
+_NOUNS = ["user", "file", "config", "request", "response", "token", "index", "cache", "record", "message", "path", "list", "queue", "image", "session"]
+_QUALIFIERS = ["from disk", "by id", "in place", "with retries", "for the current user", "as json", "in batches", "if missing", "recursively", "asynchronously"]
+
+
+class StubTokenizer:
+    """Hashing tokenizer with the call / pad interface the service uses"""
+
+    pad_token_id = 0
+
+    def __init__(self, vocab_size: int = 32000):
+        self.vocab_size = vocab_size
+
+    def _ids(self, text: str, max_length: int) -> List[int]:
+        ids = [
+            1 + int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little") % (self.vocab_size - 1)
+            for token in _TOKEN.findall(text.lower())
+        ]
+        return ids[:max_length] or [1]
+
+    def __call__(self, texts, padding=None, truncation=True, max_length: int = 512, return_tensors=None):
+        input_ids = [self._ids(text, max_length) for text in texts]
+        encoded = {"input_ids": input_ids, "attention_mask": [[1] * len(ids) for ids in input_ids]}
+        if padding == "max_length":
+            encoded = self._pad(encoded, max_length)
+        elif padding:
+            encoded = self._pad(encoded, max(len(ids) for ids in input_ids))
+        return BatchEncoding(encoded, tensor_type=return_tensors)
+
+    def pad(self, encoded, padding="longest", return_tensors=None):
+        return BatchEncoding(self._pad(encoded, max(len(ids) for ids in encoded["input_ids"])), tensor_type=return_tensors)
+
+    def _pad(self, encoded, length: int):
+        return {
+            "input_ids": [ids + [self.pad_token_id] * (length - len(ids)) for ids in encoded["input_ids"]],
+            "attention_mask": [mask + [0] * (length - len(mask)) for mask in encoded["attention_mask"]],
+        }
+
+
+class StubEncoder(torch.nn.Module):
+    """Embedding bag + projection returning normalized sentence embeddings, like the real encoder"""
+
+    def __init__(self, vocab_size: int = 32000, hidden: int = 256, dim: int = 256, seed: int = 0):
+        super().__init__()
+        generator = torch.Generator().manual_seed(seed)
+        self.embeddings = torch.nn.Embedding(vocab_size, hidden)
+        self.projection = torch.nn.Linear(hidden, dim)
+        with torch.no_grad():
+            self.embeddings.weight.copy_(torch.randn(vocab_size, hidden, generator=generator))
+            self.projection.weight.copy_(torch.randn(dim, hidden, generator=generator) / hidden ** 0.5)
+            self.projection.bias.zero_()
+
+    def forward(self, input_ids, attention_mask):
+        mask = attention_mask.unsqueeze(-1).to(self.embeddings.weight.dtype)
+        pooled = (self.embeddings(input_ids) * mask).sum(1) / mask.sum(1).clamp(min=1)
+        return torch.nn.functional.normalize(torch.tanh(self.projection(pooled)), dim=-1)
+
+
+def load_stub_encoder(dim: int = 256, seed: int = 0):
+    """(model, tokenizer) pair usable in place of load_model_tokenizer()"""
+    return StubEncoder(dim=dim, seed=seed).eval(), StubTokenizer()
+
+
+def synthetic_snippets(language: str, count: int, seed: int = 0):
+    """Deterministic (docstrings, code) lists that look enough like a corpus for BM25 and the encoder"""
+    rng = np.random.default_rng(seed + sum(map(ord, language)))
+    docstrings, code = [], []
+    for row in range(count):
+        verb, noun, other = rng.choice(_VERBS), rng.choice(_NOUNS), rng.choice(_NOUNS)
+        qualifier = rng.choice(_QUALIFIERS)
+        name = f"{verb}_{noun}_{row}"
+        docstrings.append(f"{verb.capitalize()} the {noun} of a {other} {qualifier}.")
+        code.append(
+            f"def {name}({other}, options=None):\n"
+            f"    \"\"\"{verb.capitalize()} the {noun} of a {other} {qualifier}.\"\"\"\n"
+            f"    {noun} = {other}.{noun}\n"
+            f"    return {verb}({noun}, options)  # {language}\n"
+        )
+    return docstrings, code
+
+
+def build_synthetic_language(output_dir: str, language: str, count: int, model, tokenizer, batch_size: int = 256, seed: int = 0) -> Dict[str, Any]:
+    """Write the same files build_index produces, for a synthetic corpus"""
+    docstrings, code = synthetic_snippets(language, count, seed)
+    language_dir = os.path.join(output_dir, language)
+    os.makedirs(language_dir, exist_ok=True)
+
+    vectors = []
+    with torch.no_grad():
+        for start in range(0, count, batch_size):
+            inputs = tokenizer(code[start:start + batch_size], padding="longest", max_length=128, return_tensors="pt")
+            vectors.append(model(**inputs).float().numpy())
+    vectors = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+
+    index_type = settings.get_index_type(language)
+    write_index(build_index(vectors, index_type), os.path.join(language_dir, index_file_name(index_type)))
+    if index_type != "flat":
+        write_index(build_index(vectors, "flat"), os.path.join(language_dir, index_file_name("flat")))
+    if index_type in COMPRESSED_INDEX_TYPES:
+        write_rerank_vectors(vectors, os.path.join(language_dir, RERANK_VECTORS_FILE))
+    write_snippet_files(language_dir, code, docstrings)
+    build_lexical_index(code, docstrings).save(os.path.join(language_dir, "bm25"))
+    return {"language": language, "snippets": count, "dimension": int(vectors.shape[1]), "index_type": index_type, "queries": docstrings}
+
+
+# In-memory Mongo stand-in
+
+def _get_path(doc: Dict[str, Any], path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+class _Missing:
+    pass
+
+
+_MISSING = _Missing()
+
+
+def _compare(value, op: str, operand) -> bool:
+    if op == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if op == "$ne":
+        return value != operand
+    if op == "$in":
+        return value in operand
+    if op == "$nin":
+        return value not in operand
+    if op == "$elemMatch":
+        return isinstance(value, list) and any(isinstance(item, dict) and matches(item, operand) for item in value)
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == "$lt":
+            return value < operand
+        if op == "$lte":
+            return value <= operand
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported query operator in the Mongo stand-in: {op}")
+
+
+def matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """Whether `doc` satisfies a Mongo filter (equality, comparisons, $or/$and, $elemMatch, $exists)"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        else:
+            value = _get_path(doc, key)
+            if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+                if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                    return False
+            elif isinstance(value, list) and not isinstance(condition, list):
+                if condition not in value:
+                    return False
+            elif value is _MISSING:
+                if condition is not None:
+                    return False
+            elif value != condition:
+                return False
+    return True
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {key for key, flag in projection.items() if flag and key != "_id"}
+    if include:
+        projected = {key: copy.deepcopy(doc[key]) for key in include if key in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            projected["_id"] = doc["_id"]
+        return projected
+    return {key: copy.deepcopy(value) for key, value in doc.items() if projection.get(key, 1)}
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class UpdateResult:
+    def __init__(self, matched_count: int, modified_count: int):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+
+
+class DeleteResult:
+    def __init__(self, deleted_count: int):
+        self.deleted_count = deleted_count
+
+
+class InMemoryCursor:
+    def __init__(self, docs: List[Dict[str, Any]], projection: Optional[Dict[str, Any]]):
+        self._docs = docs
+        self._projection = projection
+        self._sort: List = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction: int = 1):
+        self._sort = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def _results(self) -> List[Dict[str, Any]]:
+        docs = list(self._docs)
+        for field, direction in reversed(self._sort):
+            docs.sort(key=lambda doc: _sort_key(_get_path(doc, field)), reverse=direction < 0)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [_project(doc, self._projection) for doc in docs]
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = self._results()
+        return results[:length] if length else results
+
+    def __aiter__(self):
+        self._iter = iter(self._results())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def _sort_key(value):
+    # Missing / None sort first, like Mongo
+    if value is _MISSING or value is None:
+        return (0, "")
+    if isinstance(value, ObjectId):
+        return (1, value.binary)
+    return (1, value)
+
+
+class InMemoryCollection:
+    """The subset of the motor collection API that the app uses, kept in a dict"""
+
+    def __init__(self):
+        self.docs: Dict[Any, Dict[str, Any]] = {}
+
+    def _matching(self, query: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        query = query or {}
+        if "_id" in query and not isinstance(query["_id"], dict):
+            doc = self.docs.get(query["_id"])
+            return [doc] if doc is not None and matches(doc, query) else []
+        return [doc for doc in self.docs.values() if matches(doc, query)]
+
+    async def create_index(self, keys, **kwargs) -> str:
+        return "_".join(f"{key}_{direction}" for key, direction in (keys if isinstance(keys, list) else [(keys, 1)]))
+
+    async def insert_one(self, doc: Dict[str, Any]) -> InsertOneResult:
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", ObjectId())
+        self.docs[doc["_id"]] = doc
+        return InsertOneResult(doc["_id"])
+
+    async def find_one(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None):
+        docs = self._matching(query)
+        return _project(docs[0], projection) if docs else None
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None) -> InMemoryCursor:
+        return InMemoryCursor(self._matching(query), projection)
+
+    async def count_documents(self, query: Dict[str, Any]) -> int:
+        return len(self._matching(query))
+
+    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> UpdateResult:
+        docs = self._matching(query)
+        if not docs:
+            return UpdateResult(0, 0)
+        _apply_update(docs[0], update)
+        return UpdateResult(1, 1)
+
+    async def update_many(self, query: Dict[str, Any], update: Dict[str, Any]) -> UpdateResult:
+        docs = self._matching(query)
+        for doc in docs:
+            _apply_update(doc, update)
+        return UpdateResult(len(docs), len(docs))
+
+    async def delete_one(self, query: Dict[str, Any]) -> DeleteResult:
+        docs = self._matching(query)
+        if docs:
+            del self.docs[docs[0]["_id"]]
+        return DeleteResult(len(docs[:1]))
+
+    async def delete_many(self, query: Dict[str, Any]) -> DeleteResult:
+        docs = self._matching(query)
+        for doc in docs:
+            del self.docs[doc["_id"]]
+        return DeleteResult(len(docs))
+
+    async def bulk_write(self, requests: Sequence[Any], ordered: bool = True):
+        for request in requests:
+            # pymongo's UpdateOne keeps its arguments in private attributes
+            await self.update_one(request._filter, request._doc)
+
+
+def _apply_update(doc: Dict[str, Any], update: Dict[str, Any]):
+    for op, fields in update.items():
+        for key, value in fields.items():
+            if op == "$set":
+                doc[key] = copy.deepcopy(value)
+            elif op == "$inc":
+                doc[key] = doc.get(key, 0) + value
+            elif op == "$push":
+                doc.setdefault(key, []).append(copy.deepcopy(value))
+            elif op == "$unset":
+                doc.pop(key, None)
+            else:
+                raise ValueError(f"Unsupported update operator in the Mongo stand-in: {op}")
+
+
+class InMemoryDatabase:
+    def __init__(self):
+        self._collections: Dict[str, InMemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        return self._collections.setdefault(name, InMemoryCollection())
+
+    async def list_collection_names(self) -> List[str]:
+        return list(self._collections)
+
+    async def create_collection(self, name: str) -> InMemoryCollection:
+        return self[name]
+
+
+class InMemoryMongoClient:
+    """Drop-in for AsyncIOMotorClient in the benchmark; nothing leaves the process"""
+
+    def __init__(self):
+        self._databases: Dict[str, InMemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> InMemoryDatabase:
+        return self._databases.setdefault(name, InMemoryDatabase())
+
+    def close(self):
+        pass
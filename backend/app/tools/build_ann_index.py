@@ -0,0 +1,73 @@
+"""
+Build an approximate index (IVF-Flat / IVF-PQ / IVF-SQ / HNSW) for a language from its exact
+faiss_index.index and report recall@k against it. Compressed indices also get the
+full-precision vectors.npy used to re-score their candidates, and the report adds
+recall and distance error after re-scoring.
+Usage: python -m app.tools.build_ann_index --language python --type hnsw [--report-only]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.services.ann_index import (
+    COMPRESSED_INDEX_TYPES, INDEX_TYPES, RERANK_VECTORS_FILE, build_index, index_file_name, recall_report, write_index,
+    write_rerank_vectors,
+)
+
+def load_vectors(index: faiss.Index) -> np.ndarray:
+    """Read every stored vector back out of an exact index"""
+    return index.reconstruct_n(0, index.ntotal)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--language", required=True, choices=settings.SUPPORTED_LANGUAGES)
+    parser.add_argument("--type", required=True, choices=[t for t in INDEX_TYPES if t != "flat"])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000, help="Number of sampled corpus vectors used as queries")
+    parser.add_argument("--report-only", action="store_true", help="Evaluate an already built index")
+    parser.add_argument("--output", help="Write the recall report as JSON")
+    args = parser.parse_args()
+
+    embedding_dir = os.path.join(settings.MODEL_DIR, args.language)
+    exact_index = faiss.read_index(os.path.join(embedding_dir, index_file_name("flat")))
+    approx_file = os.path.join(embedding_dir, index_file_name(args.type))
+    vectors_file = os.path.join(embedding_dir, RERANK_VECTORS_FILE)
+
+    if args.report_only:
+        approx_index = faiss.read_index(approx_file)
+    else:
+        vectors = load_vectors(exact_index)
+        start = time.perf_counter()
+        approx_index = build_index(vectors, args.type)
+        print(f"Built {args.type} index over {len(vectors)} vectors in {time.perf_counter() - start:.1f}s")
+        write_index(approx_index, approx_file)
+        print(f"Saved {approx_file}")
+        if args.type in COMPRESSED_INDEX_TYPES:
+            write_rerank_vectors(vectors, vectors_file)
+            print(f"Saved {vectors_file} ({settings.RERANK_VECTORS_DTYPE})")
+
+    # Perturbed corpus vectors stand in for real queries
+    rng = np.random.default_rng(0)
+    rows = rng.choice(exact_index.ntotal, size=min(args.queries, exact_index.ntotal), replace=False)
+    queries = np.vstack([exact_index.reconstruct(int(r)) for r in rows])
+    queries += rng.normal(scale=queries.std() * 0.1, size=queries.shape).astype(np.float32)
+
+    rerank_vectors = None
+    if args.type in COMPRESSED_INDEX_TYPES and os.path.exists(vectors_file):
+        rerank_vectors = np.load(vectors_file, mmap_mode="r")
+    report = recall_report(exact_index, approx_index, queries, k=args.k, rerank_vectors=rerank_vectors)
+    for point in report:
+        print("  ".join(f"{key}={value:.4f}" if isinstance(value, float) else f"{key}={value}" for key, value in point.items()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"language": args.language, "type": args.type, "k": args.k, "points": report}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Build the per-language metadata.pkl, snippet stores, BM25 and faiss_index.index files from the docstring/code corpus.
+Embedding runs on every CPU core and is checkpointed per chunk, so an interrupted run resumes.
+Usage: python -m app.tools.build_index --corpus docstring_code [--languages python java] [--workers 8]
+
+The corpus directory holds, per language, JSON lines files (optionally gzipped) named
+`<language>*.jsonl[.gz]` or placed under `<language>/`, with a docstring and a code field
+(`docstring`/`code` or the CodeSearchNet `func_documentation_string`/`func_code_string`).
+"""
+
+import argparse
+import asyncio
+import glob
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from app.core.config import settings
+from app.services.ann_index import (
+    COMPRESSED_INDEX_TYPES, INDEX_TYPES, RERANK_VECTORS_FILE, build_index, index_file_name, write_index, write_rerank_vectors,
+)
+from app.services.code_search import build_lexical_index
+from app.tools.convert_metadata import write_snippet_files
+
+DOCSTRING_KEYS = ("docstring", "func_documentation_string")
+CODE_KEYS = ("code", "func_code_string", "original_string")
+
+# Per-process service used by pool workers
+_worker_service = None
+
+def find_corpus_files(corpus_dir: str, language: str) -> List[str]:
+    """Corpus files for a language, in a stable order"""
+    patterns = [
+        os.path.join(corpus_dir, f"{language}*.jsonl"),
+        os.path.join(corpus_dir, f"{language}*.jsonl.gz"),
+        os.path.join(corpus_dir, language, "**", "*.jsonl"),
+        os.path.join(corpus_dir, language, "**", "*.jsonl.gz"),
+    ]
+    files = set()
+    for pattern in patterns:
+        files.update(glob.glob(pattern, recursive=True))
+    return sorted(files)
+
+def _first(record: dict, keys: Tuple[str, ...]) -> Optional[str]:
+    for key in keys:
+        if record.get(key):
+            return record[key]
+    return None
+
+def stream_corpus(files: List[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (docstring, code) pairs from JSON lines files"""
+    for path in files:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                code = _first(record, CODE_KEYS)
+                if code:
+                    yield _first(record, DOCSTRING_KEYS) or "", code
+
+def _init_worker(threads: int):
+    global _worker_service
+    from app.services.code_search import CodeSearchService
+    from app.services.embeddings import load_model_tokenizer
+
+    torch.set_num_threads(threads)
+    _worker_service = CodeSearchService()
+    _worker_service.model, _worker_service.tokenizer = asyncio.run(load_model_tokenizer())
+
+def _embed_chunk(task: Tuple[str, List[str], int]) -> Tuple[str, int]:
+    """Embed one chunk and write it atomically to its checkpoint file"""
+    path, texts, batch_size = task
+    embeddings = _worker_service.get_embeddings(texts, max_length=512, batch_size=batch_size).astype(np.float32)
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, embeddings)
+    os.replace(tmp_path, path)
+    return path, len(texts)
+
+def texts_digest(texts: List[str]) -> str:
+    """Content hash of a list of texts, including their boundaries"""
+    digest = hashlib.blake2b(digest_size=16)
+    for text in texts:
+        data = text.encode("utf-8")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+def embed_texts(texts: List[str], work_dir: str, name: str, chunk_size: int, batch_size: int, workers: int, threads: int) -> np.ndarray:
+    """Embed texts in checkpointed chunks spread over a process pool"""
+    os.makedirs(work_dir, exist_ok=True)
+    
+    # Checkpoints are only reusable for the same texts, chunking and encoder
+    manifest_file = os.path.join(work_dir, f"{name}_manifest.json")
+    manifest = {
+        "count": len(texts),
+        "chunk_size": chunk_size,
+        "texts_digest": texts_digest(texts),
+        "model": settings.MODEL_NAME,
+        "precision": settings.MODEL_PRECISION,
+    }
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            if json.load(f) != manifest:
+                print(f"  {name}: corpus, chunk size or model changed, discarding checkpoints")
+                for path in glob.glob(os.path.join(work_dir, f"{name}_*.npy")):
+                    os.remove(path)
+    with open(manifest_file, "w") as f:
+        json.dump(manifest, f)
+    
+    chunk_paths = []
+    tasks = []
+    for chunk_id, start in enumerate(range(0, len(texts), chunk_size)):
+        path = os.path.join(work_dir, f"{name}_{chunk_id:06d}.npy")
+        chunk_paths.append(path)
+        if not os.path.exists(path):
+            tasks.append((path, texts[start:start + chunk_size], batch_size))
+
+    done = len(chunk_paths) - len(tasks)
+    if done:
+        print(f"  {name}: resuming, {done}/{len(chunk_paths)} chunks already embedded")
+
+    if tasks:
+        start_time = time.perf_counter()
+        embedded = 0
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(processes=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+            for _, count in pool.imap_unordered(_embed_chunk, tasks):
+                embedded += count
+                done += 1
+                rate = embedded / (time.perf_counter() - start_time)
+                print(f"  {name}: {done}/{len(chunk_paths)} chunks, {rate:.1f} texts/s")
+
+    return np.vstack([np.load(path) for path in chunk_paths])
+
+def build_language(args, language: str) -> dict:
+    files = find_corpus_files(args.corpus, language)
+    if not files:
+        print(f"Warning: No corpus files for {language}")
+        return {"language": language, "skipped": True}
+
+    start_time = time.perf_counter()
+    docstring_list, code_list = [], []
+    for docstring, code in stream_corpus(files):
+        docstring_list.append(docstring)
+        code_list.append(code)
+        if args.limit and len(code_list) >= args.limit:
+            break
+    print(f"{language}: {len(code_list)} snippets from {len(files)} files")
+
+    work_dir = os.path.join(args.work_dir, language)
+    code_embeddings = embed_texts(code_list, work_dir, "code", args.chunk_size, args.batch_size, args.workers, args.threads)
+    embed_seconds = time.perf_counter() - start_time
+
+    output_dir = os.path.join(args.output_dir, language)
+    os.makedirs(output_dir, exist_ok=True)
+
+    index = build_index(code_embeddings, args.index_type)
+    write_index(index, os.path.join(output_dir, index_file_name(args.index_type)))
+    if args.index_type != "flat":
+        write_index(build_index(code_embeddings, "flat"), os.path.join(output_dir, index_file_name("flat")))
+    if args.index_type in COMPRESSED_INDEX_TYPES:
+        write_rerank_vectors(code_embeddings, os.path.join(output_dir, RERANK_VECTORS_FILE))
+
+    with open(os.path.join(output_dir, "metadata.pkl"), "wb") as f:
+        pickle.dump({"code_list": code_list, "docstring_list": docstring_list}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    write_snippet_files(output_dir, code_list, docstring_list)
+    build_lexical_index(code_list, docstring_list).save(os.path.join(output_dir, "bm25"))
+
+    if args.docstring_embeddings:
+        docstring_embeddings = embed_texts(docstring_list, work_dir, "docstring", args.chunk_size, args.batch_size, args.workers, args.threads)
+        np.save(os.path.join(output_dir, "docstring_embeddings.npy"), docstring_embeddings)
+
+    total_seconds = time.perf_counter() - start_time
+    print(f"{language}: done in {total_seconds:.1f}s")
+    return {
+        "language": language,
+        "snippets": len(code_list),
+        "dimension": int(code_embeddings.shape[1]),
+        "index_type": args.index_type,
+        "embed_seconds": round(embed_seconds, 2),
+        "total_seconds": round(total_seconds, 2),
+    }
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "docstring_code"))
+    parser.add_argument("--languages", nargs="+", default=settings.SUPPORTED_LANGUAGES, choices=settings.SUPPORTED_LANGUAGES)
+    parser.add_argument("--output-dir", default=settings.MODEL_DIR)
+    parser.add_argument("--work-dir", default=os.path.join(settings.MODEL_DIR, ".build"), help="Checkpoint directory")
+    parser.add_argument("--index-type", default="flat", choices=INDEX_TYPES)
+    parser.add_argument("--workers", type=int, default=cpu_count)
+    parser.add_argument("--threads", type=int, default=1, help="Torch threads per worker")
+    parser.add_argument("--chunk-size", type=int, default=2048, help="Texts per checkpoint chunk")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per forward pass")
+    parser.add_argument("--limit", type=int, default=0, help="Only embed the first N snippets per language")
+    parser.add_argument("--docstring-embeddings", action="store_true", help="Also export docstring_embeddings.npy for the docstring fast path")
+    args = parser.parse_args()
+
+    reports = [build_language(args, language) for language in args.languages]
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    report_file = os.path.join(args.work_dir, "build_report.json")
+    with open(report_file, "w") as f:
+        json.dump({"workers": args.workers, "threads": args.threads, "languages": reports}, f, indent=2)
+    print(f"Report written to {report_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Build the per-language BM25 index (bm25.terms.* and bm25.<array>.npy) over docstrings and code tokens.
+Usage: python -m app.tools.build_lexical_index [--languages python java]
+"""
+
+import argparse
+import os
+import pickle
+import time
+
+from app.core.config import settings
+from app.services.code_search import build_lexical_index
+from app.services.snippet_store import SnippetStore
+
+def load_snippets(embedding_dir: str):
+    """Code and docstring lists from the snippet stores, or metadata.pkl"""
+    code_prefix = os.path.join(embedding_dir, "code")
+    docstring_prefix = os.path.join(embedding_dir, "docstring")
+    if SnippetStore.exists(code_prefix):
+        docstring_list = SnippetStore(docstring_prefix) if SnippetStore.exists(docstring_prefix) else []
+        return SnippetStore(code_prefix), docstring_list
+    with open(os.path.join(embedding_dir, "metadata.pkl"), "rb") as f:
+        metadata = pickle.load(f)
+    return metadata["code_list"], metadata.get("docstring_list", [])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--languages", nargs="+", default=settings.SUPPORTED_LANGUAGES, choices=settings.SUPPORTED_LANGUAGES)
+    args = parser.parse_args()
+
+    for language in args.languages:
+        embedding_dir = os.path.join(settings.MODEL_DIR, language)
+        try:
+            code_list, docstring_list = load_snippets(embedding_dir)
+        except FileNotFoundError:
+            print(f"Warning: Missing data files for {language}")
+            continue
+
+        start = time.perf_counter()
+        index = build_lexical_index(code_list, docstring_list)
+        index.save(os.path.join(embedding_dir, "bm25"))
+        print(f"{language}: {len(index)} documents, {len(index.vocabulary)} terms in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare dynamic (bucketed) padding against max_length padding for query embeddings.
+Usage: python -m app.tools.check_padding [--queries FILE] [--atol 1e-4]
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.services.code_search import code_search_service
+from app.services.embeddings import load_model_tokenizer
+
+SAMPLE_QUERIES = [
+    "Return the sum of two numbers",
+    "parse a query string into a dictionary",
+    "Read a file line by line and strip trailing whitespace",
+    "Convert a datetime object to an ISO 8601 formatted string with the local timezone offset",
+    "Sends an HTTP GET request to the given URL with optional headers, retries on connection "
+    "errors with exponential backoff and returns the decoded JSON body of the response",
+]
+
+def time_mode(texts, padding, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        code_search_service.get_embeddings(texts, padding=padding)
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", help="File with one query per line")
+    parser.add_argument("--atol", type=float, default=1e-4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = SAMPLE_QUERIES
+
+    code_search_service.model, code_search_service.tokenizer = asyncio.run(load_model_tokenizer())
+
+    report = code_search_service.compare_padding_modes(texts, atol=args.atol)
+    print(f"Queries: {report['count']}")
+    print(f"Max abs diff: {report['max_abs_diff']:.2e} (atol {report['atol']:.0e}) -> {'OK' if report['match'] else 'MISMATCH'}")
+
+    for padding in ("max_length", "dynamic"):
+        seconds = time_mode(texts, padding, args.repeat)
+        print(f"{padding:>10}: {seconds * 1000:.1f} ms per batch, {seconds * 1000 / len(texts):.2f} ms per query")
+
+    if not report["match"]:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Convert each language's pickled metadata.pkl into memory-mapped snippet stores
+(code.offsets.npy + code.blob, docstring.offsets.npy + docstring.blob) and a
+precomputed docstring_lookup.npy.
+Usage: python -m app.tools.convert_metadata [--languages python java] [--remove-pickle]
+"""
+
+import argparse
+import os
+import pickle
+
+from app.core.config import settings
+from app.services.snippet_store import DocstringLookup, SnippetStore
+
+def write_snippet_files(embedding_dir: str, code_list, docstring_list):
+    """Write the snippet stores and docstring lookup for one language"""
+    SnippetStore.write(os.path.join(embedding_dir, "code"), code_list)
+    SnippetStore.write(os.path.join(embedding_dir, "docstring"), docstring_list)
+    DocstringLookup.build(docstring_list).save(os.path.join(embedding_dir, "docstring_lookup.npy"))
+
+def convert_language(language: str, remove_pickle: bool = False) -> bool:
+    embedding_dir = os.path.join(settings.MODEL_DIR, language)
+    metadata_file = os.path.join(embedding_dir, "metadata.pkl")
+    if not os.path.exists(metadata_file):
+        print(f"Warning: Missing metadata.pkl for {language}")
+        return False
+
+    with open(metadata_file, "rb") as f:
+        metadata = pickle.load(f)
+    code_list = metadata["code_list"]
+    docstring_list = metadata.get("docstring_list", [])
+
+    write_snippet_files(embedding_dir, code_list, docstring_list)
+
+    # Sanity check before the pickle can be dropped
+    store = SnippetStore(os.path.join(embedding_dir, "code"))
+    if len(store) != len(code_list) or (len(store) and store[len(store) - 1] != code_list[-1]):
+        raise RuntimeError(f"Snippet store for {language} does not match metadata.pkl")
+    store.close()
+
+    print(f"Converted {language}: {len(code_list)} code samples, {len(docstring_list)} docstrings")
+    if remove_pickle:
+        os.remove(metadata_file)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--languages", nargs="+", default=settings.SUPPORTED_LANGUAGES, choices=settings.SUPPORTED_LANGUAGES)
+    parser.add_argument("--remove-pickle", action="store_true", help="Delete metadata.pkl after a successful conversion")
+    args = parser.parse_args()
+
+    for language in args.languages:
+        convert_language(language, args.remove_pickle)
+
+if __name__ == "__main__":
+    main()
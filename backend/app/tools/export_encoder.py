@@ -0,0 +1,76 @@
+"""
+Export the encoder as TorchScript together with its tokenizer, so startup can load
+it without building the model from the Hugging Face files. Point
+SERIALIZED_ENCODER_DIR at the output directory to use it. The traced encoder is
+checked against the eager one on a batch of a different shape before it is saved.
+Usage: python -m app.tools.export_encoder --output data/encoder [--precision int8]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import torch
+
+from app.core.config import settings
+from app.services.embeddings import MODEL_PRECISIONS, SERIALIZED_ENCODER_FILE, SERIALIZED_INFO_FILE, load_model_tokenizer
+
+TRACE_TEXTS = ["def add(a, b):\n    return a + b", "Sort a list of integers in place"]
+CHECK_TEXTS = [
+    "Read a JSON config file and merge it with the defaults",
+    "def fib(n):\n    return n if n < 2 else fib(n - 1) + fib(n - 2)",
+    "open a socket",
+]
+# Allowed max abs difference between traced and eager embeddings
+TOLERANCE = {"fp32": 1e-4, "int8": 1e-3, "bf16": 2e-2}
+
+def encode_inputs(tokenizer, texts, max_length: int, device: torch.device):
+    inputs = tokenizer(texts, padding="longest", truncation=True, max_length=max_length, return_tensors="pt").to(device)
+    return {"input_ids": inputs["input_ids"], "attention_mask": inputs["attention_mask"]}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", required=True, help="Directory to write encoder.pt, the tokenizer and export.json")
+    parser.add_argument("--precision", default=settings.MODEL_PRECISION, choices=MODEL_PRECISIONS)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--force", action="store_true", help="Save even if the traced encoder does not match")
+    args = parser.parse_args()
+
+    model, tokenizer = asyncio.run(load_model_tokenizer(precision=args.precision))
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_kwarg_inputs=encode_inputs(tokenizer, TRACE_TEXTS, args.max_length, device), strict=False)
+        try:
+            traced = torch.jit.freeze(traced)
+        except RuntimeError as e:
+            print(f"Warning: could not freeze the traced encoder ({e}), saving it unfrozen")
+
+        check_inputs = encode_inputs(tokenizer, CHECK_TEXTS, args.max_length, device)
+        expected = model(**check_inputs).float()
+        actual = traced(**check_inputs).float()
+    max_abs_diff = float((expected - actual).abs().max())
+    tolerance = TOLERANCE[args.precision]
+    print(f"Traced vs eager max abs difference: {max_abs_diff:.2e} (tolerance {tolerance:.0e})")
+    if max_abs_diff > tolerance and not args.force:
+        print("Error: the traced encoder does not match the eager one; not saving (use --force to override)")
+        sys.exit(1)
+
+    os.makedirs(args.output, exist_ok=True)
+    torch.jit.save(traced, os.path.join(args.output, SERIALIZED_ENCODER_FILE))
+    tokenizer.save_pretrained(args.output)
+    info = {
+        "model_name": settings.MODEL_NAME,
+        "precision": args.precision,
+        "dimension": int(expected.shape[1]),
+        "torch_version": torch.__version__,
+        "max_abs_diff": max_abs_diff,
+    }
+    with open(os.path.join(args.output, SERIALIZED_INFO_FILE), "w") as f:
+        json.dump(info, f, indent=2)
+    print(f"Serialized encoder written to {args.output}; set SERIALIZED_ENCODER_DIR to use it")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare a reduced-precision encoder (int8 / bf16) against fp32: embedding cosine
+similarity, top-k agreement on a language's index and per-query latency.
+Usage: python -m app.tools.quantization_report --precision int8 --language python [--samples 500 --k 10]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.services.ann_index import index_file_name
+from app.services.code_search import CodeSearchService
+from app.services.embeddings import MODEL_PRECISIONS, load_model_tokenizer
+from app.tools.build_lexical_index import load_snippets
+
+def load_service(precision: str) -> CodeSearchService:
+    service = CodeSearchService()
+    service.model, service.tokenizer = asyncio.run(load_model_tokenizer(precision))
+    return service
+
+def embed_timed(service: CodeSearchService, queries, batch_size: int):
+    start = time.perf_counter()
+    embeddings = service.get_embeddings(queries, max_length=512, batch_size=batch_size)
+    return embeddings.astype(np.float32), (time.perf_counter() - start) * 1000 / len(queries)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--precision", required=True, choices=[p for p in MODEL_PRECISIONS if p != "fp32"])
+    parser.add_argument("--language", default="python", choices=settings.SUPPORTED_LANGUAGES)
+    parser.add_argument("--samples", type=int, default=500, help="Docstrings sampled as queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1, help="1 mirrors per-request query encoding")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    embedding_dir = os.path.join(settings.MODEL_DIR, args.language)
+    _, docstring_list = load_snippets(embedding_dir)
+    index = faiss.read_index(os.path.join(embedding_dir, index_file_name("flat")))
+
+    rng = np.random.default_rng(0)
+    candidates = [row for row in range(len(docstring_list)) if docstring_list[row]]
+    rows = sorted(rng.choice(candidates, size=min(args.samples, len(candidates)), replace=False).tolist())
+    queries = [docstring_list[row] for row in rows]
+
+    reference, reference_ms = embed_timed(load_service("fp32"), queries, args.batch_size)
+    reduced, reduced_ms = embed_timed(load_service(args.precision), queries, args.batch_size)
+
+    cosine = np.sum(reference * reduced, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(reduced, axis=1) + 1e-12
+    )
+
+    _, reference_ids = index.search(reference, args.k)
+    _, reduced_ids = index.search(reduced, args.k)
+    overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(reference_ids, reduced_ids)])
+
+    # The docstring's own code row is the relevant result for CodeSearchNet pairs
+    truth = np.asarray(rows)[:, None]
+    report = {
+        "language": args.language,
+        "precision": args.precision,
+        "samples": len(queries),
+        "k": args.k,
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        f"top{args.k}_overlap_with_fp32": float(overlap),
+        f"recall@{args.k}_fp32": float(np.mean(np.any(reference_ids == truth, axis=1))),
+        f"recall@{args.k}_{args.precision}": float(np.mean(np.any(reduced_ids == truth, axis=1))),
+        "ms_per_query_fp32": reference_ms,
+        f"ms_per_query_{args.precision}": reduced_ms,
+        "speedup": reference_ms / reduced_ms if reduced_ms else None,
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
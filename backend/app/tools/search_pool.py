@@ -0,0 +1,22 @@
+"""
+Run the shared search worker pool as a standalone process. Web workers started with
+SEARCH_POOL_WORKERS > 0 connect to it instead of starting their own.
+Usage: SEARCH_POOL_WORKERS=8 python -m app.tools.search_pool [--stop-when-idle]
+"""
+
+import argparse
+
+from app.core.config import settings
+from app.services.worker_pool import run_pool_server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--stop-when-idle", action="store_true",
+        help="Exit once no client has been connected for SEARCH_POOL_IDLE_SECONDS (how web workers start the pool)",
+    )
+    args = parser.parse_args()
+    run_pool_server(settings.SEARCH_POOL_IDLE_SECONDS if args.stop_when_idle else -1)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import { Component, OnInit } from '@angular/core';
 import { Router } from '@angular/router';
 import { ChatService } from '../../services/chat.service';
-import { ChatSession } from '../../models/chat.model';
+import { ChatSessionSummary } from '../../models/chat.model';
 import { CommonModule } from '@angular/common';
 import { FormsModule } from '@angular/forms';
 import { RouterLink } from '@angular/router';
@@ -14,7 +14,8 @@ import { RouterLink } from '@angular/router';
   styleUrls: ['./chat-list.component.css']
 })
 export class ChatListComponent implements OnInit {
-  chats: ChatSession[] = [];
+  chats: ChatSessionSummary[] = [];
+  nextCursor: string | null = null;
   newChatTitle: string = '';
 
   constructor(private chatService: ChatService, private router: Router) {}
@@ -24,15 +25,32 @@ export class ChatListComponent implements OnInit {
   }
 
   loadChats() {
-    this.chatService.getChatSessions().subscribe(chats => {
-      this.chats = chats;
+    this.chatService.getChatSessions().subscribe(page => {
+      this.chats = page.items;
+      this.nextCursor = page.next_cursor ?? null;
+    });
+  }
+
+  loadMoreChats() {
+    if (!this.nextCursor) {
+      return;
+    }
+    this.chatService.getChatSessions(this.nextCursor).subscribe(page => {
+      this.chats = [...this.chats, ...page.items];
+      this.nextCursor = page.next_cursor ?? null;
     });
   }
 
   createChat() {
     if (this.newChatTitle.trim()) {
       this.chatService.createChatSession(this.newChatTitle).subscribe(chat => {
-        this.chats.push(chat);
+        this.chats.unshift({
+          _id: chat._id,
+          title: chat.title,
+          created_at: chat.created_at,
+          updated_at: chat.updated_at,
+          message_count: 0
+        });
         this.newChatTitle = '';
       });
     }
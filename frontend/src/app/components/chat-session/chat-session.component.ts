@@ -38,6 +38,17 @@ export class ChatSessionComponent implements OnInit {
     });
   }
 
+  loadOlderMessages() {
+    if (this.chat && this.chat.next_cursor) {
+      this.chatService.getChatSession(this.chat._id, this.chat.next_cursor).subscribe(page => {
+        if (this.chat) {
+          this.chat.messages = [...page.messages, ...this.chat.messages];
+          this.chat.next_cursor = page.next_cursor;
+        }
+      });
+    }
+  }
+
   loadLanguages() {
     this.searchService.getSupportedLanguages().subscribe(languages => {
       this.languages = languages['languages'];
@@ -49,8 +60,8 @@ export class ChatSessionComponent implements OnInit {
 
   sendMessage() {
     if (this.chat && this.newMessage.message.trim()) {
-      this.chatService.addMessage(this.chat._id, this.newMessage).subscribe(updatedChat => {
-        this.chat = updatedChat;
+      this.chatService.addMessage(this.chat._id, this.newMessage).subscribe(message => {
+        this.chat?.messages.push(message);
         this.newMessage = { message: '', language: this.newMessage.language, timestamp: new Date() };
       });
     }
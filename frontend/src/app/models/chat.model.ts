@@ -5,17 +5,36 @@ export interface ChatSession {
   created_at: Date;
   updated_at: Date;
   user_id?: string;
+  next_cursor?: string | null;
+}
+
+export interface ChatSessionSummary {
+  _id: string;
+  title: string;
+  created_at: Date;
+  updated_at: Date;
+  message_count: number;
+}
+
+export interface ChatSessionPage {
+  items: ChatSessionSummary[];
+  next_cursor?: string | null;
 }
 
 export interface ChatMessage {
+  id?: string;
   message: string;
-  language: string;
+  language: string | string[];
   timestamp: Date;
   results?: CodeSearchResult[];
 }
 
 export interface CodeSearchResult {
-  code: string;
+  code: string | null;
+  language?: string;
+  row?: number;
+  version?: string;
   similarity: number;
-  distance: number;
+  distance?: number | null;
+  score?: number;
 }
\ No newline at end of file
@@ -1,5 +1,6 @@
 export interface SearchQuery {
     query: string;
-    language: string;
+    language: string | string[];  // a language, a list of languages or 'all'
     top_k: number;
+    mode?: 'vector' | 'hybrid' | 'lexical';
 }
\ No newline at end of file
@@ -1,8 +1,8 @@
 import { Injectable } from '@angular/core';
-import { HttpClient } from '@angular/common/http';
+import { HttpClient, HttpParams } from '@angular/common/http';
 import { Observable } from 'rxjs';
 import { environment } from '../../environments/environment.development';
-import { ChatSession, ChatMessage } from '../models/chat.model';
+import { ChatSession, ChatSessionPage, ChatMessage } from '../models/chat.model';
 
 @Injectable({
   providedIn: 'root'
@@ -14,12 +14,14 @@ export class ChatService {
     return this.http.post<ChatSession>(`${environment.apiUrl}/chat`, { title });
   }
 
-  getChatSessions(): Observable<ChatSession[]> {
-    return this.http.get<ChatSession[]>(`${environment.apiUrl}/chat`);
+  getChatSessions(cursor?: string): Observable<ChatSessionPage> {
+    const params = cursor ? new HttpParams().set('cursor', cursor) : undefined;
+    return this.http.get<ChatSessionPage>(`${environment.apiUrl}/chat`, { params });
   }
 
-  getChatSession(id: string): Observable<ChatSession> {
-    return this.http.get<ChatSession>(`${environment.apiUrl}/chat/${id}`);
+  getChatSession(id: string, cursor?: string): Observable<ChatSession> {
+    const params = cursor ? new HttpParams().set('cursor', cursor) : undefined;
+    return this.http.get<ChatSession>(`${environment.apiUrl}/chat/${id}`, { params });
   }
 
   updateChatSession(id: string, title: string): Observable<ChatSession> {
@@ -30,7 +32,7 @@ export class ChatService {
     return this.http.delete<void>(`${environment.apiUrl}/chat/${id}`);
   }
 
-  addMessage(sessionId: string, message: ChatMessage): Observable<ChatSession> {
-    return this.http.post<ChatSession>(`${environment.apiUrl}/chat/${sessionId}/messages`, message);
+  addMessage(sessionId: string, message: ChatMessage): Observable<ChatMessage> {
+    return this.http.post<ChatMessage>(`${environment.apiUrl}/chat/${sessionId}/messages`, message);
   }
 }
\ No newline at end of file